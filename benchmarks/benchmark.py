@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""Benchmark of the schedulers and of the hopbytes evaluation.
+
+Synthetic applications of increasing size are mapped by each scheduler on
+a tree topology and on a topology given by its matrix of distances (a
+torus, or a CSV file). For each case, the wall time and peak memory of
+the scheduler and of compute_hopbytes are measured, along with the
+resulting hopbytes. Results are written to a JSON file, and can be
+compared against a previous run used as baseline.
+
+Examples
+--------
+$ ./benchmark.py --sizes 64 256 --output baseline.json
+$ ./benchmark.py --sizes 64 256 --baseline baseline.json --threshold 0.2
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+
+# Add the parent directory to the path so we can import
+# code from our simulator
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from simulator import schedulers
+from simulator import synthetic
+from simulator.topology import Topology, TopologyTree
+from simulator.support import compute_hopbytes
+
+PATTERNS = ['stencil', 'all_to_all', 'random_sparse', 'maplib_like']
+SCHEDULERS = ['compact', 'greedy_pairs', 'greedy_pairs_with_topology', 'eagermap', 'treematch', 'recursive_bisection']
+# Schedulers that only accept TopologyTree objects
+TREE_SCHEDULERS = ['eagermap', 'treematch']
+# Measures compared with the baseline (larger is worse), and the smallest
+# increase reported, so that noise on tiny measures is not a regression
+MEASURES = {'time': 1e-3, 'memory': 1 << 16, 'hopbytes': 0}
+
+
+def make_application(pattern, size, seed):
+    """Generates a synthetic application with a given number of tasks"""
+    if pattern == 'stencil':
+        side = math.isqrt(size)
+        while size % side:
+            side -= 1
+        return synthetic.stencil([side, size // side])
+    if pattern == 'all_to_all':
+        return synthetic.all_to_all(size)
+    if pattern == 'random_sparse':
+        return synthetic.random_sparse(size, seed=seed)
+    return synthetic.maplib_like(size, seed=seed)
+
+
+def make_topologies(size, topology_csv):
+    """Generates a tree and a distance matrix topology with at least a given number of cores"""
+    levels = max(1, math.ceil(math.log2(size)))
+    # Pairs of cores sharing a cache, groups of eight cores per processor, and so on
+    arity = [2] * (levels % 3) + [8] * (levels // 3)
+    topologies = {'tree': TopologyTree(arity or [2])}
+    if topology_csv is not None:
+        topologies['csv'] = Topology.from_csv(topology_csv)
+    else:
+        side = math.isqrt(size - 1) + 1
+        topologies['torus'] = synthetic.mesh([side, side], periodic=True)
+    return topologies
+
+
+def measure(function, repeat):
+    """Runs a function, returning its result, best wall time and peak memory
+
+    The time is measured without tracing memory allocations, which slows
+    Python code down, and the memory is measured in a separate run.
+    """
+    best = math.inf
+    for run in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def run(patterns, sizes, names, topology_csv=None, repeat=1, seed=0):
+    """Runs the benchmark, returning one result per case"""
+    results = []
+    for size in sizes:
+        topologies = make_topologies(size, topology_csv)
+        for pattern in patterns:
+            application = make_application(pattern, size, seed)
+            for topology_name, topology in topologies.items():
+                if topology.num_cores < application.num_tasks:
+                    continue
+                for name in names:
+                    if name in TREE_SCHEDULERS and not isinstance(topology, TopologyTree):
+                        continue
+                    scheduler = getattr(schedulers, name)
+                    case = {'pattern': pattern, 'size': application.num_tasks,
+                            'topology': topology_name, 'scheduler': name}
+                    try:
+                        mapping, case['time'], case['memory'] = measure(
+                            lambda: scheduler(application, topology), repeat)
+                        hopbytes, case['hopbytes_time'], case['hopbytes_memory'] = measure(
+                            lambda: compute_hopbytes(application, topology, mapping), repeat)
+                        case['hopbytes'] = float(hopbytes)
+                        case['status'] = 'ok'
+                    except Exception as error:
+                        case['status'] = 'error'
+                        case['error'] = repr(error)
+                    print(_describe(case), flush=True)
+                    results.append(case)
+    return results
+
+
+def _key(case):
+    return (case['pattern'], case['size'], case['topology'], case['scheduler'])
+
+
+def _describe(case):
+    name = '{} {} tasks on {} with {}'.format(*_key(case))
+    if case['status'] != 'ok':
+        return f'{name}: {case["error"]}'
+    return (f'{name}: {case["time"]:.4f} s, {case["memory"] / 2**20:.2f} MiB, '
+            f'hopbytes {case["hopbytes"]:g} ({case["hopbytes_time"]:.4f} s)')
+
+
+def compare(results, baseline, threshold):
+    """Finds the measures that are worse than the baseline by more than a threshold
+
+    Parameters
+    ----------
+    results : list of dict
+        Cases of the current run
+    baseline : list of dict
+        Cases of the baseline run
+    threshold : float
+        Relative increase tolerated (e.g. 0.2 for 20%)
+
+    Returns
+    -------
+    list of string
+        Description of each regression
+    """
+    reference = {_key(case): case for case in baseline if case['status'] == 'ok'}
+    regressions = []
+    for case in results:
+        previous = reference.get(_key(case))
+        if previous is None:
+            continue
+        if case['status'] != 'ok':
+            regressions.append('{} {} tasks on {} with {}: failed'.format(*_key(case)))
+            continue
+        for measure_name, minimum in MEASURES.items():
+            increase = case[measure_name] - previous[measure_name]
+            if increase > previous[measure_name] * threshold and increase > minimum:
+                regressions.append('{} {} tasks on {} with {}'.format(*_key(case)) +
+                                   f': {measure_name} {case[measure_name]:g} '
+                                   f'(baseline {previous[measure_name]:g})')
+    return regressions
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Benchmark of the schedulers and of the hopbytes evaluation')
+    parser.add_argument('--patterns', nargs='+', choices=PATTERNS, default=PATTERNS)
+    parser.add_argument('--sizes', nargs='+', type=int, default=[64, 256, 1024],
+                        help='numbers of tasks of the applications')
+    parser.add_argument('--schedulers', nargs='+', default=SCHEDULERS)
+    parser.add_argument('--topology-csv', help='CSV file with the distances of a topology '
+                        '(default: a torus generated for each size)')
+    parser.add_argument('--repeat', type=int, default=1, help='runs timed per case (the best is kept)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON file where the results are written')
+    parser.add_argument('--baseline', help='JSON file with the results of a previous run')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative increase over the baseline reported as a regression')
+    options = parser.parse_args(arguments)
+    results = run(options.patterns, options.sizes, options.schedulers,
+                  options.topology_csv, options.repeat, options.seed)
+    if options.output is not None:
+        with open(options.output, 'w') as stream:
+            json.dump({'results': results}, stream, indent=1)
+    if options.baseline is not None:
+        with open(options.baseline) as stream:
+            baseline = json.load(stream)['results']
+        regressions = compare(results, baseline, options.threshold)
+        for regression in regressions:
+            print(f'* Regression: {regression}')
+        if regressions:
+            return 1
+        print('No regressions.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
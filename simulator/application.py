@@ -8,7 +8,14 @@ accesses to the same ranges of memory addresses, volume of data communication,
 or others.
 """
 
+import os
+
 import numpy as np
+from simulator.loaders import read_matrix, read_sparse_matrix, read_edge_list, read_packed_matrix
+from simulator.packing import (packed_index, packed_order, packed_positions, packed_rows,
+                               packed_size, narrowest_dtype, pack_matrix, unpack_matrix,
+                               is_symmetric, widen)
+from simulator.storage import file_hash, save_arrays, load_arrays, stored_hash
 
 
 class ApplicationGraph:
@@ -20,30 +27,184 @@ class ApplicationGraph:
         Number of tasks in the application
     affinity : np.ndarray
         Matrix representing the affinity between application tasks
+    loads : np.ndarray
+        Compute weight of each task (one per task unless set)
 
     Raises
     ------
     ValueError
         If the matrix contains NaN, negative values, or it is not square.
     """
-    def __init__(self, csv_file=None):
-        """Reads the application graph from a CSV file"""
+    def __init__(self, csv_file=None, dtype=np.float64):
+        """Reads the application graph from a CSV file
+
+        The file is parsed in chunks, checking its integrity as it is read.
+        The dtype parameter controls the type of the affinity values.
+        """
         if csv_file != None:
-            self.affinity = np.genfromtxt(csv_file, delimiter=',')
-            # Integrity check
-            if np.isnan(self.affinity).any():
-                print(f"* The communication matrix from file {csv_file} contains NaN values.")
-                raise ValueError
-            if np.min(self.affinity) < 0.:
-                print(f"* The communication matrix from file {csv_file} contains negative values.")
-                raise ValueError
-            if self.affinity.shape[0] != self.affinity.shape[1]:
-                print(f"* The communication matrix from file {csv_file} is not square.")
-                raise ValueError
+            self.affinity = read_matrix(csv_file, dtype=dtype, description='communication matrix')
             self.num_tasks = self.affinity.shape[0]
         else:
             self.num_tasks = 1
             self.affinity = np.zeros([1])
+        self._loads = None
+
+    @property
+    def loads(self):
+        """Compute weight of each task
+
+        Returns
+        -------
+        np.ndarray
+            Load of each task (one per task unless set)
+        """
+        if self._loads is None:
+            return np.ones(self.num_tasks)
+        return self._loads
+
+    @loads.setter
+    def loads(self, loads):
+        """Sets the compute weight of each task (None restores the default)
+
+        Raises
+        ------
+        ValueError
+            If there is not one load per task, or loads are NaN or negative
+        """
+        if loads is None:
+            self._loads = None
+            return
+        loads = np.asanyarray(loads)
+        if loads.shape != (self.num_tasks,):
+            print(f"* There are {len(loads)} task loads for {self.num_tasks} tasks.")
+            raise ValueError
+        if np.isnan(loads).any() or (len(loads) > 0 and np.min(loads) < 0):
+            print("* The task loads contain NaN or negative values.")
+            raise ValueError
+        self._loads = loads
+
+    def _stored_loads(self):
+        """Loads to store in binary files (only if they were set)"""
+        return {} if self._loads is None else {'loads': self._loads}
+
+    @staticmethod
+    def from_matrix(affinity, check=True):
+        """Creates an application graph from a matrix of affinities
+
+        Parameters
+        ----------
+        affinity : np.ndarray
+            Square matrix representing the affinity between application tasks
+        check : bool, optional
+            If False, the integrity checks are skipped
+
+        Returns
+        -------
+        ApplicationGraph object
+            Application graph using the matrix (not copied)
+
+        Raises
+        ------
+        ValueError
+            If the matrix contains NaN, negative values, or it is not square.
+        """
+        affinity = np.asanyarray(affinity)
+        if check:
+            if np.isnan(affinity).any():
+                print("* The communication matrix contains NaN values.")
+                raise ValueError
+            if np.min(affinity) < 0.:
+                print("* The communication matrix contains negative values.")
+                raise ValueError
+            if affinity.ndim != 2 or affinity.shape[0] != affinity.shape[1]:
+                print("* The communication matrix is not square.")
+                raise ValueError
+        application = ApplicationGraph()
+        application.affinity = affinity
+        application.num_tasks = affinity.shape[0]
+        return application
+
+    def save(self, path, source_hash=None):
+        """Writes the application graph to a binary file
+
+        Parameters
+        ----------
+        path : string
+            Destination file
+        source_hash : string, optional
+            Hash of the file the graph was read from
+        """
+        save_arrays(path, 'application', {'affinity': self.affinity, **self._stored_loads()},
+                    source_hash)
+
+    @staticmethod
+    def load(path):
+        """Opens an application graph from a binary file
+
+        The matrices are memory-mapped (read-only) instead of read.
+
+        Parameters
+        ----------
+        path : string
+            Binary file written by save
+
+        Returns
+        -------
+        ApplicationGraph, SparseApplicationGraph or PackedApplicationGraph object
+            Application graph stored in the file
+        """
+        kind, arrays, source_hash = load_arrays(path)
+        if kind == 'application':
+            application = ApplicationGraph.from_matrix(arrays['affinity'], check=False)
+        elif kind == 'sparse_application':
+            application = SparseApplicationGraph(arrays['indptr'], arrays['indices'], arrays['data'],
+                                                 check=False)
+        elif kind == 'packed_application':
+            application = PackedApplicationGraph(arrays['packed'], packed_order(len(arrays['packed'])),
+                                                 check=False)
+        else:
+            print(f"* The file {path} contains a {kind} instead of an application.")
+            raise ValueError
+        application.loads = arrays.get('loads')
+        return application
+
+    @staticmethod
+    def from_cached_csv(csv_file, cache_file=None, sparse=False, dtype=np.float64):
+        """Reads an application graph from a CSV file through a binary cache
+
+        The cache is rebuilt when it is missing or was built from a different
+        version of the CSV file.
+
+        Parameters
+        ----------
+        csv_file : string
+            File containing the matrix of affinities between tasks
+        cache_file : string, optional
+            Binary file used as cache. Default: the CSV file name with a
+            '.bin' (or '.sparse.bin') suffix
+        sparse : bool, optional
+            If True, the graph is stored in sparse form
+        dtype : numpy dtype, optional
+            Type of the affinity values
+
+        Returns
+        -------
+        ApplicationGraph or SparseApplicationGraph object
+            Application graph (memory-mapped from the cache)
+        """
+        if cache_file is None:
+            cache_file = csv_file + ('.sparse.bin' if sparse else '.bin')
+        source_hash = file_hash(csv_file)
+        if stored_hash(cache_file) != source_hash:
+            if sparse:
+                application = SparseApplicationGraph.from_csv(csv_file, dtype)
+            else:
+                application = ApplicationGraph(csv_file, dtype)
+            # Writes to a temporary file first so concurrent readers never see partial caches
+            temporary = f'{cache_file}.{os.getpid()}.tmp'
+            application.save(temporary, source_hash)
+            os.replace(temporary, cache_file)
+        return ApplicationGraph.load(cache_file)
 
     def get_affinity(self, source, dest):
         """Alternative method to get the affinity between two tasks
@@ -86,3 +247,479 @@ class ApplicationGraph:
             List of task identifiers whose affinity to the source task is not zero
         """
         return np.nonzero(self.affinity[task])[0]
+
+    def edges(self):
+        """Lists the interactions between tasks, each one counted once
+
+        Returns
+        -------
+        tuple of np.ndarray
+            Source tasks, destination tasks (always greater than the sources)
+            and affinities of all the non-zero interactions
+        """
+        sources, dests = np.nonzero(np.triu(self.affinity, 1))
+        return sources, dests, self.affinity[sources, dests]
+
+
+class SparseApplicationGraph(ApplicationGraph):
+    """Representation of an application's communication graph in compressed sparse row form
+
+    Only non-zero affinities are stored, so memory grows with the number of
+    interactions instead of the square of the number of tasks.
+
+    Attributes
+    ----------
+    num_tasks : int
+        Number of tasks in the application
+    indptr : np.ndarray
+        Position in indices and data where the row of each task starts
+    indices : np.ndarray
+        Destination task of each stored affinity (sorted inside each row)
+    data : np.ndarray
+        Non-zero affinity values
+
+    Raises
+    ------
+    ValueError
+        If the values contain NaN or negative values, or the structure is inconsistent.
+    """
+    def __init__(self, indptr, indices, data, check=True):
+        """Creates the graph from its CSR arrays (integrity checks can be skipped)"""
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.data = np.asarray(data)
+        self.num_tasks = len(self.indptr) - 1
+        self._loads = None
+        if not check:
+            return
+        # Integrity check
+        if np.isnan(self.data).any():
+            print("* The sparse communication matrix contains NaN values.")
+            raise ValueError
+        if len(self.data) > 0 and np.min(self.data) < 0.:
+            print("* The sparse communication matrix contains negative values.")
+            raise ValueError
+        if (len(self.indices) != len(self.data) or self.indptr[-1] != len(self.data) or
+                (len(self.indices) > 0 and (self.indices.min() < 0 or self.indices.max() >= self.num_tasks))):
+            print("* The sparse communication matrix has an inconsistent structure.")
+            raise ValueError
+
+    @staticmethod
+    def from_edges(sources, dests, weights, num_tasks):
+        """Builds a sparse application graph from a list of interactions
+
+        Repeated pairs of tasks have their affinities added, and zero
+        affinities are dropped.
+
+        Parameters
+        ----------
+        sources : array of int
+            Source task of each interaction
+        dests : array of int
+            Destination task of each interaction
+        weights : array of float
+            Affinity of each interaction
+        num_tasks : int
+            Number of tasks in the application
+
+        Returns
+        -------
+        SparseApplicationGraph object
+            Application graph containing the interactions
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        dests = np.asarray(dests, dtype=np.int64)
+        weights = np.asarray(weights)
+        if len(sources) > 0 and (min(sources.min(), dests.min()) < 0 or
+                                 max(sources.max(), dests.max()) >= num_tasks):
+            print(f"* The interactions refer to tasks outside the range of {num_tasks} tasks.")
+            raise ValueError
+        # Sorts the interactions by row and column, merging repeated pairs
+        keys, positions = np.unique(sources * num_tasks + dests, return_inverse=True)
+        values = np.zeros(len(keys), dtype=weights.dtype)
+        np.add.at(values, positions, weights)
+        keys = keys[values != 0]
+        values = values[values != 0]
+        rows = keys // num_tasks
+        indptr = np.zeros(num_tasks + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=num_tasks), out=indptr[1:])
+        return SparseApplicationGraph(indptr, keys % num_tasks, values)
+
+    @staticmethod
+    def from_dense(affinity):
+        """Builds a sparse application graph from a matrix of affinities
+
+        Parameters
+        ----------
+        affinity : np.ndarray
+            Square matrix representing the affinity between application tasks
+
+        Returns
+        -------
+        SparseApplicationGraph object
+            Application graph containing the non-zero affinities
+        """
+        affinity = np.asarray(affinity)
+        sources, dests = np.nonzero(affinity)
+        return SparseApplicationGraph.from_edges(sources, dests, affinity[sources, dests],
+                                                 affinity.shape[0])
+
+    @staticmethod
+    def from_csv(csv_file, dtype=np.float64):
+        """Reads a sparse application graph from a CSV file containing the full matrix
+
+        The file is parsed in chunks, so the dense matrix is never materialized.
+
+        Parameters
+        ----------
+        csv_file : string
+            File containing the matrix of affinities between tasks
+        dtype : numpy dtype, optional
+            Type of the affinity values
+
+        Returns
+        -------
+        SparseApplicationGraph object
+            Application graph read from file
+        """
+        indptr, indices, data = read_sparse_matrix(csv_file, dtype=dtype,
+                                                   description='communication matrix')
+        return SparseApplicationGraph(indptr, indices, data)
+
+    @staticmethod
+    def from_edge_list(edge_file, num_tasks=None, dtype=np.float64, symmetric=True):
+        """Reads a sparse application graph from an edge list file
+
+        Parameters
+        ----------
+        edge_file : string
+            File containing one 'source,destination,volume' interaction per line
+        num_tasks : int, optional
+            Number of tasks. If absent, it is inferred from the largest task identifier
+        dtype : numpy dtype, optional
+            Type of the affinity values
+        symmetric : bool, optional
+            If True, each volume is also added in the opposite direction
+
+        Returns
+        -------
+        SparseApplicationGraph object
+            Application graph read from file
+        """
+        sources, dests, volumes, num_tasks = read_edge_list(edge_file, num_tasks, dtype, symmetric)
+        return SparseApplicationGraph.from_edges(sources, dests, volumes, num_tasks)
+
+    def save(self, path, source_hash=None):
+        """Writes the sparse application graph to a binary file
+
+        Parameters
+        ----------
+        path : string
+            Destination file
+        source_hash : string, optional
+            Hash of the file the graph was read from
+        """
+        save_arrays(path, 'sparse_application',
+                    {'indptr': self.indptr, 'indices': self.indices, 'data': self.data,
+                     **self._stored_loads()},
+                    source_hash)
+
+    @property
+    def affinity(self):
+        """Dense matrix of affinities (materialized on every access)
+
+        Returns
+        -------
+        np.ndarray
+            Matrix representing the affinity between application tasks
+        """
+        affinity = np.zeros((self.num_tasks, self.num_tasks), dtype=self.data.dtype)
+        rows = np.repeat(np.arange(self.num_tasks), np.diff(self.indptr))
+        affinity[rows, self.indices] = self.data
+        return affinity
+
+    def get_affinity(self, source, dest):
+        """Alternative method to get the affinity between two tasks
+
+        Parameters
+        ----------
+        source : int
+            Identifier of the source task
+        dest : int or np.ndarray
+            Identifier(s) of the destination task(s)
+
+        Returns
+        -------
+        numpy.float64 or np.ndarray
+            Value of the affinity between the tasks
+        """
+        start, end = self.indptr[source], self.indptr[source + 1]
+        dest = np.asarray(dest)
+        if start == end:
+            return np.zeros(dest.shape, dtype=self.data.dtype)[()]
+        row = self.indices[start:end]
+        # Binary search of the destinations in the (sorted) row
+        positions = np.minimum(np.searchsorted(row, dest), end - start - 1)
+        found = row[positions] == dest
+        return np.where(found, self.data[start:end][positions], 0)[()]
+
+    def max_affinity(self):
+        """Returns the maximum affinity value
+
+        Returns
+        -------
+        numpy.float64
+            Maximum affinity value
+        """
+        if len(self.data) == 0:
+            return self.data.dtype.type(0)
+        return np.max(self.data)
+
+    def neighbors(self, task):
+        """Finds the neighbors of a given task
+
+        Parameters
+        ----------
+        task : int
+            Source task identifier
+
+        Returns
+        -------
+        np.array
+            List of task identifiers whose affinity to the source task is not zero
+        """
+        return self.indices[self.indptr[task]:self.indptr[task + 1]]
+
+    def edges(self):
+        """Lists the interactions between tasks, each one counted once
+
+        Returns
+        -------
+        tuple of np.ndarray
+            Source tasks, destination tasks (always greater than the sources)
+            and affinities of all the stored interactions
+        """
+        rows = np.repeat(np.arange(self.num_tasks), np.diff(self.indptr))
+        upper = self.indices > rows
+        return rows[upper], self.indices[upper], self.data[upper]
+
+
+class PackedApplicationGraph(ApplicationGraph):
+    """Representation of an application's communication graph storing only the upper triangle
+
+    Affinities are symmetric, so the upper triangle of the matrix (with the
+    diagonal) is stored row by row with the narrowest exact type (see
+    simulator.packing), e.g. float32 volumes: from 2 to 16 times less memory
+    than a full float64 matrix, while any affinity is still found in O(1).
+    Affinities read through the methods are widened to int64 or float64.
+
+    Attributes
+    ----------
+    num_tasks : int
+        Number of tasks in the application
+    packed : np.ndarray
+        Packed upper triangle of the matrix of affinities
+    loads : np.ndarray
+        Compute weight of each task (one per task unless set)
+
+    Raises
+    ------
+    ValueError
+        If the packed values do not match the number of tasks, or contain
+        NaN or negative values
+    """
+    def __init__(self, packed, num_tasks, check=True):
+        """Creates the graph from its packed affinities (integrity checks can be skipped)"""
+        self.packed = np.asanyarray(packed)
+        self.num_tasks = num_tasks
+        self._loads = None
+        if not check:
+            return
+        # Integrity check
+        if self.packed.shape != (packed_size(num_tasks),):
+            print(f"* The packed communication matrix has {self.packed.size} values for {num_tasks} tasks.")
+            raise ValueError
+        if np.issubdtype(self.packed.dtype, np.floating) and np.isnan(self.packed).any():
+            print("* The packed communication matrix contains NaN values.")
+            raise ValueError
+        if self.packed.size > 0 and np.min(self.packed) < 0:
+            print("* The packed communication matrix contains negative values.")
+            raise ValueError
+
+    @staticmethod
+    def from_matrix(affinity, dtype=None):
+        """Packs a symmetric matrix of affinities
+
+        Parameters
+        ----------
+        affinity : np.ndarray
+            Square matrix representing the affinity between application tasks
+        dtype : numpy dtype, optional
+            Type of the stored affinities. Default: the narrowest exact type
+
+        Returns
+        -------
+        PackedApplicationGraph object
+            Application graph with the packed affinities
+
+        Raises
+        ------
+        ValueError
+            If the matrix contains NaN, negative values, or it is not square
+            or not symmetric
+        """
+        affinity = ApplicationGraph.from_matrix(affinity).affinity
+        if not is_symmetric(affinity):
+            print("* The communication matrix is not symmetric.")
+            raise ValueError
+        return PackedApplicationGraph(pack_matrix(affinity, dtype), len(affinity))
+
+    @staticmethod
+    def from_application(application, dtype=None):
+        """Packs the affinities of an application graph, keeping its task loads
+
+        Only the upper triangle is read, as in compute_hopbytes. Sparse
+        graphs are packed without building their dense matrix.
+
+        Parameters
+        ----------
+        application : ApplicationGraph object
+            Application's communication graph
+        dtype : numpy dtype, optional
+            Type of the stored affinities. Default: the narrowest exact type
+
+        Returns
+        -------
+        PackedApplicationGraph object
+            Application graph with the packed affinities
+        """
+        num_tasks = application.num_tasks
+        if isinstance(application, SparseApplicationGraph):
+            rows = np.repeat(np.arange(num_tasks), np.diff(application.indptr))
+            upper = application.indices >= rows
+            values = application.data[upper]
+            packed = np.zeros(packed_size(num_tasks), dtype=narrowest_dtype(values) if dtype is None else dtype)
+            packed[packed_index(num_tasks, rows[upper], application.indices[upper])] = values
+        else:
+            packed = pack_matrix(application.affinity, dtype)
+        packed_application = PackedApplicationGraph(packed, num_tasks, check=False)
+        packed_application.loads = application._loads
+        return packed_application
+
+    @staticmethod
+    def from_csv(csv_file, dtype=None):
+        """Reads a symmetric matrix of affinities from a CSV file into packed form
+
+        The full matrix is never built.
+
+        Parameters
+        ----------
+        csv_file : string
+            File containing the matrix of affinities between tasks
+        dtype : numpy dtype, optional
+            Type of the stored affinities. Default: the narrowest exact type
+
+        Returns
+        -------
+        PackedApplicationGraph object
+            Application graph read from file
+        """
+        packed, num_tasks = read_packed_matrix(csv_file, dtype=dtype, description='communication matrix')
+        return PackedApplicationGraph(packed, num_tasks, check=False)
+
+    def save(self, path, source_hash=None):
+        """Writes the packed application graph to a binary file
+
+        Parameters
+        ----------
+        path : string
+            Destination file
+        source_hash : string, optional
+            Hash of the file the graph was read from
+        """
+        save_arrays(path, 'packed_application', {'packed': self.packed, **self._stored_loads()},
+                    source_hash)
+
+    @property
+    def affinity(self):
+        """Full matrix of affinities (materialized on every access)
+
+        Returns
+        -------
+        np.ndarray
+            Matrix representing the affinity between application tasks
+        """
+        return unpack_matrix(self.packed, self.num_tasks)
+
+    def get_affinity(self, source, dest):
+        """Alternative method to get the affinity between two tasks
+
+        Parameters
+        ----------
+        source : int or np.ndarray
+            Identifier(s) of the source task(s)
+        dest : int or np.ndarray
+            Identifier(s) of the destination task(s)
+
+        Returns
+        -------
+        numpy.float64 or np.ndarray
+            Value of the affinity between the tasks
+        """
+        return widen(self.packed[packed_index(self.num_tasks, source, dest)])[()]
+
+    def get_affinities(self, task):
+        """Extracts the affinities between a task and all tasks
+
+        Parameters
+        ----------
+        task : int
+            Task identifier
+
+        Returns
+        -------
+        np.ndarray
+            Affinity with each task (the row of the task in the matrix)
+        """
+        return widen(packed_rows(self.packed, self.num_tasks, task))
+
+    def max_affinity(self):
+        """Returns the maximum affinity value
+
+        Returns
+        -------
+        numpy.float64
+            Maximum affinity value
+        """
+        if self.packed.size == 0:
+            return self.packed.dtype.type(0)
+        return np.max(self.packed)
+
+    def neighbors(self, task):
+        """Finds the neighbors of a given task
+
+        Parameters
+        ----------
+        task : int
+            Source task identifier
+
+        Returns
+        -------
+        np.array
+            List of task identifiers whose affinity to the source task is not zero
+        """
+        return np.nonzero(self.get_affinities(task))[0]
+
+    def edges(self):
+        """Lists the interactions between tasks, each one counted once
+
+        Returns
+        -------
+        tuple of np.ndarray
+            Source tasks, destination tasks (always greater than the sources)
+            and affinities of all the non-zero interactions
+        """
+        positions = np.flatnonzero(self.packed)
+        sources, dests = packed_positions(self.num_tasks, positions)
+        upper = dests > sources
+        return sources[upper], dests[upper], widen(self.packed[positions[upper]])
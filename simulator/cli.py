@@ -0,0 +1,391 @@
+"""Command-line interface of the simulator.
+
+Subcommands:
+- map: maps an application on a topology with a scheduler, and writes the
+  mapping and its metrics as JSON
+- batch: runs the jobs of a manifest in a pool of worker processes, and
+  writes one JSON line per job as soon as it finishes
+
+Applications are read from CSV matrices, binary files (see
+simulator.storage) or edge lists. Topologies are read from CSV matrices or
+binary files, or generated from a specification such as 'tree:2,2,2'
+(a TopologyTree), 'mesh:4,4' or 'torus:4,4'.
+
+Only the standard library is imported at startup: NumPy and the modules
+of the simulator are imported by the commands that need them. Inputs are
+kept by each process, so the jobs of a batch sharing an application or a
+topology read it once per worker.
+
+Examples
+--------
+$ python -m simulator map inputs/simple_comm.csv tree:2,2 --scheduler eagermap
+$ python -m simulator map app.edges topo.bin -s recursive_bisection -o seed=0 --output result.json
+$ python -m simulator batch jobs.jsonl --workers 4 --output results.jsonl
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+# Schedulers available by name (they all receive an application and a topology)
+SCHEDULERS = ['compact', 'greedy_pairs', 'greedy_pairs_with_topology', 'eagermap', 'treematch',
+              'recursive_bisection']
+# Schedulers that only accept TopologyTree objects
+TREE_SCHEDULERS = ['eagermap', 'treematch']
+# Formats of the application files
+FORMATS = ['auto', 'csv', 'sparse', 'packed', 'edges', 'bin']
+# Generated topologies, by prefix of their specification
+GENERATED = ['tree', 'mesh', 'torus']
+
+# Inputs read by this process, by file (and modification time) or specification
+_inputs = {}
+
+
+def _file_key(path):
+    status = os.stat(path)
+    return (os.path.abspath(path), status.st_mtime_ns, status.st_size)
+
+
+def read_application(path, file_format='auto'):
+    """Reads an application graph, reusing it if this process already read it
+
+    Parameters
+    ----------
+    path : string
+        File containing the application
+    file_format : string, optional
+        'csv' (dense matrix), 'sparse' or 'packed' (matrix stored in
+        sparse or packed form), 'edges' (edge list), 'bin' (binary file),
+        or 'auto' to use the extension ('.bin', '.csv', or an edge list
+        otherwise)
+
+    Returns
+    -------
+    ApplicationGraph object
+        Application's communication graph
+
+    Raises
+    ------
+    ValueError
+        If the format is unknown or the file is invalid
+    """
+    if file_format == 'auto':
+        extension = os.path.splitext(path)[1].lower()
+        file_format = {'.bin': 'bin', '.csv': 'csv'}.get(extension, 'edges')
+    if file_format not in FORMATS:
+        print(f"* Unknown application format {file_format}.")
+        raise ValueError
+    key = ('application', file_format) + _file_key(path)
+    if key not in _inputs:
+        from simulator.application import ApplicationGraph, SparseApplicationGraph, PackedApplicationGraph
+        if file_format == 'bin':
+            application = ApplicationGraph.load(path)
+        elif file_format == 'sparse':
+            application = SparseApplicationGraph.from_csv(path)
+        elif file_format == 'packed':
+            application = PackedApplicationGraph.from_csv(path)
+        elif file_format == 'edges':
+            application = SparseApplicationGraph.from_edge_list(path)
+        else:
+            application = ApplicationGraph(path)
+        _inputs[key] = application
+    return _inputs[key]
+
+
+def read_topology(specification, packed=False):
+    """Reads or generates a topology, reusing it if this process already has it
+
+    Parameters
+    ----------
+    specification : string
+        CSV or binary ('.bin') file, or 'tree:2,2,2' (arity of each level),
+        'mesh:4,4' or 'torus:4,4' (cores along each dimension)
+    packed : bool, optional
+        If True, the distances of a CSV file are stored in packed form
+
+    Returns
+    -------
+    Topology object
+        Machine topology graph
+
+    Raises
+    ------
+    ValueError
+        If the specification or the file is invalid
+    """
+    kind, _, arguments = specification.partition(':')
+    if kind in GENERATED and arguments:
+        key = ('topology', specification)
+    else:
+        key = ('topology', packed) + _file_key(specification)
+    if key not in _inputs:
+        if kind in GENERATED and arguments:
+            try:
+                sizes = [int(size) for size in arguments.split(',')]
+            except ValueError:
+                print(f"* Invalid topology specification {specification}.")
+                raise ValueError
+            if kind == 'tree':
+                from simulator.topology import TopologyTree
+                topology = TopologyTree(sizes)
+            else:
+                from simulator.synthetic import mesh
+                topology = mesh(sizes, periodic=kind == 'torus')
+        elif specification.lower().endswith('.bin'):
+            from simulator.topology import Topology
+            topology = Topology.load(specification)
+        elif packed:
+            from simulator.topology import PackedTopology
+            topology = PackedTopology.from_csv(specification)
+        else:
+            from simulator.topology import Topology
+            topology = Topology.from_csv(specification)
+        _inputs[key] = topology
+    return _inputs[key]
+
+
+def parse_options(options):
+    """Converts 'name=value' strings into scheduler parameters
+
+    Values are parsed as JSON when possible (e.g. numbers, true, null),
+    and kept as strings otherwise.
+
+    Raises
+    ------
+    ValueError
+        If an option has no '='
+    """
+    parameters = {}
+    for option in options or []:
+        name, separator, value = option.partition('=')
+        if not separator:
+            print(f"* Invalid scheduler option {option} (expected name=value).")
+            raise ValueError
+        try:
+            parameters[name] = json.loads(value)
+        except ValueError:
+            parameters[name] = value
+    return parameters
+
+
+def run_job(job):
+    """Maps the application of a job and measures the mapping
+
+    Parameters
+    ----------
+    job : dict
+        'application' and 'topology' (see read_application and
+        read_topology), and optionally 'name', 'scheduler' (default:
+        'greedy_pairs'), 'options' (dict of scheduler parameters),
+        'format' (of the application), 'packed' (bool), 'extract_tree'
+        (bool: tree schedulers run on a tree extracted from the
+        distances), 'refine' (bool or dict of refine parameters) and
+        'cache' (directory of a MappingCache)
+
+    Returns
+    -------
+    dict
+        The job, with 'status' ('ok' or 'error'), and for successful jobs
+        'mapping', 'hopbytes', 'imbalance', 'num_tasks', 'num_cores',
+        'time' (seconds spent mapping) and 'cached'; or 'error' otherwise
+        (the messages printed by the simulator, which are kept out of the
+        standard output)
+    """
+    result = dict(job)
+    messages = io.StringIO()
+    try:
+        with redirect_stdout(messages):
+            _map_job(job, result)
+    except Exception as error:
+        result.update({'status': 'error', 'error': messages.getvalue().strip() or repr(error)})
+    return result
+
+
+def _map_job(job, result):
+    """Maps the application of a job, adding the mapping and its metrics to the result"""
+    name = job.get('scheduler', 'greedy_pairs')
+    if name not in SCHEDULERS:
+        print(f"* Unknown scheduler {name} (available: {', '.join(SCHEDULERS)}).")
+        raise ValueError
+    application = read_application(job['application'], job.get('format', 'auto'))
+    topology = read_topology(job['topology'], job.get('packed', False))
+    from functools import partial
+    from simulator import schedulers
+    from simulator.support import compute_hopbytes, compute_load_imbalance
+    scheduler = getattr(schedulers, name)
+    options = job.get('options', {})
+    if options:
+        scheduler = partial(scheduler, **options)
+    if job.get('extract_tree') and name in TREE_SCHEDULERS:
+        from simulator.hierarchy import map_on_extracted_tree
+        scheduler = partial(map_on_extracted_tree, scheduler=scheduler)
+    if job.get('refine'):
+        from simulator.portfolio import Refined
+        scheduler = Refined(scheduler, **(job['refine'] if isinstance(job['refine'], dict) else {}))
+    start = time.perf_counter()
+    if job.get('cache'):
+        from simulator.memo import MappingCache
+        mapped = MappingCache(job['cache']).map(scheduler, application, topology)
+        mapping, hopbytes, cached = mapped['mapping'], mapped['hopbytes'], mapped['cached']
+    else:
+        mapping = [int(core) for core in scheduler(application, topology)]
+        hopbytes, cached = None, False
+    result['time'] = time.perf_counter() - start
+    if hopbytes is None:
+        hopbytes = float(compute_hopbytes(application, topology, mapping))
+    result.update({'status': 'ok', 'mapping': mapping, 'hopbytes': hopbytes,
+                   'imbalance': float(compute_load_imbalance(application, topology, mapping)),
+                   'num_tasks': application.num_tasks, 'num_cores': topology.num_cores,
+                   'cached': cached})
+
+
+def read_manifest(path):
+    """Reads the jobs of a manifest
+
+    A manifest is either a JSON lines file with one job per line, or a JSON
+    file with a list of jobs or an object {"defaults": {...}, "jobs": [...]}
+    whose defaults apply to every job. Relative paths are relative to the
+    manifest.
+
+    Raises
+    ------
+    ValueError
+        If the manifest is not valid JSON or contains no jobs
+    """
+    with open(path) as stream:
+        text = stream.read()
+    try:
+        content = json.loads(text)
+    except ValueError:
+        try:
+            content = [json.loads(line) for line in text.splitlines() if line.strip()]
+        except ValueError:
+            print(f"* The manifest {path} is not valid JSON or JSON lines.")
+            raise ValueError
+    defaults = {}
+    if isinstance(content, dict):
+        defaults = content.get('defaults', {})
+        content = content.get('jobs', [])
+    if not isinstance(content, list) or not all(isinstance(job, dict) for job in content):
+        print(f"* The manifest {path} does not contain a list of jobs.")
+        raise ValueError
+    base = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    for number, job in enumerate(content):
+        job = {**defaults, **job}
+        job.setdefault('name', str(number))
+        for field in ['application', 'topology', 'cache']:
+            value = job.get(field)
+            if isinstance(value, str) and not (field == 'topology' and value.partition(':')[0] in GENERATED):
+                job[field] = os.path.join(base, value)
+        jobs.append(job)
+    return jobs
+
+
+def run_batch(jobs, workers=1):
+    """Runs many jobs, generating their results as soon as they finish
+
+    Parameters
+    ----------
+    jobs : list of dict
+        Jobs (see run_job)
+    workers : int, optional
+        Number of worker processes (with one, jobs run in this process, in order)
+
+    Yields
+    ------
+    dict
+        Result of each job (see run_job), in order of completion
+    """
+    if workers <= 1:
+        for job in jobs:
+            yield run_job(job)
+        return
+    import multiprocessing
+    with multiprocessing.Pool(workers) as pool:
+        yield from pool.imap_unordered(run_job, jobs)
+
+
+def _write(result, stream):
+    stream.write(json.dumps(result) + '\n')
+    stream.flush()
+
+
+def _map_command(options):
+    job = {'application': options.application, 'topology': options.topology,
+           'scheduler': options.scheduler, 'options': parse_options(options.option),
+           'format': options.format, 'packed': options.packed, 'extract_tree': options.extract_tree,
+           'refine': options.refine, 'cache': options.cache}
+    result = run_job(job)
+    text = json.dumps(result, indent=1)
+    if options.output is not None:
+        with open(options.output, 'w') as stream:
+            stream.write(text + '\n')
+    else:
+        print(text)
+    if result['status'] != 'ok':
+        print(f"* The mapping failed: {result['error']}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _batch_command(options):
+    jobs = read_manifest(options.manifest)
+    if options.cache is not None:
+        for job in jobs:
+            job.setdefault('cache', options.cache)
+    stream = sys.stdout if options.output is None else open(options.output, 'w')
+    failures = 0
+    try:
+        for result in run_batch(jobs, options.workers):
+            failures += result['status'] != 'ok'
+            _write(result, stream)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    if failures:
+        print(f"* {failures} of {len(jobs)} jobs failed.", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(prog='python -m simulator',
+                                     description='Maps applications on machine topologies')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    mapper = commands.add_parser('map', help='maps an application on a topology')
+    mapper.add_argument('application', help='application file (CSV matrix, binary or edge list)')
+    mapper.add_argument('topology', help="topology file (CSV matrix or binary), or 'tree:2,2,2', "
+                        "'mesh:4,4' or 'torus:4,4'")
+    mapper.add_argument('-s', '--scheduler', choices=SCHEDULERS, default='greedy_pairs')
+    mapper.add_argument('-o', '--option', action='append', metavar='NAME=VALUE',
+                        help='parameter of the scheduler (repeatable)')
+    mapper.add_argument('--format', choices=FORMATS, default='auto', help='format of the application file')
+    mapper.add_argument('--packed', action='store_true', help='store CSV distances in packed form')
+    mapper.add_argument('--extract-tree', action='store_true',
+                        help='run tree schedulers on a tree extracted from the distances')
+    mapper.add_argument('--refine', action='store_true', help='refine the mapping by swapping tasks')
+    mapper.add_argument('--cache', help='directory of a cache of mappings')
+    mapper.add_argument('--output', help='JSON file where the result is written (default: standard output)')
+    mapper.set_defaults(run=_map_command)
+
+    batch = commands.add_parser('batch', help='runs the jobs of a manifest')
+    batch.add_argument('manifest', help='JSON or JSON lines file with one job per entry')
+    batch.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1,
+                       help='number of worker processes')
+    batch.add_argument('--cache', help='directory of a cache of mappings shared by the jobs')
+    batch.add_argument('--output', help='JSON lines file where results are written (default: standard output)')
+    batch.set_defaults(run=_batch_command)
+
+    options = parser.parse_args(arguments)
+    try:
+        return options.run(options)
+    except (ValueError, OSError) as error:
+        if isinstance(error, OSError):
+            print(f"* {error}", file=sys.stderr)
+        return 1
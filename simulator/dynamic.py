@@ -0,0 +1,80 @@
+"""Module containing the remapping of applications whose communication changes over time.
+
+An execution is described as a sequence of phases, each with its own
+communication graph. Before each phase, the tasks can be remapped to
+better fit its communication, but migrating a task costs its migration
+cost for each hop between its old core and its new one. The mapping of
+the previous phase is the starting point (warm start) of the next one,
+so a phase only moves the tasks whose migration pays off.
+"""
+
+import numpy as np
+
+from simulator.application import ApplicationGraph
+from simulator.schedulers import greedy_pairs, refine
+from simulator.support import compute_hopbytes, HopBytesEvaluator
+
+
+def remap_phases(phases, topology, migration_cost=1., initial_mapping=None,
+                 scheduler=None, budget=1., seed=None):
+    """Maps the tasks of an application for each phase of its execution
+
+    Parameters
+    ----------
+    phases : list of ApplicationGraph objects or np.ndarray
+        Communication graph (or affinity matrix) of each phase
+    topology : Topology object
+        Machine topology graph
+    migration_cost : float or np.ndarray, optional
+        Cost per hop of migrating each task between two phases
+    initial_mapping : list of int, optional
+        Mapping of tasks to cores before the first phase. Default: computed
+        by the scheduler for the first phase, without migration cost
+    scheduler : function, optional
+        Scheduler computing a fresh mapping for each phase, which competes
+        with the warm start. Default: greedy_pairs for the initial mapping
+        only, and no fresh mappings afterwards
+    budget : float, optional
+        Maximum time in seconds for the refinement of each mapping
+    seed : int, optional
+        Seed for the random choices
+
+    Returns
+    -------
+    list of dict
+        For each phase, the 'mapping' used, its 'hopbytes' and the
+        'migration' cost paid to reach it, the hopbytes the phase would have
+        had by keeping the previous mapping ('stay_hopbytes'), and whether
+        the tasks were 'remapped'
+
+    Raises
+    ------
+    ValueError
+        If a mapping is invalid (see compute_hopbytes)
+    """
+    phases = [phase if isinstance(phase, ApplicationGraph) else ApplicationGraph.from_matrix(phase)
+              for phase in phases]
+    generator = np.random.default_rng(seed)
+    previous = initial_mapping
+    if previous is None and phases:
+        previous = (greedy_pairs if scheduler is None else scheduler)(phases[0], topology)
+    results = []
+    for phase in phases:
+        stay_hopbytes = compute_hopbytes(phase, topology, previous)
+        candidates = [refine(phase, topology, previous, budget=budget, seed=generator.integers(2**32),
+                             origin=previous, migration_cost=migration_cost)]
+        if scheduler is not None:
+            candidates.append(refine(phase, topology, scheduler(phase, topology), budget=budget,
+                                     seed=generator.integers(2**32),
+                                     origin=previous, migration_cost=migration_cost))
+        evaluators = [HopBytesEvaluator(phase, topology, mapping, previous, migration_cost)
+                      for mapping in candidates]
+        best = min(evaluators, key=lambda evaluator: evaluator.total)
+        mapping = [int(core) for core in best.mapping]
+        results.append({'mapping': mapping,
+                        'hopbytes': float(best.total - best.migration),
+                        'migration': float(best.migration),
+                        'stay_hopbytes': float(stay_hopbytes),
+                        'remapped': mapping != [int(core) for core in previous]})
+        previous = mapping
+    return results
@@ -0,0 +1,183 @@
+"""Module containing the extraction of tree topologies from matrices of distances.
+
+Hierarchical schedulers (e.g. eagermap and treematch) require a
+TopologyTree, while many machines are described by a matrix of distances
+between their cores. The hierarchy of the cores is found by single-linkage
+clustering: cores are merged into clusters by increasing distance, and
+each distinct merge distance becomes a level of the tree. The clustering
+follows a minimum spanning tree built with Prim's algorithm in O(n^2).
+
+When the matrix is ultrametric (as the distances of a tree whose cores
+are all at the same depth), the tree found has exactly the same structure.
+Otherwise, the tree is the one of the closest ultrametric below the
+distances (the subdominant ultrametric). Nodes of the tree can have
+different numbers of children, and the links of each level are weighted
+so that distances in the tree are the merge distances of the clusters.
+"""
+
+import numpy as np
+
+from simulator.topology import TopologyTree
+
+
+def _minimum_spanning_tree(distances):
+    """Edges of a minimum spanning tree of the cores, sorted by weight (Prim's algorithm)"""
+    num_cores = len(distances)
+    connected = np.zeros(num_cores, dtype=bool)
+    closest = np.zeros(num_cores, dtype=np.int64)
+    best = distances[0].astype(np.float64)
+    connected[0] = True
+    best[0] = np.inf
+    sources = np.zeros(num_cores - 1, dtype=np.int64)
+    dests = np.zeros(num_cores - 1, dtype=np.int64)
+    weights = np.zeros(num_cores - 1)
+    for edge in range(num_cores - 1):
+        core = np.argmin(best)
+        sources[edge], dests[edge], weights[edge] = closest[core], core, best[core]
+        connected[core] = True
+        best[core] = np.inf
+        closer = ~connected & (distances[core] < best)
+        best[closer] = distances[core][closer]
+        closest[closer] = core
+    order = np.argsort(weights, kind='stable')
+    return sources[order], dests[order], weights[order]
+
+
+def _cluster_levels(distances):
+    """Single-linkage clusters of the cores at each distinct merge distance
+
+    Returns the merge distances in increasing order, and the label of the
+    cluster of each core at each of these distances (one row per distance).
+    """
+    num_cores = len(distances)
+    sources, dests, weights = _minimum_spanning_tree(distances)
+    parent = np.arange(num_cores)
+
+    def find(core):
+        while parent[core] != core:
+            parent[core] = parent[parent[core]]
+            core = parent[core]
+        return core
+
+    heights, labels = [], []
+    for edge in range(len(weights)):
+        parent[find(sources[edge])] = find(dests[edge])
+        if edge == len(weights) - 1 or weights[edge + 1] != weights[edge]:
+            # Follows the parents to the roots for all cores at once
+            roots = parent.copy()
+            while True:
+                next_roots = roots[roots]
+                if np.array_equal(next_roots, roots):
+                    break
+                roots = next_roots
+            heights.append(weights[edge])
+            labels.append(roots)
+    return np.array(heights), np.array(labels).reshape(len(heights), num_cores)
+
+
+def _merge_heights(order, heights, labels):
+    """Cophenetic distances between the cores sorted in the order of the clusters
+
+    As the clusters are contiguous in the order, the merge distance of two
+    cores is the largest merge distance between consecutive cores between them.
+    """
+    same = labels[:, order[:-1]] == labels[:, order[1:]]
+    gaps = heights[np.argmax(same, axis=0)]
+    merges = np.zeros((len(order), len(order)))
+    for position in range(len(order) - 1):
+        merges[position, position + 1:] = np.maximum.accumulate(gaps[position:])
+    return merges + merges.T
+
+
+def _symmetric(distances):
+    distances = np.asarray(distances, dtype=np.float64)
+    return np.maximum(distances, distances.T)
+
+
+def is_ultrametric(distances, tolerance=0.):
+    """Checks whether a matrix of distances is ultrametric
+
+    A matrix is ultrametric when it is symmetric, its diagonal is zero, and
+    d(a,c) <= max(d(a,b), d(b,c)) for all cores a, b and c. The distances
+    of a tree with all cores at the same depth are ultrametric.
+
+    Parameters
+    ----------
+    distances : np.ndarray
+        Matrix of distances between cores
+    tolerance : float, optional
+        Largest difference tolerated between distances considered equal
+
+    Returns
+    -------
+    bool
+        True if the matrix is ultrametric
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    if (np.abs(distances - distances.T) > tolerance).any() or (np.abs(np.diag(distances)) > tolerance).any():
+        return False
+    if len(distances) < 3:
+        return True
+    heights, labels = _cluster_levels(distances)
+    order = np.lexsort(np.vstack([np.arange(len(distances)), labels]))
+    merges = _merge_heights(order, heights, labels)
+    return bool((np.abs(merges - distances[np.ix_(order, order)]) <= tolerance).all())
+
+
+def extract_tree(topology):
+    """Builds a tree topology with the hierarchy of the cores of a topology
+
+    Parameters
+    ----------
+    topology : Topology object
+        Machine topology graph (if not symmetric, the largest distance of
+        each pair of cores is used)
+
+    Returns
+    -------
+    tuple
+        TopologyTree object, and np.ndarray with the core of the topology
+        corresponding to each core of the tree. A mapping on the tree is
+        converted to the topology by indexing this array with it
+    """
+    distances = _symmetric(topology.distances)
+    num_cores = len(distances)
+    if num_cores < 2:
+        return TopologyTree([1]), np.arange(num_cores)
+    heights, labels = _cluster_levels(distances)
+    # Clusters become contiguous when the cores are sorted by their labels from the root down
+    labels = np.vstack([np.arange(num_cores), labels])
+    order = np.lexsort(labels)
+    # Clusters start where the labels change, and their children where the labels of the level below change
+    starts = [np.flatnonzero(np.r_[True, row[order][1:] != row[order][:-1]]) for row in labels]
+    arity = []
+    for level in range(len(heights), 0, -1):
+        children = np.diff(np.searchsorted(starts[level - 1], np.r_[starts[level], num_cores]))
+        arity.append(int(children[0]) if (children == children[0]).all() else children.tolist())
+    # The distance between cores with their lowest common ancestor at a level
+    # is twice the weight of the links below that level
+    costs = np.r_[heights[::-1], 0.]
+    weights = (costs[:-1] - costs[1:]) / 2
+    weights = [int(weight) if weight.is_integer() else float(weight) for weight in weights]
+    return TopologyTree(arity, weights), order
+
+
+def map_on_extracted_tree(application, topology, scheduler):
+    """Maps tasks with a hierarchical scheduler on a topology given by distances
+
+    Parameters
+    ----------
+    application : ApplicationGraph object
+        Application's communication graph
+    topology : Topology object
+        Machine topology graph
+    scheduler : function
+        Scheduler requiring a TopologyTree (e.g. eagermap)
+
+    Returns
+    -------
+    list of int
+        Mapping of tasks to the cores of the topology
+    """
+    tree, cores = extract_tree(topology)
+    return [int(core) for core in cores[scheduler(application, tree)]]
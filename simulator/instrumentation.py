@@ -0,0 +1,189 @@
+"""Module containing a lightweight instrumentation layer for the simulator.
+
+Named timers measure the time spent in phases of the loaders, schedulers
+and evaluation functions, and named counters record how often costly
+operations happen (e.g. distance queries or affinity reads). Measures are
+collected only after enable() is called: while disabled, timers are a
+shared no-op context manager and counters return immediately.
+
+The measures can be exported as a profile (a dict of totals per name) or
+as a trace in the Chrome trace event format, which can be opened in
+chrome://tracing or Perfetto to see the nesting of the timed phases.
+
+Example
+-------
+>>> from simulator import instrumentation
+>>> instrumentation.enable()
+>>> mapping = eagermap(application, topology)
+>>> instrumentation.profile()
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+_enabled = False
+_lock = threading.Lock()
+# Number of calls and total time of each timer
+_timers = {}
+# Total of each counter
+_counters = {}
+# Timed phases as (name, start, duration, thread) for the trace
+_events = []
+_origin = time.perf_counter()
+_disabled_timer = nullcontext()
+
+
+def enable(keep=False):
+    """Starts collecting measures
+
+    Parameters
+    ----------
+    keep : bool, optional
+        If True, the measures collected previously are kept
+    """
+    global _enabled
+    if not keep:
+        reset()
+    _enabled = True
+
+
+def disable():
+    """Stops collecting measures (the measures collected are kept)"""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    """Returns True if measures are being collected"""
+    return _enabled
+
+
+def reset():
+    """Discards the measures collected"""
+    global _origin
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+        _events.clear()
+        _origin = time.perf_counter()
+
+
+class _Timer:
+    """Context manager measuring the time spent in a named phase"""
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        duration = time.perf_counter() - self.start
+        with _lock:
+            calls, total = _timers.get(self.name, (0, 0.))
+            _timers[self.name] = (calls + 1, total + duration)
+            _events.append((self.name, self.start, duration, threading.get_ident()))
+        return False
+
+
+def timer(name):
+    """Measures the time spent in a block of code
+
+    Parameters
+    ----------
+    name : string
+        Name of the timed phase (e.g. 'eagermap.grouping')
+
+    Returns
+    -------
+    context manager
+        Timer, or a no-op context manager while the instrumentation is disabled
+    """
+    if not _enabled:
+        return _disabled_timer
+    return _Timer(name)
+
+
+def timed(name):
+    """Decorator measuring the time spent in each call of a function
+
+    Parameters
+    ----------
+    name : string
+        Name of the timer
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Timer(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, amount=1):
+    """Adds an amount to a named counter
+
+    Parameters
+    ----------
+    name : string
+        Name of the counter (e.g. 'distance_queries')
+    amount : int, optional
+        Amount added to the counter
+    """
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + int(amount)
+
+
+def profile():
+    """Returns the measures collected
+
+    Returns
+    -------
+    dict
+        'timers' holds the number of 'calls' and 'total' time in seconds of
+        each timer, and 'counters' holds the total of each counter
+    """
+    with _lock:
+        return {'timers': {name: {'calls': calls, 'total': total}
+                           for name, (calls, total) in _timers.items()},
+                'counters': dict(_counters)}
+
+
+def chrome_trace(path=None):
+    """Exports the timed phases in the Chrome trace event format
+
+    Parameters
+    ----------
+    path : string, optional
+        File where the trace is written as JSON
+
+    Returns
+    -------
+    dict
+        Trace with one complete event per timed phase (times in
+        microseconds), and the final value of each counter
+    """
+    with _lock:
+        process = os.getpid()
+        events = [{'name': name, 'ph': 'X', 'ts': (start - _origin) * 1e6, 'dur': duration * 1e6,
+                   'pid': process, 'tid': thread}
+                  for name, start, duration, thread in _events]
+        end = max([event['ts'] + event['dur'] for event in events], default=0.)
+        events.extend({'name': name, 'ph': 'C', 'ts': end, 'pid': process, 'args': {name: value}}
+                      for name, value in _counters.items())
+    trace = {'traceEvents': events, 'displayTimeUnit': 'ms'}
+    if path is not None:
+        with open(path, 'w') as stream:
+            json.dump(trace, stream)
+    return trace
@@ -0,0 +1,274 @@
+"""Module containing streaming readers for large matrices stored in text files.
+
+The readers parse files in chunks of lines and write them directly into
+preallocated arrays (or into the compressed sparse row form), checking
+their integrity as the chunks come in.
+Supported formats:
+- CSV files containing a full square matrix (also read into the packed
+  upper triangle of simulator.packing for symmetric matrices)
+- Edge lists containing one 'source,destination,volume' triple per line
+The chunked reader of comma-separated values (read_chunks) is also used to
+stream other text inputs, such as message traces.
+"""
+
+from itertools import islice
+
+import numpy as np
+from simulator import instrumentation
+from simulator.packing import packed_index, packed_size, narrowest_dtype
+
+# Number of lines parsed at once by default
+CHUNK_ROWS = 1024
+
+
+def read_chunks(text_file, description, dtype, chunk_rows):
+    """Generates blocks of rows parsed from a text file with comma-separated values
+
+    Empty lines and lines starting with '#' are ignored. Used by the readers
+    of this module and by other streaming consumers (e.g. simulator.trace).
+
+    Parameters
+    ----------
+    text_file : string
+        File containing the values
+    description : string
+        Name of the content used in error messages
+    dtype : numpy dtype
+        Type of the values in the blocks
+    chunk_rows : int
+        Maximum number of lines in each block
+
+    Yields
+    ------
+    np.ndarray
+        Two-dimensional block of up to chunk_rows rows
+
+    Raises
+    ------
+    ValueError
+        If the file contains NaN, missing or invalid values.
+    """
+    with open(text_file) as stream:
+        lines = (line for line in stream if line.strip() and not line.lstrip().startswith('#'))
+        while True:
+            chunk = list(islice(lines, chunk_rows))
+            if not chunk:
+                return
+            try:
+                block = np.loadtxt(chunk, delimiter=',', dtype=dtype, ndmin=2)
+            except ValueError:
+                print(f"* The {description} from file {text_file} contains missing or invalid values.")
+                raise ValueError
+            if np.issubdtype(block.dtype, np.floating) and np.isnan(block).any():
+                print(f"* The {description} from file {text_file} contains NaN values.")
+                raise ValueError
+            instrumentation.count('loaders.rows', block.shape[0])
+            yield block
+
+
+def _read_square_chunks(csv_file, description, dtype, chunk_rows):
+    """Generates blocks of rows of a square matrix, checking its integrity incrementally"""
+    num_rows = 0
+    size = None
+    for block in read_chunks(csv_file, description, dtype, chunk_rows):
+        if size is None:
+            size = block.shape[1]
+        num_rows += block.shape[0]
+        if block.shape[1] != size or num_rows > size:
+            print(f"* The {description} from file {csv_file} is not square.")
+            raise ValueError
+        if np.min(block) < 0:
+            print(f"* The {description} from file {csv_file} contains negative values.")
+            raise ValueError
+        yield size, block
+    if size is None or num_rows != size:
+        print(f"* The {description} from file {csv_file} is not square.")
+        raise ValueError
+
+
+@instrumentation.timed('loaders.read_matrix')
+def read_matrix(csv_file, dtype=np.float64, description='matrix', chunk_rows=CHUNK_ROWS):
+    """Reads a square matrix from a CSV file into a dense array
+
+    Parameters
+    ----------
+    csv_file : string
+        File containing the matrix
+    dtype : numpy dtype, optional
+        Type of the values in the resulting array
+    description : string, optional
+        Name of the matrix used in error messages
+    chunk_rows : int, optional
+        Number of lines parsed at once
+
+    Returns
+    -------
+    np.ndarray
+        Square matrix read from file
+
+    Raises
+    ------
+    ValueError
+        If the matrix contains NaN, negative or invalid values, or it is not square.
+    """
+    matrix = None
+    row = 0
+    for size, block in _read_square_chunks(csv_file, description, dtype, chunk_rows):
+        if matrix is None:
+            matrix = np.empty((size, size), dtype=dtype)
+        matrix[row:row + block.shape[0]] = block
+        row += block.shape[0]
+    return matrix
+
+
+@instrumentation.timed('loaders.read_packed_matrix')
+def read_packed_matrix(csv_file, dtype=None, description='matrix', chunk_rows=CHUNK_ROWS):
+    """Reads a symmetric matrix from a CSV file into its packed upper triangle
+
+    The values are accumulated as float64 (half of a full matrix) and
+    converted to the narrowest exact type at the end.
+
+    Parameters
+    ----------
+    csv_file : string
+        File containing the matrix
+    dtype : numpy dtype, optional
+        Type of the stored values. Default: the narrowest exact type
+    description : string, optional
+        Name of the matrix used in error messages
+    chunk_rows : int, optional
+        Number of lines parsed at once
+
+    Returns
+    -------
+    tuple
+        Packed upper triangle (np.ndarray) and number of rows of the matrix
+
+    Raises
+    ------
+    ValueError
+        If the matrix contains NaN, negative or invalid values, or it is not
+        square or not symmetric.
+    """
+    packed = None
+    row = 0
+    for size, block in _read_square_chunks(csv_file, description, np.float64, chunk_rows):
+        if packed is None:
+            packed = np.empty(packed_size(size))
+        for values in block:
+            start = packed_index(size, row, row)
+            packed[start:start + size - row] = values[row:]
+            # The lower part of the row was stored with the rows above
+            if not np.array_equal(values[:row], packed[packed_index(size, np.arange(row), row)]):
+                print(f"* The {description} from file {csv_file} is not symmetric.")
+                raise ValueError
+            row += 1
+    return packed.astype(narrowest_dtype(packed) if dtype is None else dtype), size
+
+
+@instrumentation.timed('loaders.read_sparse_matrix')
+def read_sparse_matrix(csv_file, dtype=np.float64, description='matrix', chunk_rows=CHUNK_ROWS):
+    """Reads a square matrix from a CSV file into compressed sparse row form
+
+    Only one chunk of dense rows is kept in memory at a time.
+
+    Parameters
+    ----------
+    csv_file : string
+        File containing the matrix
+    dtype : numpy dtype, optional
+        Type of the stored values
+    description : string, optional
+        Name of the matrix used in error messages
+    chunk_rows : int, optional
+        Number of lines parsed at once
+
+    Returns
+    -------
+    tuple of np.ndarray
+        Row pointers, column indices and values of the non-zero entries
+
+    Raises
+    ------
+    ValueError
+        If the matrix contains NaN, negative or invalid values, or it is not square.
+    """
+    row_counts = []
+    indices = []
+    data = []
+    for size, block in _read_square_chunks(csv_file, description, dtype, chunk_rows):
+        rows, columns = np.nonzero(block)
+        row_counts.append(np.bincount(rows, minlength=block.shape[0]))
+        indices.append(columns)
+        data.append(block[rows, columns])
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.concatenate(row_counts), out=indptr[1:])
+    return indptr, np.concatenate(indices).astype(np.int64), np.concatenate(data)
+
+
+@instrumentation.timed('loaders.read_edge_list')
+def read_edge_list(edge_file, num_tasks=None, dtype=np.float64, symmetric=True,
+                   description='edge list', chunk_rows=CHUNK_ROWS):
+    """Reads the interactions between tasks from an edge list file
+
+    Each line contains 'source,destination,volume'.
+
+    Parameters
+    ----------
+    edge_file : string
+        File containing the edge list
+    num_tasks : int, optional
+        Number of tasks. If absent, it is inferred from the largest task identifier
+    dtype : numpy dtype, optional
+        Type of the volumes
+    symmetric : bool, optional
+        If True, each volume between two different tasks is also added in
+        the opposite direction (the graph is undirected)
+    description : string, optional
+        Name of the edge list used in error messages
+    chunk_rows : int, optional
+        Number of lines parsed at once
+
+    Returns
+    -------
+    tuple
+        Source tasks, destination tasks, volumes (np.ndarray) and number of tasks (int)
+
+    Raises
+    ------
+    ValueError
+        If a line does not contain three values, a volume is NaN or negative,
+        or a task identifier is invalid.
+    """
+    sources = []
+    dests = []
+    volumes = []
+    for block in read_chunks(edge_file, description, np.float64, chunk_rows):
+        if block.shape[1] != 3:
+            print(f"* The {description} from file {edge_file} does not contain three values per line.")
+            raise ValueError
+        tasks = block[:, :2]
+        if np.min(tasks) < 0 or (tasks != np.floor(tasks)).any():
+            print(f"* The {description} from file {edge_file} contains invalid task identifiers.")
+            raise ValueError
+        if np.min(block[:, 2]) < 0:
+            print(f"* The {description} from file {edge_file} contains negative values.")
+            raise ValueError
+        sources.append(tasks[:, 0].astype(np.int64))
+        dests.append(tasks[:, 1].astype(np.int64))
+        volumes.append(block[:, 2].astype(dtype))
+    sources = np.concatenate(sources) if sources else np.zeros(0, dtype=np.int64)
+    dests = np.concatenate(dests) if dests else np.zeros(0, dtype=np.int64)
+    volumes = np.concatenate(volumes) if volumes else np.zeros(0, dtype=dtype)
+    largest = int(max(sources.max(), dests.max())) if len(sources) > 0 else -1
+    if num_tasks is None:
+        num_tasks = largest + 1
+    elif largest >= num_tasks:
+        print(f"* The {description} from file {edge_file} refers to tasks beyond the {num_tasks} expected.")
+        raise ValueError
+    if symmetric:
+        # Interactions of a task with itself are not mirrored, or they would count twice
+        mirrored = sources != dests
+        sources, dests = np.concatenate([sources, dests[mirrored]]), np.concatenate([dests, sources[mirrored]])
+        volumes = np.concatenate([volumes, volumes[mirrored]])
+    return sources, dests, volumes, num_tasks
@@ -0,0 +1,405 @@
+"""Module containing an on-disk cache of the mappings computed by schedulers.
+
+Mappings are stored with their hopbytes under a key made of fingerprints
+of the application and of the topology, the name of the scheduler and its
+parameters. Fingerprints are hashes of the contents of the inputs, not of
+the objects: a dense and a sparse application with the same affinities
+share entries, and so do a Topology and a PackedTopology with the same
+distances. Trees are identified by their structure and link weights, so a
+TopologyTree does not share entries with the Topology of its matrix of
+distances (tree schedulers such as eagermap only accept the former). The
+loads of the tasks and the capacities of the cores are part of the
+fingerprints.
+
+Each entry is a small JSON file in the cache directory, so several
+processes can share a cache. The size of the directory is bounded: when
+it grows beyond the limit, the least recently used entries (by
+modification time, updated on each hit) are removed.
+
+Example
+-------
+>>> cache = MappingCache('mappings')
+>>> result = cache.map(eagermap, application, tree)
+>>> result['mapping'], result['hopbytes'], result['cached']
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import weakref
+from functools import partial
+
+import numpy as np
+from simulator import instrumentation
+from simulator.application import SparseApplicationGraph, PackedApplicationGraph
+from simulator.topology import PackedTopology, TopologyTree
+from simulator.packing import packed_positions
+from simulator.support import compute_hopbytes
+
+# Rows of a matrix converted to float64 at once while hashing
+HASH_ROWS = 1 << 10
+# Hash of the distances of each topology, kept while the arrays defining them stay the same objects
+_distance_hashes = weakref.WeakKeyDictionary()
+# Hash of the affinities of each application, kept while its arrays stay the same objects
+_affinity_hashes = weakref.WeakKeyDictionary()
+
+
+def _update(digest, arrays):
+    """Adds a list of arrays, with their shapes, to a hash"""
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(np.array(array.shape, dtype=np.int64).tobytes())
+        digest.update(array.data)
+    return digest
+
+
+def _hash_arrays(kind, arrays):
+    """Hashes a list of arrays, with their shapes, under a kind of object"""
+    return _update(hashlib.blake2b(kind.encode(), digest_size=16), arrays).hexdigest()
+
+
+def _recall(hashes, key, stored):
+    """Hash remembered for an object, if the objects it was computed from are still the stored ones"""
+    known = hashes.get(key)
+    if known is not None and len(known[0]) == len(stored) and all(
+            old is new for old, new in zip(known[0], stored)):
+        return known[1]
+    return None
+
+
+def _hash_tree(tree):
+    """Hashes the structure of a tree (the parents of the nodes of each level) and its link weights"""
+    return bytes.fromhex(_hash_arrays('tree', [np.array([tree.num_levels], dtype=np.int64)] +
+                                      [np.asarray(parents, dtype=np.int64) for parents in tree.parents] +
+                                      [np.asarray(tree.weights, dtype=np.float64)]))
+
+
+def _hash_distances(topology):
+    """Hashes the distances of a topology as float64 values, a block of rows at a time
+
+    Trees are hashed from their structure instead, in O(num_cores).
+    """
+    if isinstance(topology, TopologyTree):
+        return _hash_tree(topology)
+    # Packed topologies are hashed without building their full matrix
+    if isinstance(topology, PackedTopology):
+        stored = (topology.packed,)
+    else:
+        stored = (topology.distances,)
+    known = _recall(_distance_hashes, topology, stored)
+    if known is not None:
+        return known
+    cores = np.arange(topology.num_cores)
+    digest = hashlib.blake2b(b'distances', digest_size=16)
+    digest.update(np.array([topology.num_cores, topology.num_cores], dtype=np.int64).tobytes())
+    for start in range(0, topology.num_cores, HASH_ROWS):
+        rows = cores[start:start + HASH_ROWS]
+        digest.update(np.ascontiguousarray(topology.get_distances(rows[:, None], cores), dtype=np.float64).data)
+    _distance_hashes[topology] = (stored, digest.digest())
+    return digest.digest()
+
+
+def application_fingerprint(application):
+    """Computes a hash of the affinities and loads of an application
+
+    The nonzero affinities are hashed in compressed sparse row order as
+    float64 values, so dense, sparse and packed graphs with the same
+    affinities have the same fingerprint. The hash of the affinities is
+    remembered for each application object (until the arrays storing them
+    are replaced), so later fingerprints only hash the loads.
+
+    Parameters
+    ----------
+    application : ApplicationGraph object
+        Application's communication graph
+
+    Returns
+    -------
+    string
+        Hexadecimal digest
+    """
+    if isinstance(application, PackedApplicationGraph):
+        stored = (application.packed,)
+    elif isinstance(application, SparseApplicationGraph):
+        stored = (application.indptr, application.indices, application.data)
+    else:
+        stored = (application.affinity,)
+    digest = _recall(_affinity_hashes, application, stored)
+    if digest is None:
+        digest = _hash_affinities(application)
+        _affinity_hashes[application] = (stored, digest)
+    return _update(digest.copy(), [np.asarray(application.loads, dtype=np.float64)]).hexdigest()
+
+
+def _hash_affinities(application):
+    """Hash of the nonzero affinities of an application, to be completed with its loads"""
+    if isinstance(application, PackedApplicationGraph):
+        # Nonzero affinities of both triangles, sorted by row and column
+        positions = np.flatnonzero(application.packed)
+        low, high = packed_positions(application.num_tasks, positions)
+        off_diagonal = low != high
+        rows = np.concatenate([low, high[off_diagonal]])
+        columns = np.concatenate([high, low[off_diagonal]])
+        values = np.concatenate([application.packed[positions], application.packed[positions[off_diagonal]]])
+        order = np.lexsort([columns, rows])
+        rows, columns, values = rows[order], columns[order], values[order]
+    elif isinstance(application, SparseApplicationGraph):
+        nonzero = application.data != 0
+        rows = np.repeat(np.arange(application.num_tasks), np.diff(application.indptr))[nonzero]
+        columns = application.indices[nonzero]
+        values = application.data[nonzero]
+    else:
+        affinity = np.asarray(application.affinity).reshape(application.num_tasks, -1)
+        rows, columns = np.nonzero(affinity)
+        values = affinity[rows, columns]
+    indptr = np.zeros(application.num_tasks + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=application.num_tasks), out=indptr[1:])
+    return _update(hashlib.blake2b(b'application', digest_size=16),
+                   [indptr, columns.astype(np.int64), values.astype(np.float64)])
+
+
+def topology_fingerprint(topology):
+    """Computes a hash of the distances and capacities of a topology
+
+    The distances are hashed as float64 values, so a Topology and its
+    PackedTopology have the same fingerprint. The hash of the distances is
+    remembered for each topology object (until its matrix is replaced), so
+    later lookups only hash the capacities. A TopologyTree is hashed from
+    its structure and link weights in O(num_cores), without its distances:
+    trees built from the same arity and weights have the same fingerprint,
+    which differs from that of the Topology of their matrix of distances.
+
+    Parameters
+    ----------
+    topology : Topology object
+        Machine topology graph
+
+    Returns
+    -------
+    string
+        Hexadecimal digest
+    """
+    return _hash_arrays('topology', [np.frombuffer(_hash_distances(topology), dtype=np.uint8),
+                                     np.asarray(topology.capacities, dtype=np.float64)])
+
+
+def scheduler_name(scheduler):
+    """Identifies a scheduler by the module and qualified name of its function
+
+    Partials and callable objects (e.g. portfolio.Refined) also include
+    their parameters, sorted by name.
+
+    Parameters
+    ----------
+    scheduler : function
+        Scheduler receiving (application, topology)
+
+    Returns
+    -------
+    string
+        Name of the scheduler
+    """
+    if isinstance(scheduler, partial):
+        arguments = [_describe(argument) for argument in scheduler.args]
+        arguments += [f'{name}={_describe(value)}' for name, value in sorted(scheduler.keywords.items())]
+        return f'{scheduler_name(scheduler.func)}({", ".join(arguments)})'
+    if hasattr(scheduler, '__qualname__'):
+        return f'{scheduler.__module__}.{scheduler.__qualname__}'
+    parameters = [f'{name}={_describe(value)}' for name, value in sorted(vars(scheduler).items())
+                  if not name.startswith('_')]
+    return f'{scheduler_name(type(scheduler))}({", ".join(parameters)})'
+
+
+def _describe(value):
+    """Stable description of a parameter of a scheduler"""
+    if callable(value):
+        return scheduler_name(value)
+    if isinstance(value, dict):
+        return '{' + ', '.join(f'{name!r}: {_describe(item)}' for name, item in sorted(value.items())) + '}'
+    return repr(value)
+
+
+class MappingCache:
+    """Size-bounded, least recently used store of mappings on disk
+
+    Attributes
+    ----------
+    directory : string
+        Directory containing the entries (created if missing)
+    max_bytes : int
+        Largest total size of the entries
+    hits : int
+        Number of lookups that found an entry
+    misses : int
+        Number of lookups that did not find an entry
+
+    Raises
+    ------
+    ValueError
+        If the size limit is not positive
+    """
+    def __init__(self, directory, max_bytes=64 << 20):
+        if max_bytes <= 0:
+            print("* The size of a mapping cache must be positive.")
+            raise ValueError
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, scheduler, application, topology, **parameters):
+        """Computes the key of the mapping of an application by a scheduler
+
+        Parameters
+        ----------
+        scheduler : function
+            Scheduler receiving (application, topology, **parameters)
+        application : ApplicationGraph object
+            Application's communication graph
+        topology : Topology object
+            Machine topology graph
+        **parameters
+            Parameters of the scheduler
+
+        Returns
+        -------
+        string
+            Hexadecimal key
+        """
+        described = [f'{name}={_describe(value)}' for name, value in sorted(parameters.items())]
+        digest = hashlib.blake2b(digest_size=16)
+        for part in [scheduler_name(scheduler), ', '.join(described),
+                     application_fingerprint(application), topology_fingerprint(topology)]:
+            digest.update(part.encode())
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, key):
+        """Finds the entry of a key, marking it as recently used
+
+        Parameters
+        ----------
+        key : string
+            Key of the entry (see key)
+
+        Returns
+        -------
+        dict or None
+            'mapping', 'hopbytes', 'scheduler' and 'parameters' of the
+            entry, or None if it is not in the cache
+        """
+        path = self._path(key)
+        try:
+            with open(path) as stream:
+                entry = json.load(stream)
+            os.utime(path)
+        except (OSError, ValueError):
+            # Missing, evicted by another process, or partially written
+            self.misses += 1
+            instrumentation.count('memo.misses')
+            return None
+        self.hits += 1
+        instrumentation.count('memo.hits')
+        return entry
+
+    def put(self, key, entry):
+        """Stores an entry, evicting the least recently used ones if needed
+
+        Parameters
+        ----------
+        key : string
+            Key of the entry (see key)
+        entry : dict
+            Values stored as JSON (e.g. 'mapping' and 'hopbytes')
+        """
+        # Written to a temporary file first, so readers never see partial entries
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'w') as stream:
+            json.dump(entry, stream)
+        os.replace(temporary, self._path(key))
+        self._evict()
+
+    def _evict(self):
+        """Removes the least recently used entries until the cache fits in its size"""
+        entries = []
+        for item in os.scandir(self.directory):
+            if item.name.endswith('.json'):
+                try:
+                    status = item.stat()
+                except OSError:
+                    continue
+                entries.append((status.st_mtime, status.st_size, item.path))
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def size(self):
+        """Returns the total size of the entries in bytes"""
+        return sum(item.stat().st_size for item in os.scandir(self.directory)
+                   if item.name.endswith('.json'))
+
+    def clear(self):
+        """Removes all entries"""
+        for item in os.scandir(self.directory):
+            if item.name.endswith('.json'):
+                os.remove(item.path)
+
+    def map(self, scheduler, application, topology, **parameters):
+        """Maps an application with a scheduler, reusing a stored mapping if possible
+
+        Parameters
+        ----------
+        scheduler : function
+            Scheduler receiving (application, topology, **parameters)
+        application : ApplicationGraph object
+            Application's communication graph
+        topology : Topology object
+            Machine topology graph
+        **parameters
+            Parameters of the scheduler
+
+        Returns
+        -------
+        dict
+            'mapping' (list of int), 'hopbytes' (float), and 'cached' (True
+            if the mapping was found in the cache)
+        """
+        key = self.key(scheduler, application, topology, **parameters)
+        entry = self.get(key)
+        if entry is not None:
+            return {'mapping': entry['mapping'], 'hopbytes': entry['hopbytes'], 'cached': True}
+        mapping = [int(core) for core in scheduler(application, topology, **parameters)]
+        hopbytes = float(compute_hopbytes(application, topology, mapping))
+        self.put(key, {'mapping': mapping, 'hopbytes': hopbytes, 'scheduler': scheduler_name(scheduler),
+                       'parameters': {name: _describe(value) for name, value in parameters.items()}})
+        return {'mapping': mapping, 'hopbytes': hopbytes, 'cached': False}
+
+    def _mapping(self, scheduler, application, topology, **parameters):
+        return self.map(scheduler, application, topology, **parameters)['mapping']
+
+    def wrap(self, scheduler):
+        """Creates a scheduler returning the mappings of another one through the cache
+
+        Parameters
+        ----------
+        scheduler : function
+            Scheduler receiving (application, topology, **parameters)
+
+        Returns
+        -------
+        function
+            Scheduler with the same interface (picklable if the scheduler
+            is, e.g. for portfolio.run_portfolio)
+        """
+        return partial(self._mapping, scheduler)
@@ -0,0 +1,206 @@
+"""Module containing the packed storage of symmetric matrices.
+
+Affinities between tasks and distances between cores are symmetric, so
+only the upper triangle of their matrices (with the diagonal) needs to be
+stored. The triangle is stored row by row in a flat array of n(n+1)/2
+values, using the narrowest type that holds all values exactly (e.g.
+uint8 for numbers of hops). Compared to a full float64 matrix, this uses
+from 4 (float32 values) to 16 (uint8 values) times less memory.
+
+Position (i, j) of the matrix, with i <= j, is found at
+i * (2n - i + 1) / 2 + (j - i) in the flat array, and (j, i) at the same
+position, so any value is found in O(1).
+"""
+
+from math import isqrt
+
+import numpy as np
+
+# Unsigned integer types tried for integer values, from the narrowest
+_UNSIGNED = [np.uint8, np.uint16, np.uint32, np.uint64]
+
+
+def packed_size(num_rows):
+    """Number of values stored for a symmetric matrix with a number of rows"""
+    return num_rows * (num_rows + 1) // 2
+
+
+def packed_order(size):
+    """Number of rows of a symmetric matrix with a number of stored values
+
+    Raises
+    ------
+    ValueError
+        If no matrix has this number of stored values
+    """
+    num_rows = (isqrt(8 * size + 1) - 1) // 2
+    if packed_size(num_rows) != size:
+        print(f"* {size} values do not form the upper triangle of a square matrix.")
+        raise ValueError
+    return num_rows
+
+
+def packed_index(num_rows, first, second):
+    """Position of the values of a symmetric matrix in its packed storage
+
+    Parameters
+    ----------
+    num_rows : int
+        Number of rows of the matrix
+    first : int or np.ndarray
+        Row(s) of the values
+    second : int or np.ndarray
+        Column(s) of the values (broadcast with the rows)
+
+    Returns
+    -------
+    int or np.ndarray
+        Position(s) in the packed array
+    """
+    first = np.asarray(first, dtype=np.int64)
+    second = np.asarray(second, dtype=np.int64)
+    low = np.minimum(first, second)
+    return (low * (2 * num_rows - low + 1) // 2 + np.abs(second - first))[()]
+
+
+def packed_positions(num_rows, positions):
+    """Rows and columns (row <= column) of positions in the packed storage
+
+    Parameters
+    ----------
+    num_rows : int
+        Number of rows of the matrix
+    positions : np.ndarray
+        Positions in the packed array
+
+    Returns
+    -------
+    tuple of np.ndarray
+        Row and column of each position
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    rows = np.arange(num_rows)
+    starts = packed_index(num_rows, rows, rows)
+    rows = np.searchsorted(starts, positions, side='right') - 1
+    return rows, positions - starts[rows] + rows
+
+
+def packed_rows(packed, num_rows, rows):
+    """Extracts full rows of a symmetric matrix from its packed storage
+
+    Parameters
+    ----------
+    packed : np.ndarray
+        Packed upper triangle of the matrix
+    num_rows : int
+        Number of rows of the matrix
+    rows : int or np.ndarray
+        Row(s) to extract
+
+    Returns
+    -------
+    np.ndarray
+        Row (or matrix with one row per element of rows)
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    return packed[packed_index(num_rows, rows[..., None], np.arange(num_rows))]
+
+
+def widen(values):
+    """Converts packed values to int64 or float64, so that arithmetic on them cannot overflow"""
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.floating) or values.dtype == np.uint64:
+        return values.astype(np.float64)
+    return values.astype(np.int64)
+
+
+def narrowest_dtype(values):
+    """Finds the narrowest type representing a set of values exactly
+
+    Non-negative integer values use the smallest unsigned integer type that
+    holds them. Other values use float32 if they are all exact in float32,
+    and float64 otherwise.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Values to represent
+
+    Returns
+    -------
+    np.dtype
+        Narrowest type found
+    """
+    values = np.asarray(values)
+    if values.size == 0:
+        return np.dtype(_UNSIGNED[0])
+    if np.issubdtype(values.dtype, np.integer) or (values == np.floor(values)).all():
+        low, high = values.min(), values.max()
+        if low >= 0:
+            for candidate in _UNSIGNED:
+                if high <= np.iinfo(candidate).max:
+                    return np.dtype(candidate)
+    if (values.astype(np.float32) == values).all():
+        return np.dtype(np.float32)
+    return np.dtype(np.float64)
+
+
+def pack_matrix(matrix, dtype=None):
+    """Stores the upper triangle (with the diagonal) of a square matrix
+
+    Parameters
+    ----------
+    matrix : np.ndarray
+        Square matrix (assumed symmetric: the lower triangle is ignored)
+    dtype : numpy dtype, optional
+        Type of the stored values. Default: the narrowest exact type
+
+    Returns
+    -------
+    np.ndarray
+        Packed upper triangle of the matrix
+    """
+    num_rows = len(matrix)
+    if dtype is None:
+        dtype = narrowest_dtype(matrix)
+    packed = np.empty(packed_size(num_rows), dtype=dtype)
+    start = 0
+    for row in range(num_rows):
+        packed[start:start + num_rows - row] = matrix[row, row:]
+        start += num_rows - row
+    return packed
+
+
+def unpack_matrix(packed, num_rows):
+    """Rebuilds the full symmetric matrix from its packed storage
+
+    Parameters
+    ----------
+    packed : np.ndarray
+        Packed upper triangle of the matrix
+    num_rows : int
+        Number of rows of the matrix
+
+    Returns
+    -------
+    np.ndarray
+        Square matrix, with the type of the packed values
+    """
+    matrix = np.empty((num_rows, num_rows), dtype=packed.dtype)
+    start = 0
+    for row in range(num_rows):
+        matrix[row, row:] = packed[start:start + num_rows - row]
+        matrix[row:, row] = packed[start:start + num_rows - row]
+        start += num_rows - row
+    return matrix
+
+
+def is_symmetric(matrix, block_rows=1024):
+    """Checks whether a square matrix is symmetric, a block of rows at a time"""
+    matrix = np.asarray(matrix)
+    if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+        return False
+    for start in range(0, len(matrix), block_rows):
+        if not np.array_equal(matrix[start:start + block_rows], matrix[:, start:start + block_rows].T):
+            return False
+    return True
@@ -0,0 +1,286 @@
+"""Module containing a multilevel graph bisection in NumPy.
+
+Graphs are given as dense symmetric matrices of edge weights, or as
+SparseApplicationGraph objects storing each edge in both directions (so
+memory grows with the number of edges), with an optional integer weight
+per vertex. Sparse graphs are converted to dense matrices once they are
+coarsened below DENSE_VERTICES vertices. A bisection follows three steps:
+- Coarsening: vertices are merged in pairs along their heaviest edges
+  until the graph is small
+- Initial partition: the coarsest graph is split by greedy graph growing
+- Refinement: the partition is projected back level by level, and improved
+  at each level by moving and swapping boundary vertices
+"""
+
+import numpy as np
+from simulator.application import SparseApplicationGraph
+
+# Number of vertices under which sparse graphs are stored as dense matrices
+DENSE_VERTICES = 1 << 10
+
+
+def num_vertices(matrix):
+    """Number of vertices of a graph (dense matrix or SparseApplicationGraph)"""
+    if isinstance(matrix, SparseApplicationGraph):
+        return matrix.num_tasks
+    return len(matrix)
+
+
+def row_sums(matrix):
+    """Total weight of the edges of each vertex of a graph"""
+    if isinstance(matrix, SparseApplicationGraph):
+        owners = np.repeat(np.arange(matrix.num_tasks), np.diff(matrix.indptr))
+        return np.bincount(owners, weights=matrix.data, minlength=matrix.num_tasks).astype(np.float64)
+    return matrix.sum(axis=1)
+
+
+def add_row(vector, matrix, vertex, factor=1.):
+    """Adds the weights of the edges of a vertex, times a factor, to a vector over the vertices"""
+    if isinstance(matrix, SparseApplicationGraph):
+        start, end = matrix.indptr[vertex], matrix.indptr[vertex + 1]
+        vector[matrix.indices[start:end]] += factor * matrix.data[start:end]
+    else:
+        vector += factor * matrix[vertex]
+
+
+def incident_edges(matrix, vertices):
+    """Lists the edges of a set of vertices of a sparse graph
+
+    Parameters
+    ----------
+    matrix : SparseApplicationGraph object
+        Graph storing each edge in both directions
+    vertices : np.ndarray
+        Vertices whose edges are listed
+
+    Returns
+    -------
+    tuple of np.ndarray
+        Position in vertices of the vertex of each edge, other vertex of the
+        edge, and weight of the edge
+    """
+    starts = matrix.indptr[vertices]
+    lengths = matrix.indptr[vertices + 1] - starts
+    owners = np.repeat(np.arange(len(vertices)), lengths)
+    positions = np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return owners, matrix.indices[positions], matrix.data[positions]
+
+
+def subgraph(matrix, vertices):
+    """Graph induced by a set of vertices, numbered in the order given"""
+    if isinstance(matrix, SparseApplicationGraph):
+        position = np.full(matrix.num_tasks, -1, dtype=np.int64)
+        position[vertices] = np.arange(len(vertices))
+        owners, neighbors, weights = incident_edges(matrix, vertices)
+        inside = position[neighbors] >= 0
+        return _compact(SparseApplicationGraph.from_edges(owners[inside], position[neighbors[inside]],
+                                                          weights[inside], len(vertices)))
+    return matrix[np.ix_(vertices, vertices)]
+
+
+def _compact(matrix):
+    """Stores small sparse graphs as dense matrices, which are faster to process"""
+    if isinstance(matrix, SparseApplicationGraph) and matrix.num_tasks <= DENSE_VERTICES:
+        return matrix.affinity
+    return matrix
+
+
+def _block(matrix, rows, columns):
+    """Dense matrix of the weights of the edges between two small sets of vertices"""
+    if isinstance(matrix, SparseApplicationGraph):
+        return np.array([matrix.get_affinity(row, columns) for row in rows]).reshape(len(rows), len(columns))
+    return matrix[np.ix_(rows, columns)]
+
+
+def _heavy_edge_matching(matrix, weights, max_weight, generator):
+    """Matches each vertex with its heaviest unmatched neighbor
+
+    Returns the coarse vertex of each vertex, and the number of coarse vertices.
+    """
+    sparse = isinstance(matrix, SparseApplicationGraph)
+    labels = np.full(num_vertices(matrix), -1, dtype=np.int64)
+    count = 0
+    for vertex in generator.permutation(len(labels)):
+        if labels[vertex] >= 0:
+            continue
+        labels[vertex] = count
+        if sparse:
+            # Only the neighbors are visited, in increasing order as in dense rows
+            start, end = matrix.indptr[vertex], matrix.indptr[vertex + 1]
+            neighbors = matrix.indices[start:end]
+            allowed = (labels[neighbors] < 0) & (weights[neighbors] + weights[vertex] <= max_weight)
+            row = np.where(allowed, matrix.data[start:end], 0.)
+            if len(row) > 0 and row.max() > 0:
+                labels[neighbors[np.argmax(row)]] = count
+        else:
+            allowed = (labels < 0) & (weights + weights[vertex] <= max_weight)
+            row = np.where(allowed, matrix[vertex], 0.)
+            partner = np.argmax(row)
+            if row[partner] > 0:
+                labels[partner] = count
+        count += 1
+    return labels, count
+
+
+def _contract(matrix, labels, count):
+    """Builds the matrix of the coarse graph, where matched vertices are merged"""
+    if isinstance(matrix, SparseApplicationGraph):
+        owners = np.repeat(np.arange(matrix.num_tasks), np.diff(matrix.indptr))
+        first, second = labels[owners], labels[matrix.indices]
+        between = first != second
+        return _compact(SparseApplicationGraph.from_edges(first[between], second[between],
+                                                          matrix.data[between], count))
+    vertices = np.arange(len(labels))
+    first = np.full(count, len(labels), dtype=np.int64)
+    second = np.full(count, -1, dtype=np.int64)
+    np.minimum.at(first, labels, vertices)
+    np.maximum.at(second, labels, vertices)
+    paired = first != second
+    rows = matrix[first]
+    rows[paired] += matrix[second[paired]]
+    coarse = rows[:, first]
+    coarse[:, paired] += rows[:, second[paired]]
+    np.fill_diagonal(coarse, 0)
+    return coarse
+
+
+def _cut(matrix, part):
+    """Weight of the edges between the two parts"""
+    if isinstance(matrix, SparseApplicationGraph):
+        owners = np.repeat(np.arange(matrix.num_tasks), np.diff(matrix.indptr))
+        return matrix.data[part[owners] & ~part[matrix.indices]].sum()
+    return matrix[np.ix_(part, ~part)].sum()
+
+
+def _initial_partition(matrix, weights, target, generator, attempts=4):
+    """Splits a small graph by greedy graph growing from a few random seeds"""
+    size = num_vertices(matrix)
+    best_part, best_cut = None, np.inf
+    for seed in generator.choice(size, min(attempts, size), replace=False):
+        part = np.zeros(size, dtype=bool)
+        connection = np.zeros(size)
+        vertex, weight = seed, 0
+        while True:
+            part[vertex] = True
+            weight += weights[vertex]
+            add_row(connection, matrix, vertex)
+            fits = ~part & (weights <= target - weight)
+            if not fits.any():
+                break
+            vertex = np.argmax(np.where(fits, connection, -1.))
+        cut = _cut(matrix, part)
+        if cut < best_cut:
+            best_part, best_cut = part, cut
+    return best_part
+
+
+class _Refinement:
+    """Tracks the gain of moving each vertex to the other part
+
+    The gain is the weight of the edges to the other part minus the weight of
+    the edges to the own part, that is, the decrease of the cut.
+    """
+    def __init__(self, matrix, weights, part):
+        self.matrix = matrix
+        self.weights = weights
+        self.part = part.copy()
+        self.sides = np.where(part, 1., -1.)
+        if isinstance(matrix, SparseApplicationGraph):
+            owners = np.repeat(np.arange(matrix.num_tasks), np.diff(matrix.indptr))
+            self.balance = np.bincount(owners, weights=matrix.data * self.sides[matrix.indices],
+                                       minlength=matrix.num_tasks)
+        else:
+            self.balance = matrix @ self.sides
+
+    def gains(self):
+        return -self.sides * self.balance
+
+    def move(self, vertex):
+        add_row(self.balance, self.matrix, vertex, -2 * self.sides[vertex])
+        self.sides[vertex] = -self.sides[vertex]
+        self.part[vertex] = not self.part[vertex]
+
+    def rebalance(self, target):
+        """Moves the best vertices from the heavier part until the target weight is reached"""
+        while True:
+            difference = self.weights[self.part].sum() - target
+            if difference == 0:
+                return
+            heavier = self.part if difference > 0 else ~self.part
+            fits = heavier & (self.weights <= abs(difference))
+            if not fits.any():
+                return
+            self.move(np.argmax(np.where(fits, self.gains(), -np.inf)))
+
+    def swap(self, candidates=16, max_swaps=None):
+        """Swaps pairs of vertices of the same weight while the cut decreases"""
+        max_swaps = len(self.part) if max_swaps is None else max_swaps
+        for step in range(max_swaps):
+            gains = self.gains()
+            first = np.flatnonzero(self.part)
+            second = np.flatnonzero(~self.part)
+            if len(first) == 0 or len(second) == 0:
+                return
+            first = first[np.argsort(-gains[first], kind='stable')[:candidates]]
+            second = second[np.argsort(-gains[second], kind='stable')[:candidates]]
+            swap_gains = (gains[first][:, None] + gains[second][None, :] -
+                          2 * _block(self.matrix, first, second))
+            swap_gains[self.weights[first][:, None] != self.weights[second][None, :]] = -np.inf
+            best = np.unravel_index(np.argmax(swap_gains), swap_gains.shape)
+            if swap_gains[best] <= 0:
+                return
+            self.move(first[best[0]])
+            self.move(second[best[1]])
+
+
+def bisect(matrix, target, weights=None, seed=None, coarsest=32):
+    """Splits a graph in two parts, minimizing the weight of the edges between them
+
+    Parameters
+    ----------
+    matrix : np.ndarray or SparseApplicationGraph object
+        Symmetric matrix of edge weights, or sparse graph storing each edge
+        in both directions
+    target : int
+        Total vertex weight of the first part
+    weights : np.ndarray, optional
+        Integer weight of each vertex. Default: one per vertex
+    seed : int or np.random.Generator, optional
+        Seed for the random choices
+    coarsest : int, optional
+        Number of vertices under which the graph is no longer coarsened
+
+    Returns
+    -------
+    np.ndarray
+        True for the vertices in the first part. With unit vertex weights,
+        the first part contains exactly target vertices
+    """
+    generator = np.random.default_rng(seed)
+    matrix = _compact(matrix)
+    size = num_vertices(matrix)
+    weights = np.ones(size, dtype=np.int64) if weights is None else np.asarray(weights)
+    total = weights.sum()
+    if target <= 0 or target >= total:
+        return np.full(size, target >= total, dtype=bool)
+    # Coarsening, limiting the weight of coarse vertices to keep the parts balanced
+    max_weight = max(2, int(np.ceil(1.5 * total / coarsest)))
+    levels = []
+    while num_vertices(matrix) > coarsest:
+        labels, count = _heavy_edge_matching(matrix, weights, max_weight, generator)
+        if count > 0.95 * num_vertices(matrix):
+            break
+        levels.append((matrix, weights, labels))
+        matrix = _contract(matrix, labels, count)
+        weights = np.bincount(labels, weights=weights, minlength=count).astype(np.int64)
+    part = _initial_partition(matrix, weights, target, generator)
+    # Refinement while projecting the partition back to the original graph
+    while True:
+        refinement = _Refinement(matrix, weights, part)
+        refinement.rebalance(target)
+        refinement.swap()
+        part = refinement.part
+        if not levels:
+            return part
+        matrix, weights, labels = levels.pop()
+        part = part[labels]
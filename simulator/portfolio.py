@@ -0,0 +1,145 @@
+"""Module containing a runner of several schedulers in parallel.
+
+The schedulers of a portfolio run concurrently in a pool of processes,
+and the mapping with the smallest hopbytes is kept. The application graph
+and the matrix of distances are written once to the binary format of
+simulator.storage and memory-mapped by the workers, instead of being
+pickled to each of them. Tree topologies are sent without their cached
+tables and rebuild them on demand.
+"""
+
+import multiprocessing
+import os
+import tempfile
+import time
+
+from simulator.application import ApplicationGraph
+from simulator.topology import Topology, TopologyTree
+from simulator.schedulers import refine
+from simulator.support import compute_hopbytes
+
+# Inputs of the schedulers in each worker process
+_application = None
+_topology = None
+
+
+class Refined:
+    """Scheduler that refines the mapping of another scheduler
+
+    Parameters
+    ----------
+    scheduler : function
+        Scheduler computing the starting mapping
+    **options
+        Parameters passed to refine (e.g. budget or method)
+    """
+    def __init__(self, scheduler, **options):
+        self.scheduler = scheduler
+        self.options = options
+        self.__name__ = f'{_scheduler_name(scheduler)}+refine'
+
+    def __call__(self, application, topology):
+        mapping = self.scheduler(application, topology)
+        return refine(application, topology, mapping, **self.options)
+
+
+def _scheduler_name(scheduler):
+    """Name of a scheduler function (or of the function inside a partial)"""
+    return getattr(scheduler, '__name__', None) or getattr(scheduler, 'func').__name__
+
+
+def _named(schedulers):
+    """Names a list of schedulers, numbering the schedulers whose names are already taken"""
+    named = {}
+    for scheduler in schedulers:
+        name = base = _scheduler_name(scheduler)
+        number = 1
+        while name in named:
+            number += 1
+            name = f'{base}#{number}'
+        named[name] = scheduler
+    return named
+
+
+def _load_inputs(application_file, topology, topology_file):
+    """Opens the memory-mapped inputs in a worker process"""
+    global _application, _topology
+    _application = ApplicationGraph.load(application_file)
+    _topology = Topology.load(topology_file) if topology is None else topology
+
+
+def _run(name, scheduler):
+    """Runs a scheduler in a worker process and evaluates its mapping"""
+    start = time.perf_counter()
+    mapping = scheduler(_application, _topology)
+    elapsed = time.perf_counter() - start
+    hopbytes = compute_hopbytes(_application, _topology, mapping)
+    return {'name': name, 'status': 'ok', 'mapping': [int(core) for core in mapping],
+            'hopbytes': float(hopbytes), 'time': elapsed}
+
+
+def run_portfolio(application, topology, schedulers, workers=None, timeout=None, directory=None):
+    """Runs several schedulers concurrently and keeps the best mapping
+
+    Parameters
+    ----------
+    application : ApplicationGraph object
+        Application's communication graph
+    topology : Topology object
+        Machine topology graph
+    schedulers : dict or list
+        Schedulers to run, receiving (application, topology). A dict maps
+        names to schedulers; a list uses the names of the functions, numbered
+        when several schedulers share a name (e.g. 'recursive_bisection' and
+        'recursive_bisection#2' for two partials with different seeds).
+        Schedulers must be picklable (module-level functions, partials or Refined)
+    workers : int, optional
+        Number of worker processes. Default: one per scheduler, up to the number of CPUs
+    timeout : float, optional
+        Time in seconds after which the schedulers still running are stopped
+    directory : string, optional
+        Directory for the shared binary files. Default: the system temporary directory
+
+    Returns
+    -------
+    dict
+        'results' holds, for each scheduler in order, its name, status ('ok',
+        'timeout' or 'error'), mapping, hopbytes and wall time in seconds.
+        'best' holds the successful result with the smallest hopbytes (or None)
+    """
+    if not isinstance(schedulers, dict):
+        schedulers = _named(schedulers)
+    if workers is None:
+        workers = min(len(schedulers), os.cpu_count() or 1)
+    results = []
+    with tempfile.TemporaryDirectory(dir=directory) as shared:
+        application_file = os.path.join(shared, 'application.bin')
+        application.save(application_file)
+        topology_file = None
+        if not isinstance(topology, TopologyTree):
+            topology_file = os.path.join(shared, 'topology.bin')
+            topology.save(topology_file)
+        shipped = topology if topology_file is None else None
+        pool = multiprocessing.Pool(max(workers, 1), initializer=_load_inputs,
+                                    initargs=(application_file, shipped, topology_file))
+        try:
+            pending = [(name, pool.apply_async(_run, (name, scheduler)))
+                       for name, scheduler in schedulers.items()]
+            deadline = None if timeout is None else time.perf_counter() + timeout
+            for name, pending_result in pending:
+                remaining = None if deadline is None else max(0., deadline - time.perf_counter())
+                try:
+                    results.append(pending_result.get(remaining))
+                except multiprocessing.TimeoutError:
+                    results.append({'name': name, 'status': 'timeout', 'mapping': None,
+                                    'hopbytes': None, 'time': timeout})
+                except Exception as error:
+                    results.append({'name': name, 'status': 'error', 'mapping': None,
+                                    'hopbytes': None, 'time': None, 'error': repr(error)})
+        finally:
+            # Stops the schedulers that are still running
+            pool.terminate()
+            pool.join()
+    finished = [result for result in results if result['status'] == 'ok']
+    best = min(finished, key=lambda result: result['hopbytes']) if finished else None
+    return {'results': results, 'best': best}
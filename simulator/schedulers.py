@@ -1,15 +1,35 @@
 """Module containing topology mapping algorithms
 
-Implemented scheduling algorithms: compact
-Methods with interfaces but no implementation:
+Implemented scheduling algorithms: compact, greedy_pairs,
+greedy_pairs_with_topology, eagermap, treematch, recursive_bisection
+Refinement of existing mappings: refine
+Methods with interfaces but no implementation: scatter
 """
 
-import copy
+import time
+from functools import partial
+from itertools import combinations
+from math import comb
+import numpy as np
+from simulator import instrumentation
+from simulator.topology import TopologyTree
+from simulator.application import SparseApplicationGraph
+from simulator.partitioning import bisect, num_vertices, row_sums, add_row, incident_edges, subgraph
+from simulator.support import HopBytesEvaluator, CoreLoads
 
+# Largest number of entries of the matrices of affinities of sparse graphs stored densely
+DENSE_AFFINITIES = 1 << 22
+# Integer weight of a task of mean load, when tasks are weighted by their different loads
+LOAD_UNITS = 16
 
+
+@instrumentation.timed('compact')
 def compact(application, topology):
     """Computes a compact, round-robin distribution of tasks over cores
 
+    When there are more tasks than cores, cores receive tasks in proportion
+    to their capacities and the loads of the tasks (see CoreLoads).
+
     Parameters
     ----------
     application : ApplicationGraph object
@@ -22,14 +42,18 @@ def compact(application, topology):
     list of int
         Mapping of tasks to cores
     """
-    num_tasks = application.num_tasks
-    num_cores = topology.num_cores
-    mapping = [i % num_cores for i in range(num_tasks)]
+    core_loads = CoreLoads.for_mapping(application, topology)
+    loads = application.loads
+    mapping = [int(core_loads.assign(loads[i])) for i in range(application.num_tasks)]
     return mapping
 
+@instrumentation.timed('greedy_pairs')
 def greedy_pairs(application, topology):
     """Computes a greedy mapping by putting tasks with high affinity in consecutive cores
 
+    Cores receive tasks in proportion to their capacities and the loads of
+    the tasks (see CoreLoads).
+
     Parameters
     ----------
     application : ApplicationGraph object
@@ -44,29 +68,39 @@ def greedy_pairs(application, topology):
     """
     # Creates a starting empty mapping
     mapping = [None for i in range(application.num_tasks)]
-    # Next core to map tasks
-    next_core = 0
-    # Makes a copy of the application graph to be able to change its values
-    app = copy.deepcopy(application)
+    # Tracks the load of the cores to choose the next core to map tasks
+    core_loads = CoreLoads.for_mapping(application, topology)
+    loads = application.loads
+    # Marks the tasks already mapped instead of changing the affinities
+    mapped = np.zeros(application.num_tasks, dtype=bool)
+    # Number of affinities read and of argmax scans, for the instrumentation
+    reads = scans = 0
 
     # Iterates over all tasks to map them in pairs
     for i in range(application.num_tasks):
-        if mapping[i] != None:
+        if mapped[i]:
             continue  # Nothing to do for a task that has already been mapped
+        # Finds a task that communicates the most with task i among the
+        # unmapped ones (only tasks with non-zero affinity are visited)
+        neighbors = application.neighbors(i)
+        candidates = neighbors[~mapped[neighbors]]
+        # Without candidates, the highest (zero) affinity is found with i itself
+        most_comm = i
+        if len(candidates) > 0:
+            most_comm = candidates[application.get_affinity(i, candidates).argmax()]
+            reads += len(candidates)
+            scans += 1
         # Maps the task
-        mapping[i] = next_core
-        next_core = (next_core + 1) % topology.num_cores
-        # Finds a task that communicates the most with task i
-        most_comm = app.affinity[i].argmax()
-        # Changes the affinity between these tasks so it does not come up anymore
-        app.affinity[:,i] = -1
-        app.affinity[:,most_comm] = -1
+        mapping[i] = int(core_loads.assign(loads[i]))
+        mapped[i] = True
         # Makes sure that the highest affinity is happening with another task
         # (issues could happen if every other task has been mapped already,
         # or if the task has zero affinity with other unmapped tasks)
         if i != most_comm:
-            mapping[most_comm] = next_core
-            next_core = (next_core + 1) % topology.num_cores
+            mapping[most_comm] = int(core_loads.assign(loads[most_comm]))
+            mapped[most_comm] = True
+    instrumentation.count('greedy_pairs.affinity_reads', reads)
+    instrumentation.count('greedy_pairs.argmax_scans', scans)
     # returns the solution
     return mapping
 
@@ -89,10 +123,167 @@ def scatter(application, topology):
     # TODO
 
 
+def _core_slots(topology):
+    """Number of tasks each core receives per round, following its capacity"""
+    capacities = topology.capacities
+    return np.maximum(np.rint(capacities), capacities > 0).astype(np.int64).tolist()
+
+
+class _FreeCores:
+    """Index of the cores with free slots in the current round, for any topology
+
+    Finding the closest free core scans the distances from a core.
+    """
+    def __init__(self, topology):
+        self.topology = topology
+        self.cores = np.arange(topology.num_cores)
+        self.slots = _core_slots(topology)
+        self._new_round()
+
+    def _new_round(self):
+        self.left = np.array(self.slots)
+        self.total = int(self.left.sum())
+        self.first = 0
+
+    def _take(self, core, slots):
+        # A task needing more slots than the core has left takes the remaining ones
+        taken = min(slots, self.left[core])
+        self.left[core] -= taken
+        self.total -= taken
+
+    def take_first(self, slots=1):
+        """Takes the first free core (starting a new round if all cores are full)"""
+        if self.total == 0:
+            self._new_round()
+        while self.left[self.first] == 0:
+            self.first += 1
+        self._take(self.first, slots)
+        return self.first
+
+    def take_closest(self, core, slots=1):
+        """Takes the free core closest to a core"""
+        if self.total == 0:
+            self._new_round()
+        closest = int(np.argmin(np.where(self.left > 0, self.topology.get_distances(core, self.cores), np.inf)))
+        self._take(closest, slots)
+        return closest
+
+    def take_pair(self, first_slots=1, second_slots=1):
+        """Takes two close free cores: the first free core and the free core closest to it"""
+        first = self.take_first(first_slots)
+        return first, self.take_closest(first, second_slots)
+
+
+def _subtree_first_cores(topology, level):
+    """First core of the subtree of each node of a level"""
+    counts = np.bincount(topology.get_core_ancestors(level), minlength=topology.get_level_size(level))
+    return np.concatenate([[0], np.cumsum(counts)[:-1]]).tolist()
+
+
+class _FreeTreeCores:
+    """Index of the cores with free slots in the current round, by subtree
+
+    Each node of the tree keeps its number of free slots and a pointer to
+    the first core of its subtree that may have free slots. Cores of a
+    subtree are contiguous, and pointers only move forward during a round,
+    so queries walk at most num_levels levels plus amortized pointer moves.
+    """
+    def __init__(self, topology):
+        self.num_levels = topology.num_levels
+        self.slots = _core_slots(topology)
+        self.ancestors = [topology.get_core_ancestors(level).tolist() for level in range(self.num_levels)]
+        # First core of the subtree of each node
+        self.starts = [_subtree_first_cores(topology, level) for level in range(self.num_levels)]
+        self._new_round()
+
+    def _new_round(self):
+        slots = np.array(self.slots)
+        self.left = list(self.slots)
+        self.free = [np.bincount(self.ancestors[level], weights=slots,
+                                 minlength=len(self.starts[level])).astype(np.int64).tolist()
+                     for level in range(self.num_levels)]
+        self.first = [list(starts) for starts in self.starts]
+        # First node of each level that may have two free slots
+        self.pair_node = [0] * self.num_levels
+
+    def _take(self, core, slots):
+        # A task needing more slots than the core has left takes the remaining ones
+        taken = min(slots, self.left[core])
+        self.left[core] -= taken
+        for level in range(self.num_levels):
+            self.free[level][self.ancestors[level][core]] -= taken
+
+    def _first_free(self, level, node):
+        """First core with free slots in the subtree of a node"""
+        core = self.first[level][node]
+        while self.left[core] == 0:
+            core += 1
+        self.first[level][node] = core
+        return core
+
+    def take_first(self, slots=1):
+        """Takes the first free core (starting a new round if all cores are full)"""
+        if self.free[0][0] == 0:
+            self._new_round()
+        core = self._first_free(0, 0)
+        self._take(core, slots)
+        return core
+
+    def take_closest(self, core, slots=1):
+        """Takes the free core closest to a core, walking up its ancestors"""
+        if self.free[0][0] == 0:
+            self._new_round()
+        for level in range(self.num_levels - 1, -1, -1):
+            node = self.ancestors[level][core]
+            if self.free[level][node] > 0:
+                closest = self._first_free(level, node)
+                self._take(closest, slots)
+                return closest
+
+    def take_pair(self, first_slots=1, second_slots=1):
+        """Takes the first free slots at the smallest distance for two tasks
+
+        The pair comes from the deepest level with a node that keeps a free
+        slot for the second task once the first task takes its slots (possibly
+        the same core, if it has several slots).
+        """
+        if self.free[0][0] >= 2:
+            for level in range(self.num_levels - 1, -1, -1):
+                free = self.free[level]
+                node = self.pair_node[level]
+                # Nodes with less than two free slots are skipped for the rest of the round
+                while node < len(free) and free[node] < 2:
+                    node += 1
+                self.pair_node[level] = node
+                while node < len(free):
+                    if free[node] >= 2:
+                        first = self._first_free(level, node)
+                        if free[node] > min(first_slots, self.left[first]):
+                            self._take(first, first_slots)
+                            second = self._first_free(level, node)
+                            self._take(second, second_slots)
+                            return first, second
+                    node += 1
+        # The pair is split between the end of this round and the next one
+        first = self.take_first(first_slots)
+        return first, self.take_closest(first, second_slots)
+
+
+@instrumentation.timed('greedy_pairs_with_topology')
 def greedy_pairs_with_topology(application, topology):
     """Computes a greedy mapping by putting tasks with high affinity in cores
     that have the smallest distances
 
+    Tasks are paired as in greedy_pairs, and each pair is mapped to the first
+    two free cores at the smallest distance. A task without a partner is
+    mapped to the first free core. On trees, free cores are indexed by
+    subtree, so each placement walks the levels of the tree. On other
+    topologies, the second core of a pair is the free core closest to the
+    first free core. Cores have as many slots per round as their (rounded)
+    capacity, and a new round starts when all cores are full. A task takes
+    one slot per mean task load (at least one), so cores without capacity
+    receive no tasks and heavy tasks fill their cores faster.
+
     Parameters
     ----------
     application : ApplicationGraph object
@@ -105,9 +296,318 @@ def greedy_pairs_with_topology(application, topology):
     list of int
         Mapping of tasks to cores
     """
-    # TODO
+    if isinstance(topology, TopologyTree):
+        free_cores = _FreeTreeCores(topology)
+    else:
+        free_cores = _FreeCores(topology)
+    # Number of slots taken by each task
+    slots = _load_units(application, units=1)
+    if slots is None:
+        slots = np.ones(application.num_tasks, dtype=np.int64)
+    slots = slots.tolist()
+    mapping = [None for i in range(application.num_tasks)]
+    mapped = np.zeros(application.num_tasks, dtype=bool)
+    for i in range(application.num_tasks):
+        if mapped[i]:
+            continue
+        # Finds the unmapped task that communicates the most with task i
+        neighbors = application.neighbors(i)
+        candidates = neighbors[~mapped[neighbors]]
+        candidates = candidates[candidates != i]
+        mapped[i] = True
+        if len(candidates) == 0:
+            mapping[i] = int(free_cores.take_first(slots[i]))
+            continue
+        most_comm = candidates[application.get_affinity(i, candidates).argmax()]
+        pair = free_cores.take_pair(slots[i], slots[most_comm])
+        mapping[i], mapping[most_comm] = (int(core) for core in pair)
+        mapped[most_comm] = True
+    return mapping
+
+
+def _affinity_graph(sources, dests, weights, size):
+    """Symmetric graph of affinities between elements, from interactions listed in both directions
+
+    The graph is a dense matrix, unless it is large and has few interactions:
+    it is then a SparseApplicationGraph, whose memory grows with the number
+    of interactions. Repeated interactions are added.
+    """
+    if size * size <= max(DENSE_AFFINITIES, 4 * len(sources)):
+        affinities = np.bincount(sources * size + dests, weights, minlength=size * size)
+        # Without interactions, bincount returns integers
+        return affinities.astype(np.float64).reshape(size, size)
+    return SparseApplicationGraph.from_edges(sources, dests, weights, size)
+
+
+def _application_graph(application):
+    """Symmetric graph of affinities between the tasks of an application (see _affinity_graph)"""
+    sources, dests, weights = application.edges()
+    weights = np.asarray(weights, dtype=np.float64)
+    return _affinity_graph(np.concatenate([sources, dests]), np.concatenate([dests, sources]),
+                           np.concatenate([weights, weights]), application.num_tasks)
+
+
+def _pad(matrix, size):
+    """Adds artificial elements without affinity to a graph, up to size elements"""
+    if isinstance(matrix, SparseApplicationGraph):
+        indptr = np.concatenate([matrix.indptr, np.full(size - matrix.num_tasks, matrix.indptr[-1])])
+        return SparseApplicationGraph(indptr, matrix.indices, matrix.data, check=False)
+    padded = np.zeros((size, size))
+    padded[:len(matrix), :len(matrix)] = matrix
+    return padded
+
+
+def _node_types(topology):
+    """Identifies the nodes of each level of a tree whose subtrees have the same shape
+
+    Cores have the same shape when they have the same capacity.
+    """
+    types = [None for level in range(topology.num_levels)]
+    types[-1] = np.unique(topology.capacities, return_inverse=True)[1].astype(np.int64)
+    for level in range(topology.num_levels - 1, 0, -1):
+        offsets = _children_offsets(topology, level)
+        shapes = {}
+        types[level - 1] = np.array([
+            shapes.setdefault(tuple(types[level][offsets[node]:offsets[node + 1]]), len(shapes))
+            for node in range(len(offsets) - 1)], dtype=np.int64)
+    return types
 
 
+def _children_offsets(topology, level):
+    """Position of the first child (at a given level) of each node of the level above"""
+    parents = np.asarray(topology.get_level_parents(level))
+    counts = np.bincount(parents, minlength=topology.get_level_size(level - 1))
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+def _aggregate(matrix, order, offsets, block=256):
+    """Sums a matrix of affinities over groups of elements
+
+    Group g contains the elements order[offsets[g]:offsets[g+1]], and may be
+    empty. Rows are aggregated a few groups at a time to bound the memory
+    used. Sparse graphs are aggregated from their interactions.
+    """
+    num_groups = len(offsets) - 1
+    if isinstance(matrix, SparseApplicationGraph):
+        groups = np.empty(offsets[-1], dtype=np.int64)
+        groups[order] = np.repeat(np.arange(num_groups), np.diff(offsets))
+        owners = np.repeat(np.arange(matrix.num_tasks), np.diff(matrix.indptr))
+        first, second = groups[owners], groups[matrix.indices]
+        between = first != second
+        return _affinity_graph(first[between], second[between], matrix.data[between], num_groups)
+    reduced = np.zeros((num_groups, num_groups))
+    # Columns are reduced over the non-empty groups only (reduceat does not sum empty ranges)
+    filled = np.flatnonzero(np.diff(offsets) > 0)
+    for first in range(0, num_groups, block):
+        last = min(first + block, num_groups)
+        rows = matrix[order[offsets[first]:offsets[last]]]
+        sizes = np.diff(offsets[first:last + 1])
+        if sizes[0] > 0 and (sizes == sizes[0]).all():
+            rows = rows.reshape(last - first, sizes[0], -1).sum(axis=1)
+        else:
+            starts = offsets[first:last + 1] - offsets[first]
+            rows = np.array([rows[starts[g]:starts[g + 1]].sum(axis=0) for g in range(last - first)])
+        reduced[first:last, filled] = np.add.reduceat(rows[:, order], offsets[filled], axis=1)
+    np.fill_diagonal(reduced, 0)
+    return reduced
+
+
+class _Slots:
+    """Slots of the groups of a level, filled one group after the other
+
+    Groups have the sizes given by their offsets, and each slot only accepts
+    elements of its type. With the loads of the elements, the sizes are not
+    fixed: the groups are bounded by the cumulative load they may reach, and
+    a group accepts elements while the load assigned so far stays closest to
+    its bound (the first group with an infinite bound takes the remaining
+    elements).
+    """
+    def __init__(self, offsets, slot_types, element_types, loads=None, bounds=None):
+        self.offsets = offsets
+        self.slot_types = slot_types
+        self.element_types = element_types
+        self.typed = len(np.unique(slot_types)) > 1
+        self.loads = loads
+        self.bounds = bounds
+        self.chosen = np.zeros(len(element_types), dtype=bool)
+        self.order = []
+        self.ends = [0]
+        self.assigned = 0.
+
+    def allowed(self, group):
+        """Elements accepted by the next slot of a group, or None when the group is complete"""
+        allowed = ~self.chosen
+        position = len(self.order)
+        if self.loads is None:
+            if position == self.offsets[group + 1]:
+                return None
+            if self.typed:
+                allowed &= self.element_types == self.slot_types[position]
+            return allowed
+        allowed &= self.assigned + self.loads / 2 <= self.bounds[group]
+        return allowed if allowed.any() else None
+
+    def take(self, element):
+        self.chosen[element] = True
+        self.order.append(element)
+        if self.loads is not None:
+            self.assigned += self.loads[element]
+
+    def close(self):
+        self.ends.append(len(self.order))
+
+    def result(self):
+        """Order of the elements in the groups, and offsets of the groups"""
+        return np.array(self.order, dtype=np.int64), np.array(self.ends, dtype=np.int64)
+
+
+def _eager_groups(matrix, offsets, slot_types, element_types, loads=None, bounds=None):
+    """Greedy grouping of EagerMap
+
+    Each group starts with the element that communicates the most with the
+    elements not grouped yet, and is completed by repeatedly adding the
+    element that communicates the most with the members of the group.
+    Slots only accept elements of their type (subtree shape), and groups
+    are sized by the loads of the elements when given (see _Slots).
+    """
+    num_elements = num_vertices(matrix)
+    slots = _Slots(offsets, slot_types, element_types, loads, bounds)
+    remaining = row_sums(matrix)
+    for group in range(len(offsets) - 1):
+        gain = np.zeros(num_elements)
+        score = remaining
+        while True:
+            allowed = slots.allowed(group)
+            if allowed is None:
+                break
+            winner = np.argmax(np.where(allowed, score, -1.))
+            slots.take(winner)
+            add_row(gain, matrix, winner)
+            add_row(remaining, matrix, winner, -1.)
+            score = gain
+        slots.close()
+    return slots.result()
+
+
+def _hierarchical_mapping(application, topology, generate_groups):
+    """Maps tasks by grouping them level by level from the cores up to the root
+
+    At each level, the elements (tasks or groups from the level below) are
+    split into groups, one per node of the level above, with as many members
+    as the node has children. Only the first nodes needed to host all the
+    elements are used, and artificial elements without affinity fill the
+    remaining slots. The groups are then mapped from the root down.
+    When there are more tasks than cores or the cores have different
+    capacities, tasks are first grouped by core: each core receives the
+    number of tasks CoreLoads assigns to it (none without capacity) or, with
+    different task loads, tasks up to its share of the total load.
+
+    Parameters
+    ----------
+    application : ApplicationGraph object
+        Application's communication graph
+    topology : TopologyTree object
+        Machine topology graph
+    generate_groups : function
+        Receives the graph of affinities between elements (a dense matrix, or
+        a SparseApplicationGraph for large sparse applications), the offsets
+        of the groups, the types of slots and elements and, optionally, the
+        loads of the elements and the cumulative load bounds of the groups,
+        and returns the order of the elements in the groups and their offsets
+
+    Returns
+    -------
+    list of int
+        Mapping of tasks to cores
+
+    Raises
+    ------
+    ValueError
+        If the topology is not a tree
+    """
+    if not isinstance(topology, TopologyTree):
+        print("* Hierarchical mapping requires a TopologyTree")
+        raise ValueError
+    num_tasks = application.num_tasks
+    num_cores = topology.num_cores
+    types = _node_types(topology)
+    capacities = topology.capacities
+    layers = []
+    with instrumentation.timer('hierarchical.affinity_matrix'):
+        matrix = _application_graph(application)
+    # Tasks sharing cores are grouped first when there are more tasks than
+    # cores, or when the cores do not all have the same capacity
+    if num_tasks > num_cores or (capacities != capacities[0]).any():
+        # Each core receives as many tasks as CoreLoads assigns to it
+        core_loads = CoreLoads.for_mapping(application, topology)
+        loads = application.loads
+        sizes = np.bincount([core_loads.assign(loads[i]) for i in range(num_tasks)], minlength=num_cores)
+        offsets = np.zeros(num_cores + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        bounds = None
+        if (loads != loads[0]).any():
+            # With different loads, cores receive tasks up to their share of the total load
+            bounds = np.cumsum(capacities / capacities.sum()) * loads.sum()
+            bounds[np.flatnonzero(capacities > 0)[-1]:] = np.inf
+        else:
+            loads = None
+        with instrumentation.timer('hierarchical.grouping'):
+            order, offsets = generate_groups(matrix, offsets, np.zeros(num_tasks, dtype=np.int64),
+                                             np.zeros(num_tasks, dtype=np.int64), loads, bounds)
+        layers.append((None, order, offsets))
+        with instrumentation.timer('hierarchical.aggregation'):
+            matrix = _aggregate(matrix, order, offsets)
+        instrumentation.count('hierarchical.elements_grouped', num_tasks)
+        element_types = types[-1]
+    else:
+        element_types = types[-1][:num_tasks]
+    for level in range(topology.num_levels - 1, 0, -1):
+        offsets = _children_offsets(topology, level)
+        slot_types = types[level]
+        # Finds how many nodes of the level above are needed to host the elements
+        needed = 0
+        for kind in np.unique(element_types):
+            count = np.count_nonzero(element_types == kind)
+            last_slot = np.flatnonzero(slot_types == kind)[count - 1]
+            needed = max(needed, np.searchsorted(offsets, last_slot, side='right'))
+        offsets = offsets[:needed + 1]
+        slot_types = slot_types[:offsets[-1]]
+        # Artificial elements take the remaining slots of each type
+        missing = np.concatenate([
+            np.full(np.count_nonzero(slot_types == kind) - np.count_nonzero(element_types == kind), kind)
+            for kind in np.unique(slot_types)])
+        padded = matrix
+        if num_vertices(matrix) < offsets[-1]:
+            padded = _pad(matrix, offsets[-1])
+        element_types = np.concatenate([element_types, missing]).astype(np.int64)
+        with instrumentation.timer('hierarchical.grouping'):
+            order, offsets = generate_groups(padded, offsets, slot_types, element_types)
+        layers.append((level, order, offsets))
+        with instrumentation.timer('hierarchical.aggregation'):
+            matrix = _aggregate(padded, order, offsets)
+        instrumentation.count('hierarchical.elements_grouped', offsets[-1])
+        element_types = types[level - 1][:needed]
+    # Places the groups from the root down to the cores
+    with instrumentation.timer('hierarchical.placement'):
+        node_of_group = np.zeros(1, dtype=np.int64)
+        for level, order, offsets in reversed(layers):
+            sizes = np.diff(offsets)
+            group = np.repeat(np.arange(len(sizes)), sizes)
+            if level is None:
+                node = node_of_group[group]
+            else:
+                first_child = _children_offsets(topology, level)
+                position = np.arange(offsets[-1]) - offsets[group]
+                node = first_child[node_of_group[group]] + position
+            node_of_element = np.empty(offsets[-1], dtype=np.int64)
+            node_of_element[order] = node
+            node_of_group = node_of_element
+    return [int(core) for core in node_of_group[:num_tasks]]
+
+
+@instrumentation.timed('eagermap')
 def eagermap(application, topology):
     """Mapping tasks on a hierarchical topology following the EagerMap algorithm
 
@@ -130,5 +630,509 @@ def eagermap(application, topology):
     "EagerMap: A task mapping algorithm to improve communication and load balancing
     in clusters of multicore systems." ACM Transactions on Parallel Computing (TOPC)
     5, no. 4 (2019): 1-24.
+    Tasks are padded with artificial tasks when their number does not fill
+    the tree, and grouped with the affinities aggregated at each level.
+
+    Raises
+    ------
+    ValueError
+        If the topology is not a TopologyTree
     """
-    # TODO
+    return _hierarchical_mapping(application, topology, _eager_groups)
+
+
+def _treematch_groups(matrix, offsets, slot_types, element_types, loads=None, bounds=None,
+                      max_combinations=10000):
+    """Grouping of TreeMatch, minimizing the communication leaving each group
+
+    When all the groups have the same size and the number of candidate groups
+    is small, every candidate group is evaluated and the cheapest disjoint
+    ones are chosen. Otherwise, each group starts with the element that
+    communicates the most and grows by the element that increases the
+    external communication of the group the least. Groups are sized by the
+    loads of the elements when given (see _Slots).
+    """
+    num_elements = num_vertices(matrix)
+    sizes = np.diff(offsets)
+    slots = _Slots(offsets, slot_types, element_types, loads, bounds)
+    total = row_sums(matrix)
+    group = 0
+    if (loads is None and not slots.typed and (sizes == sizes[0]).all() and sizes[0] > 1 and
+            comb(num_elements, int(sizes[0])) <= max_combinations):
+        # Costs of all candidate groups are computed in bulk (few elements are stored densely)
+        candidates = np.array(list(combinations(range(num_elements), int(sizes[0]))))
+        dense = matrix.affinity if isinstance(matrix, SparseApplicationGraph) else matrix
+        internal = np.zeros(len(candidates))
+        for first, second in combinations(range(sizes[0]), 2):
+            internal += dense[candidates[:, first], candidates[:, second]]
+        costs = total[candidates].sum(axis=1) - 2 * internal
+        for candidate in candidates[np.argsort(costs, kind='stable')]:
+            if group == len(sizes):
+                break
+            if not slots.chosen[candidate].any():
+                for element in candidate:
+                    slots.take(element)
+                slots.close()
+                group += 1
+    for group in range(group, len(sizes)):
+        gain = np.zeros(num_elements)
+        first = True
+        while True:
+            allowed = slots.allowed(group)
+            if allowed is None:
+                break
+            if first:
+                winner = np.argmax(np.where(allowed, total, -1.))
+            else:
+                # Adding an element changes the external communication by its
+                # total communication minus twice its affinity to the group
+                winner = np.argmin(np.where(allowed, total - 2 * gain, np.inf))
+            slots.take(winner)
+            add_row(gain, matrix, winner)
+            first = False
+        slots.close()
+    return slots.result()
+
+
+@instrumentation.timed('treematch')
+def treematch(application, topology, max_combinations=10000):
+    """Mapping tasks on a hierarchical topology following the TreeMatch algorithm
+
+    Parameters
+    ----------
+    application : ApplicationGraph object
+        Application's communication graph
+    topology : Topology object
+        Machine topology graph
+    max_combinations : int, optional
+        Maximum number of candidate groups evaluated exhaustively at a level.
+        Levels with more candidates use the greedy grouping heuristic
+
+    Returns
+    -------
+    list of int
+        Mapping of tasks to cores
+
+    Raises
+    ------
+    ValueError
+        If the topology is not a TopologyTree
+
+    Notes
+    -----
+    The algorithm is described in
+    Emmanuel Jeannot and Guillaume Mercier. "Near-optimal placement of MPI
+    processes on hierarchical NUMA architectures." Euro-Par 2010 Parallel
+    Processing, pp. 199-210.
+    Tasks are grouped level by level from the cores up, minimizing the
+    communication between groups, as in eagermap.
+    """
+    return _hierarchical_mapping(application, topology,
+                                 partial(_treematch_groups, max_combinations=max_combinations))
+
+
+def _load_units(application, units=LOAD_UNITS):
+    """Integer weight of each task following its load, or None when all loads are equal
+
+    A task of mean load weighs units, and every task weighs at least one.
+    """
+    loads = application.loads
+    if (loads == loads[0]).all():
+        return None
+    return np.maximum(1, np.rint(loads / loads.mean() * units)).astype(np.int64)
+
+
+def _split_cores(topology, cores):
+    """Splits a set of cores in two halves of close cores
+
+    The two most distant cores are used as poles, and cores are sorted by
+    how much closer they are to the first pole than to the second one.
+    """
+    def around(index):
+        # Distances in both directions between a core and the other cores
+        return (topology.get_distances(cores[index], cores).astype(np.float64) +
+                topology.get_distances(cores, cores[index]))
+
+    first_pole = np.argmax(around(0))
+    second_pole = np.argmax(around(first_pole))
+    closeness = around(first_pole) - around(second_pole)
+    order = np.argsort(closeness, kind='stable')
+    half = len(cores) // 2
+    return np.sort(cores[order[:half]]), np.sort(cores[order[half:]])
+
+
+def _pull(graph, tasks, outside):
+    """Affinities between a set of tasks and the tasks outside the current set
+
+    Returns the outside tasks and the affinity of the set with each of them
+    (a task may appear several times in sparse graphs).
+    """
+    if isinstance(graph, SparseApplicationGraph):
+        owners, others, weights = incident_edges(graph, tasks)
+        keep = outside[others]
+        return others[keep], weights[keep]
+    others = np.flatnonzero(outside)
+    return others, graph[np.ix_(tasks, others)].sum(axis=0)
+
+
+@instrumentation.timed('recursive_bisection')
+def recursive_bisection(application, topology, seed=None):
+    """Computes a mapping by dual recursive bisection of the tasks and the cores
+
+    The set of cores is split in two halves of close cores using the matrix
+    of distances, and the set of tasks is split in two parts with a
+    multilevel graph bisection minimizing the affinity between the parts.
+    The load of each part follows the capacity of its half of the cores
+    (tasks are weighted by their loads when they differ, and cores without
+    capacity receive no tasks). Each part of the tasks is then mapped to its
+    half of the cores recursively. Works on any Topology, including non-tree
+    networks.
+
+    Parameters
+    ----------
+    application : ApplicationGraph object
+        Application's communication graph
+    topology : Topology object
+        Machine topology graph
+    seed : int, optional
+        Seed for the random choices of the graph bisection
+
+    Returns
+    -------
+    list of int
+        Mapping of tasks to cores
+    """
+    generator = np.random.default_rng(seed)
+    graph = _application_graph(application)
+    capacities = topology.capacities
+    weights = _load_units(application)
+    mapping = np.zeros(application.num_tasks, dtype=np.int64)
+    pending = [(np.arange(application.num_tasks), np.flatnonzero(capacities > 0))]
+    while pending:
+        tasks, cores = pending.pop()
+        if len(tasks) == 0:
+            continue
+        if len(cores) == 1 or len(tasks) == 1:
+            mapping[tasks] = cores[np.argmax(capacities[cores])]
+            continue
+        with instrumentation.timer('recursive_bisection.split_cores'):
+            first_cores, second_cores = _split_cores(topology, cores)
+        # Tasks are split proportionally to the capacity of each side
+        task_weights = None if weights is None else weights[tasks]
+        total = len(tasks) if weights is None else task_weights.sum()
+        first_capacity, second_capacity = capacities[first_cores].sum(), capacities[second_cores].sum()
+        target = int(round(total * first_capacity / (first_capacity + second_capacity)))
+        with instrumentation.timer('recursive_bisection.bisect'):
+            part = bisect(subgraph(graph, tasks), target, weights=task_weights, seed=generator)
+        first_tasks, second_tasks = tasks[part], tasks[~part]
+        # Halves of the same capacity can host either part: the parts are oriented
+        # towards the (approximate) location of the tasks they communicate with
+        if first_capacity == second_capacity:
+            outside = np.ones(application.num_tasks, dtype=bool)
+            outside[tasks] = False
+            if outside.any():
+                first_others, first_pull = _pull(graph, first_tasks, outside)
+                second_others, second_pull = _pull(graph, second_tasks, outside)
+
+                first_near = first_pull @ topology.get_distances(first_cores[0], mapping[first_others])
+                first_far = first_pull @ topology.get_distances(second_cores[0], mapping[first_others])
+                second_near = second_pull @ topology.get_distances(second_cores[0], mapping[second_others])
+                second_far = second_pull @ topology.get_distances(first_cores[0], mapping[second_others])
+                if first_far + second_far < first_near + second_near:
+                    first_tasks, second_tasks = second_tasks, first_tasks
+        # Tasks not mapped yet are located at the first core of their half
+        mapping[first_tasks] = first_cores[0]
+        mapping[second_tasks] = second_cores[0]
+        pending.append((first_tasks, first_cores))
+        pending.append((second_tasks, second_cores))
+    return [int(core) for core in mapping]
+
+
+class _NearCores:
+    """Cores closest to each core, for any topology
+
+    The closest cores of a core are found by sorting its distances the first
+    time they are required, and kept.
+    """
+    def __init__(self, topology, count):
+        self.topology = topology
+        self.count = min(count, topology.num_cores)
+        self.cores = np.arange(topology.num_cores)
+        self._near = {}
+
+    def near(self, core, generator):
+        """Returns the closest cores to a core (including itself)"""
+        if core not in self._near:
+            distances = self.topology.get_distances(core, self.cores)
+            closest = np.argpartition(distances, self.count - 1)[:self.count]
+            self._near[core] = closest[np.argsort(distances[closest], kind='stable')].tolist()
+        return self._near[core]
+
+
+class _NearTreeCores:
+    """Cores closest to each core in a tree, from the subtrees of its ancestors
+
+    Cores of a subtree are contiguous, so the cores that an ancestor adds to
+    the subtree of the ancestor below form two ranges. Ancestors are visited
+    from the core up, and the cores added by the last ancestor needed are
+    sampled, so a query takes O(num_levels + count).
+    """
+    def __init__(self, topology, count):
+        self.count = min(count, topology.num_cores)
+        self.num_levels = topology.num_levels
+        self.ancestors = [topology.get_core_ancestors(level).tolist() for level in range(self.num_levels)]
+        # First and last core (excluded) of the subtree of each node
+        self.starts = [_subtree_first_cores(topology, level) + [topology.num_cores]
+                       for level in range(self.num_levels)]
+
+    def near(self, core, generator):
+        """Returns cores close to a core (including itself), closest first"""
+        cores = [core]
+        low, high = core, core + 1
+        for level in range(self.num_levels - 2, -1, -1):
+            if len(cores) >= self.count:
+                break
+            node = self.ancestors[level][core]
+            start, end = self.starts[level][node], self.starts[level][node + 1]
+            added = (low - start) + (end - high)
+            missing = self.count - len(cores)
+            if added <= missing:
+                cores.extend(range(start, low))
+                cores.extend(range(high, end))
+            else:
+                for offset in generator.integers(added, size=missing).tolist():
+                    cores.append(start + offset if offset < low - start else high + offset - (low - start))
+            low, high = start, end
+        return cores
+
+
+class _Occupancy:
+    """Tasks and load of each core, kept up to date while a mapping is refined"""
+    def __init__(self, application, topology, mapping):
+        self.loads = np.asarray(application.loads, dtype=np.float64)
+        self.capacities = np.asarray(topology.capacities, dtype=np.float64)
+        self.tasks = [[] for core in range(topology.num_cores)]
+        for task, core in enumerate(mapping):
+            self.tasks[core].append(task)
+        self.core_loads = np.bincount(mapping, weights=self.loads, minlength=topology.num_cores)
+
+    def can_move(self, task, source, core):
+        """Checks whether moving a task leaves its new core less loaded than its old one
+
+        Loads are relative to the capacities, so moves never increase the
+        load of the most loaded core nor use cores without capacity.
+        """
+        if core == source or self.capacities[core] == 0:
+            return False
+        return ((self.core_loads[core] + self.loads[task]) * self.capacities[source] <=
+                self.core_loads[source] * self.capacities[core])
+
+    def move(self, task, source, core):
+        """Records that a task moved from a core to another"""
+        self.tasks[source].remove(task)
+        self.tasks[core].append(task)
+        self.core_loads[source] -= self.loads[task]
+        self.core_loads[core] += self.loads[task]
+
+
+def _refine_candidates(application, mapping, occupancy, near_cores, task, generator):
+    """Finds swaps and moves worth evaluating for a task
+
+    A communication partner of the task is drawn with a probability
+    proportional to its affinity, and the candidate cores are the cores
+    closest to the partner's core and the cores of the heaviest partners. Each
+    candidate core gives a task on it to swap with, and the core itself if
+    it can receive the task (see _Occupancy.can_move). A random task is
+    added for diversity.
+
+    Returns
+    -------
+    list of tuple
+        (other, core) pairs: swap with task other on core, or move to core
+        if other is None
+    """
+    source = mapping[task]
+    other = int(generator.integers(len(mapping)))
+    candidates = [(other, mapping[other])]
+    neighbors = application.neighbors(task)
+    neighbors = neighbors[neighbors != task]
+    if len(neighbors) > 0:
+        weights = np.asarray(application.get_affinity(task, neighbors), dtype=np.float64)
+        partner = neighbors[min(np.searchsorted(np.cumsum(weights), generator.random() * weights.sum(),
+                                                side='right'), len(neighbors) - 1)]
+        count = min(near_cores.count, len(neighbors))
+        heaviest = neighbors[np.argpartition(-weights, count - 1)[:count]]
+        # Cores close to the partner, then the cores of the heaviest partners
+        cores = near_cores.near(mapping[partner], generator) + mapping[heaviest].tolist()
+        for core in dict.fromkeys(cores):
+            if core == source:
+                continue
+            if occupancy.can_move(task, source, core):
+                candidates.append((None, core))
+            tasks = occupancy.tasks[core]
+            if tasks:
+                candidates.append((tasks[generator.integers(len(tasks))], core))
+    return [(other, core) for other, core in candidates if core != source]
+
+
+@instrumentation.timed('refine')
+def refine(application, topology, mapping, budget=1., max_iterations=None,
+           method='descent', candidates=8, temperature=None, seed=None,
+           origin=None, migration_cost=None):
+    """Improves an existing mapping by swapping the cores of pairs of tasks
+    and moving tasks to cores with spare capacity
+
+    Parameters
+    ----------
+    application : ApplicationGraph object
+        Application's communication graph
+    topology : Topology object
+        Machine topology graph
+    mapping : list of int
+        Mapping of tasks to cores to improve
+    budget : float, optional
+        Maximum time in seconds, including the setup of the evaluation
+    max_iterations : int, optional
+        Maximum number of swaps and moves evaluated
+    method : string, optional
+        'descent' applies, for each task, the best improving swap or move
+        among its candidates until none improves the mapping. Each pass
+        visits the tasks whose interactions cost the most first. Descent
+        stops at mappings that no single swap or move improves, even when
+        much better mappings exist (e.g. rows of a stencil mapped to the
+        leaves of a tree, which only coordinated changes turn into blocks).
+        'annealing' follows simulated annealing, accepting worse changes with
+        a probability that decreases over the budget, and can leave such
+        mappings.
+    candidates : int, optional
+        Number of cores close to the task's partner considered for each task
+        (see _refine_candidates). A task moves to one of them only if the
+        core ends up less loaded, relative to its capacity, than the core
+        the task leaves
+    temperature : float, optional
+        Starting temperature for simulated annealing. Default: a tenth of the
+        median increase of the total among the candidate changes of a sample
+        of tasks
+    seed : int, optional
+        Seed for the random choices
+    origin : list of int, optional
+        Mapping the tasks are migrated from. If given, the cost of migrating
+        tasks is added to the hopbytes minimized (see HopBytesEvaluator)
+    migration_cost : float or np.ndarray, optional
+        Cost per hop of migrating each task (default: 1)
+
+    Returns
+    -------
+    list of int
+        Mapping of tasks to cores, never worse than the input mapping
+
+    Raises
+    ------
+    ValueError
+        If the mapping is invalid or the method is unknown
+    """
+    # The setup also counts against the budget
+    start = time.perf_counter()
+    if method not in ('descent', 'annealing'):
+        print(f"* Unknown refinement method {method}")
+        raise ValueError
+    evaluator = HopBytesEvaluator(application, topology, mapping, origin, migration_cost)
+    generator = np.random.default_rng(seed)
+    num_tasks = application.num_tasks
+    best_total = evaluator.total
+    best_mapping = evaluator.mapping.copy()
+    iterations = swaps = moves = 0
+
+    if num_tasks < 2:
+        return [int(core) for core in best_mapping]
+
+    occupancy = _Occupancy(application, topology, evaluator.mapping)
+    if isinstance(topology, TopologyTree):
+        near_cores = _NearTreeCores(topology, candidates)
+    else:
+        near_cores = _NearCores(topology, candidates)
+
+    def exhausted():
+        return ((max_iterations is not None and iterations >= max_iterations) or
+                time.perf_counter() - start >= budget)
+
+    def delta(task, other, core):
+        if other is None:
+            return evaluator.delta_move(task, core)
+        return evaluator.delta_swap(task, other)
+
+    def apply(task, other, core):
+        nonlocal swaps, moves
+        source = evaluator.mapping[task]
+        if other is None:
+            evaluator.apply_move(task, core)
+            occupancy.move(task, source, core)
+            moves += 1
+        else:
+            evaluator.apply_swap(task, other)
+            occupancy.move(task, source, core)
+            occupancy.move(other, core, source)
+            swaps += 1
+
+    if method == 'descent':
+        improved = True
+        while improved and not exhausted():
+            improved = False
+            # Tasks whose interactions cost the most are improved first
+            order = np.argsort(-evaluator.task_costs(), kind='stable')
+            for task in order:
+                options = _refine_candidates(application, evaluator.mapping, occupancy,
+                                             near_cores, task, generator)
+                iterations += len(options)
+                # The swaps and the moves of the task are evaluated at once
+                moving = [core for other, core in options if other is None]
+                swapped = [(other, core) for other, core in options if other is not None]
+                changes = np.concatenate([evaluator.delta_moves(task, moving),
+                                          evaluator.delta_swaps(task, [other for other, core in swapped])])
+                if len(changes) > 0 and changes.min() < 0:
+                    best = int(np.argmin(changes))
+                    if best < len(moving):
+                        apply(task, None, moving[best])
+                    else:
+                        apply(task, *swapped[best - len(moving)])
+                    improved = True
+                if exhausted():
+                    break
+        # Descent only applies improving changes
+        if evaluator.total < best_total:
+            best_mapping = evaluator.mapping
+    else:
+        if temperature is None:
+            # A tenth of the typical increase among the candidate changes, which are
+            # much smaller than the changes of random swaps across the machine
+            samples = []
+            for task in generator.integers(num_tasks, size=min(100, num_tasks)):
+                options = _refine_candidates(application, evaluator.mapping, occupancy,
+                                             near_cores, task, generator)
+                samples.extend(delta(task, other, core) for other, core in options)
+            increases = [change for change in samples if change > 0]
+            temperature = max(0.1 * np.median(increases), 1e-12) if increases else 1e-12
+        while not exhausted():
+            task = generator.integers(num_tasks)
+            options = _refine_candidates(application, evaluator.mapping, occupancy,
+                                         near_cores, task, generator)
+            # Tasks without options also count, so that max_iterations bounds the loop
+            iterations += 1
+            if not options:
+                continue
+            other, core = options[generator.integers(len(options))]
+            change = delta(task, other, core)
+            # The temperature decreases linearly with the consumed budget
+            progress = (time.perf_counter() - start) / budget
+            if max_iterations is not None:
+                progress = max(progress, iterations / max_iterations)
+            current = temperature * max(1. - progress, 1e-9)
+            if change <= 0 or generator.random() < np.exp(-change / current):
+                apply(task, other, core)
+                if evaluator.total < best_total:
+                    best_total = evaluator.total
+                    best_mapping = evaluator.mapping.copy()
+    instrumentation.count('refine.changes_evaluated', iterations)
+    instrumentation.count('refine.swaps_applied', swaps)
+    instrumentation.count('refine.moves_applied', moves)
+    return [int(core) for core in best_mapping]
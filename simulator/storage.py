@@ -0,0 +1,165 @@
+"""Module containing a compact binary format for affinity and distance matrices.
+
+A file starts with a magic string, the length of a JSON header, and the
+header itself. The header describes the kind of object stored, the hash of
+the source file it was built from (if any), and the type, shape and offset
+of each array. The raw arrays follow, aligned to 64 bytes, so they can be
+opened through np.memmap without being read or copied. Memory-mapped files
+are shared between the processes that open them.
+"""
+
+import hashlib
+import json
+
+import numpy as np
+
+MAGIC = b'TOPOMAP1'
+ALIGNMENT = 64
+
+
+def file_hash(path, block_size=1 << 20):
+    """Computes a hash of the contents of a file
+
+    Parameters
+    ----------
+    path : string
+        File to hash
+    block_size : int, optional
+        Number of bytes read at once
+
+    Returns
+    -------
+    string
+        Hexadecimal digest of the file contents
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as stream:
+        for block in iter(lambda: stream.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _aligned(offset):
+    """Rounds an offset up to the next multiple of the alignment"""
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def save_arrays(path, kind, arrays, source_hash=None):
+    """Writes a set of arrays to a binary file
+
+    Parameters
+    ----------
+    path : string
+        Destination file
+    kind : string
+        Kind of object stored (e.g. 'application' or 'topology')
+    arrays : dict of np.ndarray
+        Arrays to store, by name
+    source_hash : string, optional
+        Hash of the file the arrays were built from
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    # The offsets depend on the size of the header, so it is computed twice
+    header = {'kind': kind, 'source_hash': source_hash, 'arrays': {}}
+    for attempt in range(2):
+        header_bytes = json.dumps(header).encode()
+        offset = _aligned(len(MAGIC) + 8 + len(header_bytes))
+        layout = {}
+        for name, array in arrays.items():
+            layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset = _aligned(offset + array.nbytes)
+        header['arrays'] = layout
+    header_bytes = json.dumps(header).encode()
+    with open(path, 'wb') as stream:
+        stream.write(MAGIC)
+        stream.write(np.uint64(len(header_bytes)).tobytes())
+        stream.write(header_bytes)
+        for name, array in arrays.items():
+            stream.seek(layout[name]['offset'])
+            array.tofile(stream)
+        stream.truncate(offset)
+
+
+def read_header(path):
+    """Reads the header of a binary file
+
+    Parameters
+    ----------
+    path : string
+        File to read
+
+    Returns
+    -------
+    dict
+        Kind of object, source hash and layout of the arrays
+
+    Raises
+    ------
+    ValueError
+        If the file is not in the expected format
+    """
+    with open(path, 'rb') as stream:
+        if stream.read(len(MAGIC)) != MAGIC:
+            print(f"* The file {path} is not in the binary matrix format.")
+            raise ValueError
+        length = int(np.frombuffer(stream.read(8), dtype=np.uint64)[0])
+        return json.loads(stream.read(length))
+
+
+def load_arrays(path, kind=None):
+    """Opens the arrays of a binary file as read-only memory maps
+
+    Parameters
+    ----------
+    path : string
+        File to open
+    kind : string, optional
+        Kind of object expected in the file
+
+    Returns
+    -------
+    tuple
+        Kind of object (string), arrays by name (dict of np.memmap) and
+        source hash (string or None)
+
+    Raises
+    ------
+    ValueError
+        If the file is not in the expected format or does not contain the expected kind
+    """
+    header = read_header(path)
+    if kind is not None and header['kind'] != kind:
+        print(f"* The file {path} contains a {header['kind']} instead of a {kind}.")
+        raise ValueError
+    arrays = {}
+    for name, layout in header['arrays'].items():
+        shape = tuple(layout['shape'])
+        if 0 in shape:
+            arrays[name] = np.zeros(shape, dtype=layout['dtype'])
+        else:
+            arrays[name] = np.memmap(path, dtype=layout['dtype'], mode='r',
+                                     offset=layout['offset'], shape=shape)
+    return header['kind'], arrays, header['source_hash']
+
+
+def stored_hash(cache_file):
+    """Returns the hash of the source file stored in a binary file
+
+    Parameters
+    ----------
+    cache_file : string
+        Binary file
+
+    Returns
+    -------
+    string or None
+        Hash of the source file, or None if the binary file is missing or not
+        in the expected format
+    """
+    try:
+        with open(cache_file, 'rb') as stream:
+            if stream.read(len(MAGIC)) != MAGIC:
+                return None
+    except OSError:
+        return None
+    return read_header(cache_file)['source_hash']
@@ -1,6 +1,37 @@
 """Module containing a representation of the machine topology graph."""
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
+from simulator import instrumentation
+from simulator.application import SparseApplicationGraph, PackedApplicationGraph
+from simulator.topology import TopologyTree
+
+# Largest number of distances between the cores of a tree gathered in a matrix by HopBytesEvaluator
+DENSE_DISTANCES = 1 << 22
+
+
+def mapped_distances(topology, mapping):
+    """Gathers the matrix of distances between the cores of a mapping
+
+    Parameters
+    ----------
+    topology : Topology object
+        Machine topology graph
+    mapping : list of int
+        Mapping of tasks to cores
+
+    Returns
+    -------
+    np.ndarray
+        Matrix where position [a][b] holds the distance between the cores of tasks a and b
+    """
+    mapping = np.asarray(mapping)
+    return topology.get_distances(mapping[:, None], mapping[None, :])
+
+
+@instrumentation.timed('support.compute_hopbytes')
 def compute_hopbytes(application, topology, mapping):
     """Computes the hopbytes based on the application and topology graphs, and a mapping of application tasks to topology cores
 
@@ -29,14 +60,683 @@ def compute_hopbytes(application, topology, mapping):
         raise ValueError
     if (min(mapping) < 0) or (max(mapping) >= topology.num_cores):
         raise ValueError
-    # Compute the dilation (hop-bytes) for the mapping
-    dilation = 0
-    num_tasks = len(mapping)
-    # For all tasks
-    for source in range(num_tasks):
-        for dest in application.neighbors(source):
-            if dest > source:  # check to avoid counting interactions twice
-                affinity = application.get_affinity(source, dest)
-                distance = topology.get_hops_between_cores(mapping[source], mapping[dest])
-                dilation += affinity * distance
+    # Sparse and packed graphs only visit their (upper) interactions
+    if isinstance(application, (SparseApplicationGraph, PackedApplicationGraph)):
+        mapping = np.asarray(mapping)
+        sources, dests, weights = application.edges()
+        instrumentation.count('distance_queries', len(weights))
+        return np.dot(weights, topology.get_distances(mapping[sources], mapping[dests]))
+    # Compute the dilation (hop-bytes) for the mapping in a single pass:
+    # the weighted distances over the upper triangle count each interaction once,
+    # so the pairs of the upper triangle are counted, as in sparse graphs
+    instrumentation.count('distance_queries', len(mapping) * (len(mapping) - 1) // 2)
+    distances = mapped_distances(topology, mapping)
+    dilation = np.triu(application.affinity * distances, 1).sum()
     return dilation
+
+
+@instrumentation.timed('support.compute_hopbytes_batch')
+def compute_hopbytes_batch(application, topology, mappings, max_memory=1 << 28, workers=1):
+    """Computes the hopbytes of many mappings at once
+
+    Mappings are evaluated in chunks with vectorized gathers over the
+    interactions of the application, bounding the memory of the temporary
+    arrays. Chunks can be spread over threads, as NumPy releases the GIL.
+
+    Parameters
+    ----------
+    application : ApplicationGraph object
+        Application's communication graph
+    topology : Topology object
+        Machine topology graph
+    mappings : np.ndarray
+        Matrix (number of mappings x number of tasks) of mappings of tasks to cores
+    max_memory : int, optional
+        Approximate number of bytes used by the temporary arrays of each chunk
+    workers : int, optional
+        Number of threads evaluating chunks
+
+    Returns
+    -------
+    np.ndarray
+        Sum of hopbytes for each mapping
+
+    Raises
+    ------
+    ValueError
+        If the size of the mappings does not match the number of tasks in the application,
+        or any tasks are mapped to cores that do not exist.
+    """
+    mappings = np.asarray(mappings)
+    # Checking for problems once for all mappings
+    if mappings.ndim != 2 or mappings.shape[1] != application.num_tasks:
+        raise ValueError
+    if mappings.size > 0 and ((mappings.min() < 0) or (mappings.max() >= topology.num_cores)):
+        raise ValueError
+    sources, dests, weights = application.edges()
+    hopbytes = np.zeros(len(mappings))
+    # Each mapping in a chunk needs two index arrays and one array of distances per interaction
+    per_mapping = max(1, len(weights) * 24)
+    chunk = max(1, max_memory // per_mapping)
+
+    def evaluate(start):
+        block = mappings[start:start + chunk]
+        hopbytes[start:start + chunk] = topology.get_distances(block[:, sources], block[:, dests]) @ weights
+
+    instrumentation.count('distance_queries', len(weights) * len(mappings))
+    starts = range(0, len(mappings), chunk)
+    if workers > 1:
+        with ThreadPoolExecutor(workers) as executor:
+            list(executor.map(evaluate, starts))
+    else:
+        for start in starts:
+            evaluate(start)
+    return hopbytes
+
+
+@instrumentation.timed('support.compute_metrics')
+def compute_metrics(application, topology, mapping):
+    """Computes locality metrics of a mapping in one pass over the interactions
+
+    The distance of each interaction between tasks is gathered once (and,
+    on trees, the level of the lowest common ancestor of their cores), and
+    all metrics are computed from these arrays with vectorized reductions.
+
+    Parameters
+    ----------
+    application : ApplicationGraph object
+        Application's communication graph (dense, sparse or packed)
+    topology : Topology object
+        Machine topology graph
+    mapping : list of int
+        Mapping of tasks to cores
+
+    Returns
+    -------
+    dict
+        'hopbytes' : numpy.float64
+            Sum of hopbytes for the mapping (as compute_hopbytes)
+        'volume' : numpy.float64
+            Total affinity of the interactions between tasks
+        'average_distance' : numpy.float64
+            Distance travelled by a unit of volume on average
+        'dilation' : np.ndarray
+            Hopbytes of the interactions of each task (each interaction
+            counts for both of its tasks, so they add up to twice the hopbytes)
+        'histogram' : tuple of np.ndarray
+            Distinct distances between interacting tasks, in increasing
+            order, and the volume exchanged at each distance
+        'level_traffic' : np.ndarray or None
+            On trees, volume exchanged by tasks whose cores have their lowest
+            common ancestor at each level (the last level is the volume
+            inside cores, the one before it inside their parents, and so on)
+        'link_traffic' : list of np.ndarray or None
+            On trees, volume crossing the link between each node and its
+            parent, for each level (the root has no link, and no traffic)
+        'max_congestion' : numpy.float64 or None
+            On trees, largest volume crossing a single link
+
+    Raises
+    ------
+    ValueError
+        If the size of the mapping does not match the number of tasks in the application,
+        or any tasks are mapped to cores that do not exist.
+    """
+    if len(mapping) != application.num_tasks:
+        raise ValueError
+    if (min(mapping) < 0) or (max(mapping) >= topology.num_cores):
+        raise ValueError
+    mapping = np.asarray(mapping)
+    sources, dests, weights = application.edges()
+    weights = np.asarray(weights, dtype=np.float64)
+    first_cores, second_cores = mapping[sources], mapping[dests]
+    instrumentation.count('distance_queries', len(weights))
+    distances = topology.get_distances(first_cores, second_cores)
+    hopbytes = weights * distances
+    values, positions = np.unique(distances, return_inverse=True)
+    volume = weights.sum()
+    metrics = {'hopbytes': hopbytes.sum(), 'volume': volume,
+               'average_distance': hopbytes.sum() / volume if volume > 0 else np.float64(0.),
+               'dilation': (np.bincount(sources, hopbytes, minlength=application.num_tasks) +
+                            np.bincount(dests, hopbytes, minlength=application.num_tasks)),
+               'histogram': (values, np.bincount(positions.ravel(), weights, minlength=len(values))),
+               'level_traffic': None, 'link_traffic': None, 'max_congestion': None}
+    if isinstance(topology, TopologyTree):
+        lca = topology.get_lca_levels(first_cores, second_cores)
+        metrics['level_traffic'] = np.bincount(lca, weights, minlength=topology.num_levels)
+        # An interaction crosses the links of the ancestors of both cores below their common ancestor
+        links = [np.zeros(1)]
+        for level in range(1, topology.num_levels):
+            ancestors = topology.get_core_ancestors(level)
+            crossing = lca < level
+            size = topology.get_level_size(level)
+            links.append(np.bincount(ancestors[first_cores[crossing]], weights[crossing], minlength=size) +
+                         np.bincount(ancestors[second_cores[crossing]], weights[crossing], minlength=size))
+        metrics['link_traffic'] = links
+        metrics['max_congestion'] = max(np.max(traffic, initial=0.) for traffic in links)
+    return metrics
+
+
+def compute_core_loads(application, topology, mapping):
+    """Computes the total load of the tasks mapped to each core
+
+    Parameters
+    ----------
+    application : ApplicationGraph object
+        Application's communication graph (with the loads of its tasks)
+    topology : Topology object
+        Machine topology graph
+    mapping : list of int
+        Mapping of tasks to cores
+
+    Returns
+    -------
+    np.ndarray
+        Load of each core
+    """
+    return np.bincount(mapping, weights=application.loads, minlength=topology.num_cores)
+
+
+def compute_load_imbalance(application, topology, mapping):
+    """Computes how much the most loaded core exceeds a perfectly balanced load
+
+    The load of each core is divided by its capacity, and the largest one is
+    compared with the best achievable: the total load divided by the total
+    capacity, or the heaviest task on the largest core if that is larger.
+
+    Parameters
+    ----------
+    application : ApplicationGraph object
+        Application's communication graph (with the loads of its tasks)
+    topology : Topology object
+        Machine topology graph (with the capacities of its cores)
+    mapping : list of int
+        Mapping of tasks to cores
+
+    Returns
+    -------
+    numpy.float64
+        Relative excess of the most loaded core (zero when balanced)
+
+    Raises
+    ------
+    ValueError
+        If the size of the mapping does not match the number of tasks in the application,
+        or any tasks are mapped to cores that do not exist.
+    """
+    if len(mapping) != application.num_tasks:
+        raise ValueError
+    if (min(mapping) < 0) or (max(mapping) >= topology.num_cores):
+        raise ValueError
+    loads = application.loads
+    capacities = topology.capacities
+    core_loads = compute_core_loads(application, topology, mapping)
+    if core_loads[capacities == 0].any():
+        return np.inf
+    relative = np.divide(core_loads, capacities, out=np.zeros(len(capacities)), where=capacities > 0)
+    best = max(loads.sum() / capacities.sum(), loads.max() / capacities.max())
+    if best == 0:
+        return np.float64(0.)
+    return relative.max() / best - 1
+
+
+def compute_objective(application, topology, mapping, penalty):
+    """Computes the hopbytes of a mapping plus a penalty for its load imbalance
+
+    Parameters
+    ----------
+    application : ApplicationGraph object
+        Application's communication graph
+    topology : Topology object
+        Machine topology graph
+    mapping : list of int
+        Mapping of tasks to cores
+    penalty : float
+        Cost added for each unit of load imbalance (see compute_load_imbalance)
+
+    Returns
+    -------
+    numpy.float64
+        Hopbytes plus the penalty times the load imbalance
+
+    Raises
+    ------
+    ValueError
+        If the size of the mapping does not match the number of tasks in the application,
+        or any tasks are mapped to cores that do not exist.
+    """
+    return (compute_hopbytes(application, topology, mapping) +
+            penalty * compute_load_imbalance(application, topology, mapping))
+
+
+class CoreLoads:
+    """Round-robin assignment of tasks to cores respecting their capacities
+
+    Assignment proceeds in rounds. In round r, a core accepts tasks while its
+    load is below r times its capacity times the mean task load, and the next
+    task goes to the current core if it still accepts tasks, or else to the
+    following core that does (next fit). Cores that stop accepting tasks leave
+    the queue of the round, so each assignment takes O(1) amortized time.
+    With one unit of load per task and of capacity per core, tasks are
+    simply distributed in round-robin.
+
+    Attributes
+    ----------
+    capacities : np.ndarray
+        Capacity of each core
+    loads : np.ndarray
+        Load assigned to each core so far
+    round : int
+        Current round
+
+    Raises
+    ------
+    ValueError
+        If the capacities are all zero
+    """
+    def __init__(self, capacities, total_load=None, num_tasks=None):
+        self.capacities = np.asarray(capacities, dtype=np.float64)
+        if self.capacities.max(initial=0) <= 0:
+            print("* Tasks cannot be assigned to cores without capacity.")
+            raise ValueError
+        self.loads = np.zeros(len(self.capacities))
+        # Load accepted per unit of capacity in each round
+        self.quantum = 1.
+        if total_load is not None and num_tasks and total_load > 0:
+            self.quantum = total_load / num_tasks
+        self.round = 1
+        self._limits = self.capacities * self.quantum
+        self._queue = deque(range(len(self.capacities)))
+
+    @staticmethod
+    def for_mapping(application, topology):
+        """Creates the tracker for mapping an application on a topology
+
+        Parameters
+        ----------
+        application : ApplicationGraph object
+            Application's communication graph (with the loads of its tasks)
+        topology : Topology object
+            Machine topology graph (with the capacities of its cores)
+
+        Returns
+        -------
+        CoreLoads object
+            Tracker with no load assigned
+        """
+        return CoreLoads(topology.capacities, application.loads.sum(), application.num_tasks)
+
+    def _next_round(self):
+        """Starts the first round in which some core accepts tasks again"""
+        usable = self.capacities > 0
+        # Rounds in which no core accepts tasks are skipped
+        filled = np.floor(self.loads[usable] / self._limits[usable]).min()
+        self.round = max(self.round + 1, int(filled) + 1)
+        self._queue = deque(np.flatnonzero(usable & (self.loads < self.round * self._limits)).tolist())
+
+    def assign(self, load=1.):
+        """Assigns a task to the next core accepting tasks
+
+        Parameters
+        ----------
+        load : float, optional
+            Load of the task
+
+        Returns
+        -------
+        int
+            Identifier of the core
+        """
+        while True:
+            while self._queue:
+                core = self._queue[0]
+                limit = self.round * self._limits[core]
+                if self.loads[core] < limit:
+                    self.loads[core] += load
+                    if self.loads[core] >= limit:
+                        self._queue.popleft()
+                    return core
+                self._queue.popleft()
+            self._next_round()
+
+
+class HopBytesEvaluator:
+    """Incremental evaluation of the hopbytes of a mapping under task swaps and moves
+
+    The change in hopbytes of a move or swap is computed from the interactions
+    of the affected tasks only (O(num_tasks) for dense graphs, O(degree) for
+    sparse ones), and the total is updated when changes are applied.
+    Optionally, the cost of migrating tasks away from an original mapping
+    is added to the total: moving a task costs its migration cost for each
+    hop between its original core and its new core.
+
+    Attributes
+    ----------
+    application : ApplicationGraph object
+        Application's communication graph
+    topology : Topology object
+        Machine topology graph
+    mapping : np.ndarray
+        Current mapping of tasks to cores
+    total : numpy.float64
+        Hopbytes of the current mapping, plus its migration cost
+    migration : numpy.float64
+        Migration cost of the current mapping (zero without an origin)
+    origin : np.ndarray or None
+        Original mapping of tasks to cores
+    migration_cost : np.ndarray or None
+        Cost per hop of migrating each task
+
+    Raises
+    ------
+    ValueError
+        If the mapping or the origin is invalid (see compute_hopbytes)
+    """
+    def __init__(self, application, topology, mapping, origin=None, migration_cost=None):
+        self.application = application
+        self.topology = topology
+        self.total = compute_hopbytes(application, topology, mapping)
+        self.mapping = np.array(mapping)
+        self._distances = topology.get_distances
+        if isinstance(topology, TopologyTree) and topology.num_cores ** 2 <= DENSE_DISTANCES:
+            # Distances in small trees are gathered once, instead of from the ancestors of each pair
+            cores = np.arange(topology.num_cores)
+            self._matrix = topology.get_distances(cores[:, None], cores)
+            self._distances = self._gather
+        self.origin = None
+        self.migration_cost = None
+        self.migration = 0.
+        if origin is not None:
+            if len(origin) != application.num_tasks:
+                raise ValueError
+            if (min(origin) < 0) or (max(origin) >= topology.num_cores):
+                raise ValueError
+            self.origin = np.array(origin)
+            self.migration_cost = np.broadcast_to(
+                np.asarray(1. if migration_cost is None else migration_cost, dtype=float),
+                (application.num_tasks,))
+            self.migration = np.dot(self.migration_cost,
+                                    self._distances(self.origin, self.mapping))
+            self.total += self.migration
+        self._symmetric = topology.is_symmetric()
+        # Weights of each pair of tasks, stored in both directions
+        if isinstance(application, PackedApplicationGraph):
+            # Rows are extracted from the packed triangle when needed
+            self._weights = None
+            self._tasks = np.arange(application.num_tasks)
+        elif isinstance(application, SparseApplicationGraph):
+            sources, dests, weights = application.edges()
+            self._weights = SparseApplicationGraph.from_edges(
+                np.concatenate([sources, dests]), np.concatenate([dests, sources]),
+                np.concatenate([weights, weights]), application.num_tasks)
+            self._tasks = None
+        else:
+            weights = np.triu(application.affinity, 1)
+            self._weights = weights + weights.T
+            self._tasks = np.arange(application.num_tasks)
+
+    def _gather(self, first_cores, second_cores):
+        """Distances between pairs of cores of a small tree, from its matrix"""
+        return self._matrix[first_cores, second_cores]
+
+    def _neighborhood(self, task):
+        """Returns the tasks interacting with a task and the weights of the interactions"""
+        if self._tasks is None:
+            start, end = self._weights.indptr[task], self._weights.indptr[task + 1]
+            return self._weights.indices[start:end], self._weights.data[start:end]
+        if self._weights is None:
+            weights = self.application.get_affinities(task)
+            weights[task] = 0
+            return self._tasks, weights
+        return self._tasks, self._weights[task]
+
+    def _neighborhoods(self, tasks):
+        """Returns the interactions of several tasks at once
+
+        Returns the position in tasks of the task of each interaction, the
+        other task and the weight of the interaction.
+        """
+        if self._tasks is None:
+            starts = self._weights.indptr[tasks]
+            lengths = self._weights.indptr[tasks + 1] - starts
+            owners = np.repeat(np.arange(len(tasks)), lengths)
+            positions = np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+            return owners, self._weights.indices[positions], self._weights.data[positions]
+        if self._weights is None:
+            weights = self.application.get_affinities(tasks)
+            weights[np.arange(len(tasks)), tasks] = 0
+        else:
+            weights = self._weights[tasks]
+        return (np.repeat(np.arange(len(tasks)), len(self._tasks)), np.tile(self._tasks, len(tasks)),
+                weights.ravel())
+
+    def _pair_weights(self, task, others):
+        """Weights of the interactions between a task and other tasks"""
+        if self._tasks is None:
+            return self._weights.get_affinity(task, others)
+        if self._weights is None:
+            return self.application.get_affinity(task, others)
+        return self._weights[task, others]
+
+    def _pair_distances(self, task, cores, others):
+        """Distances between a task placed on each of some cores and other tasks
+
+        Each pair is measured from the core of its lowest task, as in
+        compute_hopbytes. Returns one row of distances per core.
+        """
+        cores = np.asarray(cores)[:, None]
+        placed = self.mapping[others]
+        if self._symmetric:
+            return self._distances(cores, placed)
+        return np.where(others > task, self._distances(cores, placed), self._distances(placed, cores))
+
+    def _check_core(self, core):
+        if (core < 0) or (core >= self.topology.num_cores):
+            print(f"* Requiring core {core} when only {self.topology.num_cores} cores are available")
+            raise ValueError
+
+    def task_costs(self):
+        """Computes the hopbytes of the interactions of each task
+
+        Returns
+        -------
+        np.ndarray
+            Sum, over the interactions of each task, of their weight times
+            the distance between the cores of their tasks
+        """
+        tasks = np.arange(self.application.num_tasks)
+        owners, others, weights = self._neighborhoods(tasks)
+        first, second = self.mapping[tasks[owners]], self.mapping[others]
+        distances = self._distances(first, second)
+        if not self._symmetric:
+            distances = np.where(others > owners, distances, self._distances(second, first))
+        return np.bincount(owners, weights * distances, minlength=len(tasks))
+
+    def delta_move(self, task, core):
+        """Computes the change in the total of moving a task to a core
+
+        Parameters
+        ----------
+        task : int
+            Identifier of the task
+        core : int
+            Identifier of the destination core
+
+        Returns
+        -------
+        numpy.float64
+            Total after the move minus total before it
+
+        Raises
+        ------
+        ValueError
+            If the core does not exist
+        """
+        self._check_core(core)
+        others, weights = self._neighborhood(task)
+        old, new = self._pair_distances(task, [self.mapping[task], core], others) @ weights
+        instrumentation.count('evaluator.moves_evaluated')
+        instrumentation.count('distance_queries', 2 * len(others))
+        return new - old + self._delta_migration(task, core)
+
+    def delta_moves(self, task, cores):
+        """Computes the changes in the total of moving a task to each of several cores
+
+        The distances of all the moves are gathered at once, so this is
+        faster than calling delta_move for each core.
+
+        Parameters
+        ----------
+        task : int
+            Identifier of the task
+        cores : list of int or np.ndarray
+            Identifiers of the destination cores
+
+        Returns
+        -------
+        np.ndarray
+            Total after each move minus total before it
+
+        Raises
+        ------
+        ValueError
+            If a core does not exist
+        """
+        cores = np.asarray(cores, dtype=np.int64)
+        if len(cores) == 0:
+            return np.zeros(0)
+        self._check_core(cores.min())
+        self._check_core(cores.max())
+        others, weights = self._neighborhood(task)
+        totals = self._pair_distances(task, np.concatenate([[self.mapping[task]], cores]), others) @ weights
+        instrumentation.count('evaluator.moves_evaluated', len(cores))
+        instrumentation.count('distance_queries', (len(cores) + 1) * len(others))
+        return totals[1:] - totals[0] + self._delta_migration(task, cores)
+
+    def _delta_migration(self, task, core):
+        """Change in migration cost of moving a task to a core"""
+        if self.origin is None:
+            return 0.
+        origin = self.origin[task]
+        return self.migration_cost[task] * (self._distances(origin, core) -
+                                            self._distances(origin, self.mapping[task]))
+
+    def delta_swap(self, first_task, second_task):
+        """Computes the change in the total of swapping the cores of two tasks
+
+        Parameters
+        ----------
+        first_task : int
+            Identifier of a task
+        second_task : int
+            Identifier of a task
+
+        Returns
+        -------
+        numpy.float64
+            Total after the swap minus total before it
+        """
+        first_core = self.mapping[first_task]
+        second_core = self.mapping[second_task]
+        if first_core == second_core:
+            return 0.
+        delta = (self.delta_move(first_task, second_core) +
+                 self.delta_move(second_task, first_core))
+        # Both moves assumed the other task stayed in place, so their interaction is corrected
+        low, high = min(first_task, second_task), max(first_task, second_task)
+        weight = self.application.get_affinity(low, high)
+        if weight != 0:
+            pairs = self._distances([second_core, first_core, first_core, second_core],
+                                    [first_core, second_core, first_core, second_core])
+            delta += weight * (pairs[0] + pairs[1] - pairs[2] - pairs[3])
+        return delta
+
+    def delta_swaps(self, task, others):
+        """Computes the changes in the total of swapping the core of a task with
+        the cores of each of several tasks
+
+        Parameters
+        ----------
+        task : int
+            Identifier of a task
+        others : list of int or np.ndarray
+            Identifiers of the tasks swapped with it
+
+        Returns
+        -------
+        np.ndarray
+            Total after each swap minus total before it
+        """
+        others = np.asarray(others, dtype=np.int64)
+        if len(others) == 0:
+            return np.zeros(0)
+        source = self.mapping[task]
+        cores = self.mapping[others]
+        distances = self._distances
+        # The task moves to the core of each other task
+        delta = self.delta_moves(task, cores)
+        # Each other task moves to the core of the task
+        owners, neighbors, weights = self._neighborhoods(others)
+        placed = self.mapping[neighbors]
+        current = cores[owners]
+        if self._symmetric:
+            change = distances(source, placed) - distances(current, placed)
+        else:
+            forward = neighbors > others[owners]
+            change = (np.where(forward, distances(source, placed), distances(placed, source)) -
+                      np.where(forward, distances(current, placed), distances(placed, current)))
+        delta = delta + np.bincount(owners, weights * change, minlength=len(others))
+        if self.origin is not None:
+            origins = self.origin[others]
+            delta += self.migration_cost[others] * (distances(origins, source) - distances(origins, cores))
+        instrumentation.count('evaluator.moves_evaluated', len(others))
+        instrumentation.count('distance_queries', 2 * len(neighbors))
+        # Both moves assumed the other task stayed in place, so their interaction is corrected
+        delta += self._pair_weights(task, others) * (distances(cores, source) + distances(source, cores) -
+                                                     distances(source, source) - distances(cores, cores))
+        delta[cores == source] = 0.
+        return delta
+
+    def apply_move(self, task, core):
+        """Moves a task to a core, updating the total
+
+        Parameters
+        ----------
+        task : int
+            Identifier of the task
+        core : int
+            Identifier of the destination core
+
+        Returns
+        -------
+        numpy.float64
+            Change in the total
+        """
+        delta = self.delta_move(task, core)
+        self.migration += self._delta_migration(task, core)
+        self.mapping[task] = core
+        self.total += delta
+        return delta
+
+    def apply_swap(self, first_task, second_task):
+        """Swaps the cores of two tasks, updating the total
+
+        Parameters
+        ----------
+        first_task : int
+            Identifier of a task
+        second_task : int
+            Identifier of a task
+
+        Returns
+        -------
+        numpy.float64
+            Change in the total
+        """
+        delta = self.delta_swap(first_task, second_task)
+        first_core, second_core = self.mapping[first_task], self.mapping[second_task]
+        self.migration += (self._delta_migration(first_task, second_core) +
+                           self._delta_migration(second_task, first_core))
+        self.mapping[first_task], self.mapping[second_task] = second_core, first_core
+        self.total += delta
+        return delta
@@ -0,0 +1,203 @@
+"""Module containing generators of synthetic application graphs and topologies.
+
+The generators produce communication patterns of any size, e.g. to
+measure how schedulers scale:
+- stencil: tasks on a regular grid exchanging halos with their neighbors
+- all_to_all: every pair of tasks communicates (dense)
+- random_sparse: each task communicates with a few random tasks
+- maplib_like: irregular patterns resembling the matrices of real
+  applications found in mapping libraries, mixing a halo exchange with
+  uneven volumes, communication with a root task and sparse long-range noise
+It also generates the distances of mesh and torus networks.
+"""
+
+import numpy as np
+from simulator.application import ApplicationGraph, SparseApplicationGraph
+from simulator.topology import Topology
+
+
+def _grid_neighbors(shape, periodic):
+    """Pairs of neighbor positions (by flat index) on a grid, one pair per link"""
+    positions = np.arange(int(np.prod(shape))).reshape(shape)
+    sources, dests, axes = [], [], []
+    for axis, size in enumerate(shape):
+        if size < 2:
+            continue
+        shifted = np.roll(positions, -1, axis=axis)
+        first, second = positions, shifted
+        if not periodic or size == 2:
+            # Drops the links wrapping around the grid
+            first = np.take(positions, range(size - 1), axis=axis)
+            second = np.take(shifted, range(size - 1), axis=axis)
+        sources.append(first.ravel())
+        dests.append(second.ravel())
+        axes.append(np.full(first.size, axis))
+    if not sources:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(sources), np.concatenate(dests), np.concatenate(axes)
+
+
+def _symmetric_graph(sources, dests, volumes, num_tasks):
+    """Sparse application graph with each interaction in both directions"""
+    return SparseApplicationGraph.from_edges(np.concatenate([sources, dests]),
+                                             np.concatenate([dests, sources]),
+                                             np.concatenate([volumes, volumes]), num_tasks)
+
+
+def stencil(shape, volume=1., periodic=False):
+    """Generates the communication of tasks exchanging halos on a regular grid
+
+    Parameters
+    ----------
+    shape : list of int
+        Number of tasks along each dimension of the grid (e.g. [8, 8] for
+        a 2D stencil with 64 tasks)
+    volume : float, optional
+        Affinity between neighbor tasks
+    periodic : bool, optional
+        If True, the grid wraps around (tasks on the borders are neighbors)
+
+    Returns
+    -------
+    SparseApplicationGraph object
+        Communication graph of the stencil
+    """
+    sources, dests, _ = _grid_neighbors(tuple(shape), periodic)
+    return _symmetric_graph(sources, dests, np.full(len(sources), float(volume)),
+                            int(np.prod(shape)))
+
+
+def all_to_all(num_tasks, volume=1.):
+    """Generates the communication of tasks all exchanging the same volume
+
+    Parameters
+    ----------
+    num_tasks : int
+        Number of tasks
+    volume : float, optional
+        Affinity between each pair of tasks
+
+    Returns
+    -------
+    ApplicationGraph object
+        Dense communication graph
+    """
+    affinity = np.full((num_tasks, num_tasks), float(volume))
+    np.fill_diagonal(affinity, 0)
+    return ApplicationGraph.from_matrix(affinity)
+
+
+def random_sparse(num_tasks, degree=4, max_volume=100, seed=None):
+    """Generates the communication of tasks talking to a few random tasks
+
+    Parameters
+    ----------
+    num_tasks : int
+        Number of tasks
+    degree : int, optional
+        Number of random partners chosen by each task (tasks also receive
+        communication from the tasks choosing them)
+    max_volume : int, optional
+        Largest affinity between two tasks (volumes are uniform integers)
+    seed : int, optional
+        Seed for the random choices
+
+    Returns
+    -------
+    SparseApplicationGraph object
+        Communication graph
+    """
+    generator = np.random.default_rng(seed)
+    sources = np.repeat(np.arange(num_tasks), degree)
+    dests = generator.integers(0, num_tasks, size=len(sources))
+    volumes = generator.integers(1, max_volume + 1, size=len(sources)).astype(float)
+    distinct = sources != dests
+    return _symmetric_graph(sources[distinct], dests[distinct], volumes[distinct], num_tasks)
+
+
+def maplib_like(num_tasks, seed=None, root_volume=0.05, noise=0.01):
+    """Generates an irregular communication pattern resembling real applications
+
+    Tasks are laid out on a 3D grid as balanced as possible and exchange
+    halos whose volume depends on the direction (as for non-cubic
+    subdomains), with variations per task. Task 0 acts as the root of
+    collective operations, and a few random pairs exchange small volumes.
+
+    Parameters
+    ----------
+    num_tasks : int
+        Number of tasks
+    seed : int, optional
+        Seed for the random choices
+    root_volume : float, optional
+        Volume exchanged with the root, relative to the mean halo volume
+    noise : float, optional
+        Number of random long-range interactions per task, relative to the
+        number of tasks
+
+    Returns
+    -------
+    SparseApplicationGraph object
+        Communication graph
+    """
+    generator = np.random.default_rng(seed)
+    # Most balanced 3D grid with exactly num_tasks positions
+    shape = [1, 1, 1]
+    for factor in _prime_factors(num_tasks)[::-1]:
+        shape[int(np.argmin(shape))] *= factor
+    sources, dests, axes = _grid_neighbors(tuple(shape), periodic=True)
+    # Halo volumes per direction, with up to 50% variation per link
+    directions = generator.uniform(100, 1000, size=3)
+    volumes = directions[axes] * generator.uniform(0.5, 1.5, size=len(sources))
+    mean = volumes.mean() if len(volumes) > 0 else 1.
+    # Collective operations rooted at task 0
+    others = np.arange(1, num_tasks)
+    # Long-range noise
+    count = int(noise * num_tasks * num_tasks)
+    first = generator.integers(0, num_tasks, size=count)
+    second = generator.integers(0, num_tasks, size=count)
+    distinct = first != second
+    sources = np.concatenate([sources, np.zeros(len(others), dtype=np.int64), first[distinct]])
+    dests = np.concatenate([dests, others, second[distinct]])
+    volumes = np.concatenate([volumes, np.full(len(others), root_volume * mean),
+                              generator.uniform(0, 0.1 * mean, size=np.count_nonzero(distinct))])
+    return _symmetric_graph(sources, dests, volumes, num_tasks)
+
+
+def _prime_factors(number):
+    """Prime factors of a number, in increasing order"""
+    factors = []
+    divisor = 2
+    while divisor * divisor <= number:
+        while number % divisor == 0:
+            factors.append(divisor)
+            number //= divisor
+        divisor += 1
+    if number > 1:
+        factors.append(number)
+    return factors
+
+
+def mesh(shape, periodic=False):
+    """Generates the distances between the cores of a mesh or torus network
+
+    Parameters
+    ----------
+    shape : list of int
+        Number of cores along each dimension
+    periodic : bool, optional
+        If True, the network is a torus (links wrap around)
+
+    Returns
+    -------
+    Topology object
+        Topology with the number of hops between each pair of cores
+    """
+    coordinates = np.indices(shape).reshape(len(shape), -1)
+    distances = np.zeros((coordinates.shape[1], coordinates.shape[1]), dtype=np.int64)
+    for axis, size in enumerate(shape):
+        difference = np.abs(coordinates[axis][:, None] - coordinates[axis][None, :])
+        if periodic:
+            difference = np.minimum(difference, size - difference)
+        distances += difference
+    return Topology(distances)
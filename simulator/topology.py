@@ -1,8 +1,15 @@
 """Module containing a representation of the machine topology graph."""
 
+import os
+
 import numpy as np
-from operator import mul
-from functools import reduce
+from simulator.loaders import read_matrix, read_packed_matrix
+from simulator.packing import (packed_index, packed_order, pack_matrix, unpack_matrix,
+                               is_symmetric, widen)
+from simulator.storage import file_hash, save_arrays, load_arrays, stored_hash
+
+# Largest number of pairs of cores whose ancestors are compared at all levels at once
+LCA_PAIRS = 1 << 12
 
 
 class Topology:
@@ -14,14 +21,20 @@ class Topology:
         Number of cores in the machine topology
     distances : np.ndarray
         Matrix representing the distance between cores
+    capacities : np.ndarray
+        Compute capacity of each core (one per core unless set)
 
     Raises
     ------
     ValueError
         If the matrix contains NaN, negative values, or it is not square
     """
-    def __init__(self, distances):
-        self.distances = np.array(distances)
+    def __init__(self, distances, check=True):
+        self.distances = np.asanyarray(distances)
+        self.num_cores = self.distances.shape[0]
+        self._capacities = None
+        if not check:
+            return
         # Integrity check
         if np.isnan(self.distances).any():
             print("* The distances matrix contains NaN values.")
@@ -32,7 +45,41 @@ class Topology:
         if self.distances.shape[0] != self.distances.shape[1]:
             print("* The distances matrix is not square.")
             raise ValueError
-        self.num_cores = self.distances.shape[0]
+
+    @property
+    def capacities(self):
+        """Compute capacity of each core
+
+        Returns
+        -------
+        np.ndarray
+            Capacity of each core (one per core unless set)
+        """
+        if self._capacities is None:
+            return np.ones(self.num_cores)
+        return self._capacities
+
+    @capacities.setter
+    def capacities(self, capacities):
+        """Sets the compute capacity of each core (None restores the default)
+
+        Raises
+        ------
+        ValueError
+            If there is not one capacity per core, capacities are NaN or
+            negative, or they are all zero
+        """
+        if capacities is None:
+            self._capacities = None
+            return
+        capacities = np.asanyarray(capacities)
+        if capacities.shape != (self.num_cores,):
+            print(f"* There are {len(capacities)} core capacities for {self.num_cores} cores.")
+            raise ValueError
+        if np.isnan(capacities).any() or np.min(capacities) < 0 or np.max(capacities) == 0:
+            print("* The core capacities contain NaN or negative values, or are all zero.")
+            raise ValueError
+        self._capacities = capacities
 
     def get_hops_between_cores(self, first_core, second_core):
         """Computes the distance in number of hops between two cores
@@ -60,24 +107,125 @@ class Topology:
             print(f"* Requiring distances for cores {first_core} and {second_core} when only {self.num_cores} cores are available")
             raise ValueError
 
+    def get_distances(self, first_cores, second_cores):
+        """Gathers the distances between many pairs of cores at once
+
+        Consumers of distances should use this method instead of indexing
+        the matrix, so that topologies without a full matrix (e.g.
+        PackedTopology) can be used.
+
+        Parameters
+        ----------
+        first_cores : int or np.ndarray
+            Identifier(s) of cores
+        second_cores : int or np.ndarray
+            Identifier(s) of cores (broadcast with the first cores)
+
+        Returns
+        -------
+        np.ndarray
+            Distance between each pair of cores
+        """
+        return self.distances[first_cores, second_cores]
+
+    def is_symmetric(self):
+        """Returns True if the distance from a to b is always the distance from b to a"""
+        return is_symmetric(self.distances)
+
     @staticmethod
-    def from_csv(csv_file):
+    def from_csv(csv_file, dtype=np.float64):
         """Reads a machine topology matrix from a CSV file
 
         Parameters
         ----------
         csv_file : string
             File containing the matrix of distances between cores
+        dtype : numpy dtype, optional
+            Type of the distance values
 
         Returns
         -------
         Topology object
             Machine topology read from file
         """
-        distances = np.genfromtxt(csv_file, delimiter=',')
+        distances = read_matrix(csv_file, dtype=dtype, description='distances matrix')
         topology = Topology(distances)
         return topology
 
+    def save(self, path, source_hash=None):
+        """Writes the matrix of distances to a binary file
+
+        Parameters
+        ----------
+        path : string
+            Destination file
+        source_hash : string, optional
+            Hash of the file the topology was read from
+        """
+        arrays = {'distances': self.distances}
+        if self._capacities is not None:
+            arrays['capacities'] = self._capacities
+        save_arrays(path, 'topology', arrays, source_hash)
+
+    @staticmethod
+    def load(path):
+        """Opens a machine topology from a binary file
+
+        The matrix of distances is memory-mapped (read-only) instead of read.
+
+        Parameters
+        ----------
+        path : string
+            Binary file written by save
+
+        Returns
+        -------
+        Topology or PackedTopology object
+            Machine topology stored in the file
+        """
+        kind, arrays, source_hash = load_arrays(path)
+        if kind == 'topology':
+            topology = Topology(arrays['distances'], check=False)
+        elif kind == 'packed_topology':
+            topology = PackedTopology(arrays['packed'], packed_order(len(arrays['packed'])), check=False)
+        else:
+            print(f"* The file {path} contains a {kind} instead of a topology.")
+            raise ValueError
+        topology.capacities = arrays.get('capacities')
+        return topology
+
+    @staticmethod
+    def from_cached_csv(csv_file, cache_file=None, dtype=np.float64):
+        """Reads a machine topology from a CSV file through a binary cache
+
+        The cache is rebuilt when it is missing or was built from a different
+        version of the CSV file.
+
+        Parameters
+        ----------
+        csv_file : string
+            File containing the matrix of distances between cores
+        cache_file : string, optional
+            Binary file used as cache. Default: the CSV file name with a '.bin' suffix
+        dtype : numpy dtype, optional
+            Type of the distance values
+
+        Returns
+        -------
+        Topology object
+            Machine topology (memory-mapped from the cache)
+        """
+        if cache_file is None:
+            cache_file = csv_file + '.bin'
+        source_hash = file_hash(csv_file)
+        if stored_hash(cache_file) != source_hash:
+            topology = Topology.from_csv(csv_file, dtype)
+            # Writes to a temporary file first so concurrent readers never see partial caches
+            temporary = f'{cache_file}.{os.getpid()}.tmp'
+            topology.save(temporary, source_hash)
+            os.replace(temporary, cache_file)
+        return Topology.load(cache_file)
+
 
 class TopologyTree(Topology):
     """Machine topology represented as a tree.
@@ -88,18 +236,32 @@ class TopologyTree(Topology):
         Number of cores in the machine topology
     num_levels : int
         Number of levels in the tree. Minimum = 2 (root and cores)
-    arity : list of int
-        Arity (number of children) for nodes at each level of the tree
+    arity : list of int or list of list of int
+        Arity (number of children) for nodes at each level of the tree.
+        The arity of a level can also be a list with the number of children
+        of each of its nodes, for trees whose nodes are not all alike
+    weights : list of int or float
+        Cost of the links between the nodes of each level and their parents
+        (level 1 first). Default: one per link, so distances count hops
     parents : list of list of int
         Index of the parents of nodes at each level of the tree (except the root)
+    distances : np.ndarray
+        Matrix representing the distance between cores (built on first use)
+
+    Raises
+    ------
+    ValueError
+        If the arity of a level does not match its number of nodes, or the
+        weights do not match the number of levels
 
     Notes
     -----
     Level 0 in the tree represents the root, while level 'num_levels - 1'
-    represents the cores.
+    represents the cores. The children of each node are contiguous in the
+    level below. The distance between two cores is the cost of the links
+    from both cores up to their lowest common ancestor.
     """
-    def __init__(self, arity):
-        self.num_cores = reduce(mul, arity)
+    def __init__(self, arity, weights=None):
         self.num_levels = len(arity) + 1
         self.arity = arity
         # Starts the list of parents by creating empty levels
@@ -108,11 +270,150 @@ class TopologyTree(Topology):
         parents[0].append(0)
         # Iterates creating the parent lists for the next levels
         for level in range(1, self.num_levels):
+            counts = arity[level-1]
+            if np.ndim(counts) == 0:
+                counts = [counts] * len(parents[level - 1])
+            elif len(counts) != len(parents[level - 1]):
+                print(f"* The arity of level {level-1} has {len(counts)} values for {len(parents[level - 1])} nodes.")
+                raise ValueError
             # For all possible parents of this level
             for parent in range(len(parents[level - 1])):
                 # Adds the nodes pointing to said parent
-                parents[level].extend([parent] * arity[level-1])
+                parents[level].extend([parent] * counts[parent])
         self.parents = parents
+        self.num_cores = len(parents[-1])
+        if weights is None:
+            weights = [1] * len(arity)
+        elif len(weights) != len(arity):
+            print(f"* The tree has {len(arity)} levels of links but {len(weights)} weights.")
+            raise ValueError
+        self.weights = weights
+        # Distance between two cores for each level of their lowest common ancestor
+        costs = np.zeros(self.num_levels, dtype=np.result_type(np.int32, *weights))
+        costs[:-1] = 2 * np.cumsum(weights[::-1])[::-1]
+        self._lca_costs = costs
+        self._capacities = None
+        # Tables of ancestors and distances between cores are built on first use
+        self._ancestors = None
+        self._ancestor_table = None
+        self._distances = None
+
+    def __getstate__(self):
+        """Leaves the cached tables out of copies sent to other processes"""
+        state = self.__dict__.copy()
+        state['_ancestors'] = None
+        state['_ancestor_table'] = None
+        state['_distances'] = None
+        return state
+
+    @property
+    def distances(self):
+        """Matrix of distances between all pairs of cores
+
+        The matrix is computed from the level of the lowest common ancestor
+        of each pair of cores the first time it is required, and cached.
+        Looking up the distance of two cores is then O(1).
+
+        Returns
+        -------
+        np.ndarray
+            Matrix representing the distance between cores
+        """
+        if self._distances is None:
+            cores = np.arange(self.num_cores)
+            lca = self.get_lca_levels(cores[:, None], cores[None, :])
+            self._distances = self._lca_costs[lca]
+        return self._distances
+
+    def get_distances(self, first_cores, second_cores):
+        """Gathers the distances between many pairs of cores at once
+
+        The distances are computed from the levels of the lowest common
+        ancestors of the pairs, so the matrix of distances is not built
+        (it is only indexed if it was already built).
+
+        Parameters
+        ----------
+        first_cores : int or np.ndarray
+            Identifier(s) of cores
+        second_cores : int or np.ndarray
+            Identifier(s) of cores (broadcast with the first cores)
+
+        Returns
+        -------
+        np.ndarray
+            Distance between each pair of cores
+        """
+        if self._distances is not None:
+            return self._distances[first_cores, second_cores]
+        return self._lca_costs[self.get_lca_levels(first_cores, second_cores)]
+
+    def is_symmetric(self):
+        """Returns True, as distances in a tree are symmetric"""
+        return True
+
+    def get_core_ancestors(self, level):
+        """Returns the ancestor at a given level of the topology for every core
+
+        Parameters
+        ----------
+        level : int
+            Level in the machine topology
+
+        Returns
+        -------
+        np.ndarray
+            Identifier of the node at the given level that contains each core
+
+        Raises
+        ------
+        ValueError
+            If the level in the topology does not exist
+        """
+        if level >= self.num_levels:
+            print(f"* Requiring ancestors at level {level} when only {self.num_levels} are available")
+            raise ValueError
+        if self._ancestors is None:
+            # Follows the parents from the cores up to the root
+            ancestors = [None for i in range(self.num_levels)]
+            ancestors[-1] = np.arange(self.num_cores)
+            for lvl in range(self.num_levels - 1, 0, -1):
+                ancestors[lvl - 1] = np.asarray(self.parents[lvl])[ancestors[lvl]]
+            self._ancestors = ancestors
+            # Ancestors of each core below the root, to compare them in one step
+            self._ancestor_table = np.stack(ancestors[1:], axis=1)
+        return self._ancestors[level]
+
+    def get_lca_levels(self, first_cores, second_cores):
+        """Computes the level of the lowest common ancestor of pairs of cores
+
+        Parameters
+        ----------
+        first_cores : int or np.ndarray
+            Identifiers of cores
+        second_cores : int or np.ndarray
+            Identifiers of cores (broadcast against first_cores)
+
+        Returns
+        -------
+        np.ndarray
+            Level of the lowest common ancestor of each pair of cores
+        """
+        first_cores = np.asarray(first_cores)
+        second_cores = np.asarray(second_cores)
+        shape = np.broadcast_shapes(first_cores.shape, second_cores.shape)
+        # Ancestors stop being shared below the lowest common ancestor
+        if np.prod(shape) <= LCA_PAIRS:
+            # Few pairs: all the levels are compared at once
+            if self._ancestor_table is None:
+                self.get_core_ancestors(0)
+            table = self._ancestor_table
+            return (table[first_cores] == table[second_cores]).sum(axis=-1, dtype=np.int32)
+        lca = np.zeros(shape, dtype=np.int32)
+        for level in range(1, self.num_levels):
+            ancestors = self.get_core_ancestors(level)
+            lca += ancestors[first_cores] == ancestors[second_cores]
+        return lca
 
     def get_level_arity(self, level):
         """Returns the arity of a given level in the topology above the cores
@@ -124,8 +425,9 @@ class TopologyTree(Topology):
 
         Returns
         -------
-        int
-            Arity of the level
+        int or list of int
+            Arity of the level, or number of children of each of its nodes
+            if they differ
 
         Raises
         ------
@@ -133,7 +435,10 @@ class TopologyTree(Topology):
             If the level in the topology does not exist
         """
         if level < self.num_levels - 1:
-            return self.arity[level]
+            arity = self.arity[level]
+            if np.ndim(arity) == 0 or len(set(arity)) != 1:
+                return arity
+            return arity[0]
         else:
             print(f"* Requiring arity of level {level} when only {self.num_levels-1} is available")
             raise ValueError
@@ -187,7 +492,9 @@ class TopologyTree(Topology):
             raise ValueError
 
     def get_distance(self, first_node, second_node, level):
-        """Computes the distance in number of hops between two nodes in the tree
+        """Computes the distance between two nodes in the tree
+
+        The distance is the number of hops (edges) when links have unit weights.
 
         Parameters
         ----------
@@ -201,7 +508,7 @@ class TopologyTree(Topology):
         Returns
         -------
         int
-            Number of hops (edges) between the two nodes
+            Cost of the links between the two nodes
 
         Raises
         ------
@@ -214,7 +521,7 @@ class TopologyTree(Topology):
             else:
                 parent_first = self.parents[level][first_node]
                 parent_second = self.parents[level][second_node]
-                return 2 + self.get_distance(parent_first, parent_second, level - 1)
+                return 2 * self.weights[level - 1] + self.get_distance(parent_first, parent_second, level - 1)
         else:
             print(f"* Requiring distances at level {level} when only {self.num_levels} are available")
             raise ValueError
@@ -240,7 +547,192 @@ class TopologyTree(Topology):
             If a core is outside the range of cores in the topology
         """
         if (first_core < self.num_cores) and (second_core < self.num_cores):
-            return self.get_distance(first_core, second_core, self.num_levels - 1)
+            return self.get_distances(first_core, second_core)
+        else:
+            print(f"* Requiring distances for cores {first_core} and {second_core} when only {self.num_cores} cores are available")
+            raise ValueError
+
+
+class PackedTopology(Topology):
+    """Machine topology storing only the upper triangle of its matrix of distances
+
+    Distances are symmetric, so the upper triangle (with the diagonal) is
+    stored row by row with the narrowest exact type (see simulator.packing),
+    e.g. uint8 for numbers of hops: 16 times less memory than a full
+    float64 matrix. Distances are read with get_distances, which widens
+    them to int64 or float64 so that computations on them do not overflow.
+
+    Attributes
+    ----------
+    num_cores : int
+        Number of cores in the machine topology
+    packed : np.ndarray
+        Packed upper triangle of the matrix of distances
+    capacities : np.ndarray
+        Compute capacity of each core (one per core unless set)
+
+    Raises
+    ------
+    ValueError
+        If the packed values do not match the number of cores, or contain
+        NaN or negative values
+    """
+    def __init__(self, packed, num_cores, check=True):
+        """Creates the topology from its packed distances (integrity checks can be skipped)"""
+        self.packed = np.asanyarray(packed)
+        self.num_cores = num_cores
+        self._capacities = None
+        if not check:
+            return
+        # Integrity check
+        if self.packed.shape != (num_cores * (num_cores + 1) // 2,):
+            print(f"* The packed distances have {self.packed.size} values for {num_cores} cores.")
+            raise ValueError
+        if np.issubdtype(self.packed.dtype, np.floating) and np.isnan(self.packed).any():
+            print("* The distances matrix contains NaN values.")
+            raise ValueError
+        if self.packed.size > 0 and np.min(self.packed) < 0:
+            print("* The distances matrix contains negative values.")
+            raise ValueError
+
+    @staticmethod
+    def from_matrix(distances, dtype=None):
+        """Packs a symmetric matrix of distances
+
+        Parameters
+        ----------
+        distances : np.ndarray
+            Matrix representing the distance between cores
+        dtype : numpy dtype, optional
+            Type of the stored distances. Default: the narrowest exact type
+
+        Returns
+        -------
+        PackedTopology object
+            Machine topology with the packed distances
+
+        Raises
+        ------
+        ValueError
+            If the matrix contains NaN, negative values, or it is not square
+            or not symmetric
+        """
+        distances = Topology(distances).distances
+        if not is_symmetric(distances):
+            print("* The distances matrix is not symmetric.")
+            raise ValueError
+        return PackedTopology(pack_matrix(distances, dtype), len(distances))
+
+    @staticmethod
+    def from_topology(topology, dtype=None):
+        """Packs the distances of a topology, keeping its core capacities
+
+        Parameters
+        ----------
+        topology : Topology object
+            Machine topology graph with symmetric distances
+        dtype : numpy dtype, optional
+            Type of the stored distances. Default: the narrowest exact type
+
+        Returns
+        -------
+        PackedTopology object
+            Machine topology with the packed distances
+        """
+        packed = PackedTopology.from_matrix(topology.distances, dtype)
+        packed.capacities = topology._capacities
+        return packed
+
+    @staticmethod
+    def from_csv(csv_file, dtype=None):
+        """Reads a symmetric matrix of distances from a CSV file into packed form
+
+        The full matrix is never built.
+
+        Parameters
+        ----------
+        csv_file : string
+            File containing the matrix of distances between cores
+        dtype : numpy dtype, optional
+            Type of the stored distances. Default: the narrowest exact type
+
+        Returns
+        -------
+        PackedTopology object
+            Machine topology read from file
+        """
+        packed, num_cores = read_packed_matrix(csv_file, dtype=dtype, description='distances matrix')
+        return PackedTopology(packed, num_cores, check=False)
+
+    def save(self, path, source_hash=None):
+        """Writes the packed distances to a binary file
+
+        Parameters
+        ----------
+        path : string
+            Destination file
+        source_hash : string, optional
+            Hash of the file the topology was read from
+        """
+        arrays = {'packed': self.packed}
+        if self._capacities is not None:
+            arrays['capacities'] = self._capacities
+        save_arrays(path, 'packed_topology', arrays, source_hash)
+
+    @property
+    def distances(self):
+        """Full matrix of distances (materialized on every access)
+
+        Returns
+        -------
+        np.ndarray
+            Matrix representing the distance between cores
+        """
+        return unpack_matrix(self.packed, self.num_cores)
+
+    def get_distances(self, first_cores, second_cores):
+        """Gathers the distances between many pairs of cores at once
+
+        Parameters
+        ----------
+        first_cores : int or np.ndarray
+            Identifier(s) of cores
+        second_cores : int or np.ndarray
+            Identifier(s) of cores (broadcast with the first cores)
+
+        Returns
+        -------
+        np.ndarray
+            Distance between each pair of cores (as int64 or float64 values)
+        """
+        return widen(self.packed[packed_index(self.num_cores, first_cores, second_cores)])[()]
+
+    def is_symmetric(self):
+        """Returns True, as packed distances are symmetric"""
+        return True
+
+    def get_hops_between_cores(self, first_core, second_core):
+        """Computes the distance in number of hops between two cores
+
+        Parameters
+        ----------
+        first_core : int
+            Identifier of a core
+        second_core : int
+            Identifier of a core
+
+        Returns
+        -------
+        int
+            Number of hops (edges) between the two cores
+
+        Raises
+        ------
+        ValueError
+            If a core is outside the range of cores in the topology
+        """
+        if (first_core < self.num_cores) and (second_core < self.num_cores):
+            return self.get_distances(first_core, second_core)
         else:
             print(f"* Requiring distances for cores {first_core} and {second_core} when only {self.num_cores} cores are available")
             raise ValueError
@@ -0,0 +1,278 @@
+"""Module containing a streaming builder of application graphs from message traces.
+
+A trace is a sequence of (source, destination, bytes, timestamp) records,
+as collected by MPI profilers. The records are consumed in batches and
+accumulated into the affinity of each pair of tasks, so the memory used
+depends on the number of communicating pairs and not on the length of the
+trace. Graphs can be taken at any point, e.g. to start mapping before the
+whole trace is read.
+
+The accumulation can be limited to tumbling time windows (the affinity is
+reset each time a record enters a new window), and old records can lose
+weight with an exponential decay.
+"""
+
+from itertools import islice
+
+import numpy as np
+from simulator.application import ApplicationGraph, SparseApplicationGraph
+from simulator.loaders import CHUNK_ROWS, read_chunks
+
+
+class TraceAccumulator:
+    """Accumulator of the communication between tasks found in a trace
+
+    The affinity between two tasks is the sum of the bytes they exchanged,
+    in either direction. Messages from a task to itself are ignored.
+
+    Attributes
+    ----------
+    num_tasks : int or None
+        Number of tasks in the application. If None (only for sparse
+        accumulation), it is inferred from the largest task identifier seen
+    sparse : bool
+        If True, only the communicating pairs are stored, and snapshots are
+        SparseApplicationGraph objects. Otherwise, a dense matrix is used
+    window : float or None
+        Length of the tumbling time windows
+    half_life : float or None
+        Time after which the weight of a record is halved
+    time : float
+        Latest timestamp seen
+    records : int
+        Number of records consumed
+    dropped : int
+        Number of records ignored because they belong to past windows
+
+    Raises
+    ------
+    ValueError
+        If the number of tasks is missing for dense accumulation, or the
+        window or half-life are not positive
+    """
+    def __init__(self, num_tasks=None, sparse=True, window=None, half_life=None,
+                 dtype=np.float64, buffer_size=1 << 20):
+        if num_tasks is None and not sparse:
+            print("* Dense accumulation requires the number of tasks.")
+            raise ValueError
+        if (window is not None and window <= 0) or (half_life is not None and half_life <= 0):
+            print("* The window and half-life of a trace must be positive.")
+            raise ValueError
+        self.num_tasks = num_tasks
+        self.sparse = sparse
+        self.window = window
+        self.half_life = half_life
+        self.dtype = dtype
+        self.buffer_size = buffer_size
+        self.time = -np.inf
+        self.records = 0
+        self.dropped = 0
+        self._largest = -1
+        self._current_window = None
+        self._reset()
+
+    def _reset(self):
+        """Clears the accumulated affinity"""
+        if self.sparse:
+            # Sorted keys (low task * 2^32 + high task) of the pairs and their affinity
+            self._keys = np.zeros(0, dtype=np.int64)
+            self._values = np.zeros(0, dtype=self.dtype)
+            self._pending = []
+            self._pending_size = 0
+        else:
+            # Only the upper triangle is filled
+            self._matrix = np.zeros((self.num_tasks, self.num_tasks), dtype=self.dtype)
+
+    def _merge(self):
+        """Merges the pending records into the sorted pairs"""
+        if not self._pending:
+            return
+        keys = np.concatenate([self._keys] + [keys for keys, values in self._pending])
+        values = np.concatenate([self._values] + [values for keys, values in self._pending])
+        self._keys, inverse = np.unique(keys, return_inverse=True)
+        self._values = np.bincount(inverse, weights=values,
+                                   minlength=len(self._keys)).astype(self.dtype)
+        self._pending = []
+        self._pending_size = 0
+
+    def _advance(self, time):
+        """Moves the reference time of the decay forward, decaying the stored affinity"""
+        if time <= self.time:
+            return
+        if self.half_life is not None and np.isfinite(self.time):
+            factor = 0.5 ** ((time - self.time) / self.half_life)
+            if self.sparse:
+                self._merge()
+                self._values *= factor
+            else:
+                self._matrix *= factor
+        self.time = time
+
+    def add(self, source, dest, volume, timestamp=0.):
+        """Adds one message to the accumulated affinity
+
+        Parameters
+        ----------
+        source : int
+            Task sending the message
+        dest : int
+            Task receiving the message
+        volume : float
+            Number of bytes of the message
+        timestamp : float, optional
+            Time of the message
+
+        Raises
+        ------
+        ValueError
+            If the task identifiers or the volume are invalid
+        """
+        self.add_batch([source], [dest], [volume], [timestamp])
+
+    def add_batch(self, sources, dests, volumes, timestamps=None):
+        """Adds many messages to the accumulated affinity
+
+        Parameters
+        ----------
+        sources : np.ndarray
+            Tasks sending the messages
+        dests : np.ndarray
+            Tasks receiving the messages
+        volumes : np.ndarray
+            Number of bytes of each message
+        timestamps : np.ndarray, optional
+            Time of each message. Default: the latest time seen
+
+        Raises
+        ------
+        ValueError
+            If the task identifiers or the volumes are invalid
+        """
+        sources = np.asarray(sources)
+        dests = np.asarray(dests)
+        volumes = np.asarray(volumes, dtype=np.float64)
+        if len(sources) == 0:
+            return
+        if sources.shape != dests.shape or sources.shape != volumes.shape:
+            print("* The records of the trace have different lengths.")
+            raise ValueError
+        if np.isnan(volumes).any() or np.min(volumes) < 0:
+            print("* The trace contains NaN or negative volumes.")
+            raise ValueError
+        if min(sources.min(), dests.min()) < 0:
+            print("* The trace contains invalid task identifiers.")
+            raise ValueError
+        largest = int(max(sources.max(), dests.max()))
+        if self.num_tasks is not None and largest >= self.num_tasks:
+            print(f"* The trace refers to tasks beyond the {self.num_tasks} expected.")
+            raise ValueError
+        if timestamps is None:
+            timestamps = np.full(len(sources), self.time if np.isfinite(self.time) else 0.)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.records += len(sources)
+        self._largest = max(self._largest, largest)
+        # Only the latest window is kept: older records in the batch are dropped
+        if self.window is not None:
+            windows = np.floor(timestamps / self.window)
+            latest = windows.max()
+            if self._current_window is None or latest > self._current_window:
+                if self._current_window is not None:
+                    self._reset()
+                self._current_window = latest
+            current = windows == self._current_window
+            self.dropped += len(sources) - np.count_nonzero(current)
+            sources, dests = sources[current], dests[current]
+            volumes, timestamps = volumes[current], timestamps[current]
+            if len(sources) == 0:
+                return
+        self._advance(timestamps.max())
+        if self.half_life is not None:
+            volumes = volumes * 0.5 ** ((self.time - timestamps) / self.half_life)
+        # Each pair is stored once, from its lowest task, and self messages are ignored
+        low = np.minimum(sources, dests).astype(np.int64)
+        high = np.maximum(sources, dests).astype(np.int64)
+        pairs = low != high
+        low, high, volumes = low[pairs], high[pairs], volumes[pairs]
+        if self.sparse:
+            self._pending.append(((low << 32) | high, volumes))
+            self._pending_size += len(low)
+            if self._pending_size >= self.buffer_size:
+                self._merge()
+        else:
+            np.add.at(self._matrix, (low, high), volumes)
+
+    def consume(self, records, batch_size=CHUNK_ROWS):
+        """Adds the messages of an iterable of records
+
+        Parameters
+        ----------
+        records : iterable
+            Tuples (source, destination, bytes, timestamp), or
+            (source, destination, bytes)
+        batch_size : int, optional
+            Number of records converted at once
+
+        Raises
+        ------
+        ValueError
+            If the task identifiers or the volumes are invalid
+        """
+        records = iter(records)
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                return
+            self._add_block(np.array(batch, dtype=np.float64, ndmin=2), 'trace')
+
+    def read_file(self, trace_file, chunk_rows=CHUNK_ROWS):
+        """Adds the messages of a trace file
+
+        Each line contains 'source,destination,bytes,timestamp' (the timestamp
+        is optional). Empty lines and lines starting with '#' are ignored.
+
+        Parameters
+        ----------
+        trace_file : string
+            File containing the trace
+        chunk_rows : int, optional
+            Number of lines parsed at once
+
+        Raises
+        ------
+        ValueError
+            If a line contains missing or invalid values
+        """
+        for block in read_chunks(trace_file, 'trace', np.float64, chunk_rows):
+            self._add_block(block, f'trace from file {trace_file}')
+
+    def _add_block(self, block, description):
+        """Adds the messages of a block of records with three or four columns"""
+        if block.shape[1] not in (3, 4):
+            print(f"* The {description} does not contain three or four values per record.")
+            raise ValueError
+        tasks = block[:, :2]
+        if (tasks != np.floor(tasks)).any():
+            print(f"* The {description} contains invalid task identifiers.")
+            raise ValueError
+        self.add_batch(tasks[:, 0].astype(np.int64), tasks[:, 1].astype(np.int64), block[:, 2],
+                       block[:, 3] if block.shape[1] == 4 else None)
+
+    def snapshot(self):
+        """Creates an application graph from the affinity accumulated so far
+
+        The accumulator can keep consuming records afterwards.
+
+        Returns
+        -------
+        ApplicationGraph or SparseApplicationGraph object
+            Symmetric communication graph of the tasks
+        """
+        num_tasks = self.num_tasks if self.num_tasks is not None else max(1, self._largest + 1)
+        if not self.sparse:
+            return ApplicationGraph.from_matrix(self._matrix + self._matrix.T, check=False)
+        self._merge()
+        low, high = self._keys >> 32, self._keys & 0xFFFFFFFF
+        return SparseApplicationGraph.from_edges(np.concatenate([low, high]),
+                                                 np.concatenate([high, low]),
+                                                 np.concatenate([self._values, self._values]),
+                                                 num_tasks)
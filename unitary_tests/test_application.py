@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+import unittest
+import sys
+# Add the parent directory to the path so we can import
+# code from our simulator
+sys.path.append('../')
+
+import numpy as np
+from simulator.application import ApplicationGraph, SparseApplicationGraph
+from simulator.topology import TopologyTree
+from simulator.support import compute_hopbytes
+
+
+class SparseApplicationTest(unittest.TestCase):
+    def setUp(self):
+        self.dense = ApplicationGraph('six_tasks.csv')
+        self.sparse = SparseApplicationGraph.from_csv('six_tasks.csv')
+
+    def test_same_interface(self):
+        self.assertEqual(self.sparse.num_tasks, self.dense.num_tasks)
+        self.assertEqual(self.sparse.max_affinity(), self.dense.max_affinity())
+        for task in range(self.dense.num_tasks):
+            self.assertTrue(np.array_equal(self.sparse.neighbors(task), self.dense.neighbors(task)))
+            for other in range(self.dense.num_tasks):
+                self.assertEqual(self.sparse.get_affinity(task, other),
+                                 self.dense.get_affinity(task, other))
+        self.assertTrue(np.array_equal(self.sparse.affinity, self.dense.affinity))
+
+    def test_edges(self):
+        for dense, sparse in zip(self.dense.edges(), self.sparse.edges()):
+            self.assertTrue(np.array_equal(dense, sparse))
+
+    def test_hopbytes(self):
+        tree = TopologyTree([2, 2, 2])
+        mapping = [7, 0, 3, 2, 5, 1]
+        self.assertEqual(compute_hopbytes(self.sparse, tree, mapping),
+                         compute_hopbytes(self.dense, tree, mapping))
+
+    def test_repeated_edges(self):
+        application = SparseApplicationGraph.from_edges([0, 1, 0, 2], [1, 0, 1, 2], [1., 2., 3., 0.], 3)
+        self.assertEqual(application.get_affinity(0, 1), 4.)
+        self.assertEqual(application.get_affinity(1, 0), 2.)
+        self.assertEqual(len(application.neighbors(2)), 0)
+
+    def test_negative_values(self):
+        with self.assertRaises(ValueError):
+            SparseApplicationGraph([0, 1, 1], [1], [-1.])
+
+
+if __name__ == '__main__':
+    unittest.main()
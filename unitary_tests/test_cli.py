@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+import unittest
+import sys
+import os
+import io
+import json
+import tempfile
+from contextlib import redirect_stdout
+# Add the parent directory to the path so we can import
+# code from our simulator
+sys.path.append('../')
+
+from simulator import cli
+from simulator.application import ApplicationGraph
+from simulator.topology import TopologyTree
+from simulator.schedulers import eagermap, greedy_pairs
+
+
+class MapCommandTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.directory.name, 'result.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_map(self, *arguments):
+        status = cli.main(['map', *arguments, '--output', self.output])
+        with open(self.output) as stream:
+            return status, json.load(stream)
+
+    def test_tree(self):
+        status, result = self.run_map('six_tasks.csv', 'tree:2,2,2', '-s', 'eagermap')
+        self.assertEqual(status, 0)
+        application = ApplicationGraph('six_tasks.csv')
+        self.assertEqual(result['mapping'], eagermap(application, TopologyTree([2, 2, 2])))
+        self.assertEqual(result['num_tasks'], 6)
+        self.assertEqual(result['num_cores'], 8)
+        self.assertIn('hopbytes', result)
+
+    def test_options(self):
+        status, result = self.run_map('six_tasks.csv', '../inputs/simple_topo.csv', '--format', 'sparse',
+                                      '-s', 'recursive_bisection', '-o', 'seed=0', '--packed')
+        self.assertEqual(status, 0)
+        self.assertEqual(result['options'], {'seed': 0})
+        self.assertEqual(sorted(result['mapping'].count(core) for core in range(4)), [1, 1, 2, 2])
+
+    def test_binary_and_edges(self):
+        application = ApplicationGraph('six_tasks.csv')
+        binary = os.path.join(self.directory.name, 'application.bin')
+        application.save(binary)
+        edges = os.path.join(self.directory.name, 'application.edges')
+        with open(edges, 'w') as stream:
+            for source, dest, volume in zip(*application.edges()):
+                stream.write(f'{source},{dest},{volume}\n')
+        first = self.run_map(binary, 'tree:2,3')[1]
+        second = self.run_map(edges, 'tree:2,3')[1]
+        self.assertEqual(first['mapping'], greedy_pairs(application, TopologyTree([2, 3])))
+        self.assertEqual(second['hopbytes'], first['hopbytes'])
+
+    def test_error(self):
+        status, result = self.run_map('six_tasks.csv', 'tree:2,2,2', '-s', 'eagermap', '-o', 'wrong=1')
+        self.assertEqual(status, 1)
+        self.assertEqual(result['status'], 'error')
+        status, result = self.run_map('six_tasks.csv', '../inputs/simple_topo.csv', '-s', 'eagermap')
+        self.assertEqual(status, 1)
+        self.assertIn('TopologyTree', result['error'])
+
+
+class BatchCommandTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.manifest = os.path.join(self.directory.name, 'jobs.json')
+        application = os.path.abspath('six_tasks.csv')
+        jobs = {'defaults': {'application': application, 'topology': 'tree:2,2,2'},
+                'jobs': [{'scheduler': name} for name in cli.SCHEDULERS] +
+                        [{'name': 'missing', 'application': 'missing.csv'}]}
+        with open(self.manifest, 'w') as stream:
+            json.dump(jobs, stream)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_batch(self, workers):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            status = cli.main(['batch', self.manifest, '--workers', str(workers)])
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        return status, {result['name']: result for result in results}
+
+    def test_workers(self):
+        for workers in [1, 2]:
+            status, results = self.run_batch(workers)
+            # The job with a missing application fails without stopping the others
+            self.assertEqual(status, 1)
+            self.assertEqual(len(results), len(cli.SCHEDULERS) + 1)
+            self.assertEqual(results['missing']['status'], 'error')
+            for number, name in enumerate(cli.SCHEDULERS):
+                self.assertEqual(results[str(number)]['status'], 'ok')
+                self.assertEqual(results[str(number)]['scheduler'], name)
+
+    def test_cache(self):
+        cache = os.path.join(self.directory.name, 'cache')
+        jobs = cli.read_manifest(self.manifest)[:2]
+        for job in jobs:
+            job['cache'] = cache
+        first = list(cli.run_batch(jobs))
+        second = list(cli.run_batch(jobs))
+        self.assertEqual([result['cached'] for result in first], [False, False])
+        self.assertEqual([result['cached'] for result in second], [True, True])
+        self.assertEqual([result['mapping'] for result in first], [result['mapping'] for result in second])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+import unittest
+import sys
+import numpy as np
+# Add the parent directory to the path so we can import
+# code from our simulator
+sys.path.append('../')
+
+from simulator.application import ApplicationGraph
+from simulator.topology import TopologyTree
+from simulator.schedulers import compact, greedy_pairs
+from simulator.dynamic import remap_phases
+
+
+def pairs(num_tasks, shift):
+    """Affinity matrix where task i talks to task (i + shift) % num_tasks"""
+    affinity = np.zeros((num_tasks, num_tasks))
+    tasks = np.arange(num_tasks)
+    affinity[tasks, (tasks + shift) % num_tasks] = 10
+    return affinity + affinity.T
+
+
+class RemapPhasesTest(unittest.TestCase):
+    def setUp(self):
+        self.tree = TopologyTree([2, 2, 2])
+
+    def test_same_phase_stays(self):
+        phases = [ApplicationGraph.from_matrix(pairs(8, 1))] * 3
+        results = remap_phases(phases, self.tree, migration_cost=1., budget=0.2, seed=0)
+        self.assertEqual(len(results), 3)
+        for result in results[1:]:
+            self.assertFalse(result['remapped'])
+            self.assertEqual(result['migration'], 0.)
+            self.assertEqual(result['hopbytes'], result['stay_hopbytes'])
+
+    def test_expensive_migration(self):
+        phases = [pairs(8, 1), pairs(8, 4)]
+        initial = compact(ApplicationGraph.from_matrix(phases[0]), self.tree)
+        results = remap_phases(phases, self.tree, migration_cost=1e6,
+                               initial_mapping=initial, budget=0.2, seed=0)
+        self.assertEqual(results[1]['mapping'], initial)
+        self.assertEqual(results[1]['migration'], 0.)
+
+    def test_cheap_migration(self):
+        phases = [pairs(8, 1), pairs(8, 4)]
+        initial = compact(ApplicationGraph.from_matrix(phases[0]), self.tree)
+        results = remap_phases(phases, self.tree, migration_cost=0.01, initial_mapping=initial,
+                               scheduler=greedy_pairs, budget=0.2, seed=0)
+        second = results[1]
+        self.assertTrue(second['remapped'])
+        self.assertLess(second['hopbytes'] + second['migration'], second['stay_hopbytes'])
+        # Tasks four apart end up as neighbors
+        self.assertEqual(second['hopbytes'], 4 * 20 * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import unittest
+import sys
+import numpy as np
+# Add the parent directory to the path so we can import
+# code from our simulator
+sys.path.append('../')
+
+from simulator.application import ApplicationGraph
+from simulator.topology import TopologyTree, Topology
+from simulator.schedulers import eagermap
+from simulator.support import compute_hopbytes
+from simulator.synthetic import mesh
+from simulator.hierarchy import extract_tree, is_ultrametric, map_on_extracted_tree
+
+
+class ExtractTreeTest(unittest.TestCase):
+    def test_tree_distances(self):
+        tree = TopologyTree([2, 3, 2])
+        self.assertTrue(is_ultrametric(tree.distances))
+        # Cores are shuffled so the clusters are not contiguous in the matrix
+        permutation = np.random.default_rng(0).permutation(tree.num_cores)
+        distances = tree.distances[np.ix_(permutation, permutation)]
+        extracted, cores = extract_tree(Topology(distances))
+        self.assertEqual(extracted.arity, [2, 3, 2])
+        np.testing.assert_array_equal(extracted.distances, distances[np.ix_(cores, cores)])
+
+    def test_not_ultrametric(self):
+        line = Topology.from_csv('../inputs/simple_topo.csv')
+        self.assertFalse(is_ultrametric(line.distances))
+        self.assertFalse(is_ultrametric(mesh([3, 3]).distances))
+        # Every pair of neighbors is at distance 1, so the closest tree is flat
+        tree, cores = extract_tree(line)
+        self.assertEqual(tree.arity, [4])
+        self.assertEqual(sorted(cores), [0, 1, 2, 3])
+
+    def test_heterogeneous(self):
+        distances = np.array([[0, 1, 4, 4, 4],
+                              [1, 0, 4, 4, 4],
+                              [4, 4, 0, 1, 1],
+                              [4, 4, 1, 0, 1],
+                              [4, 4, 1, 1, 0]])
+        self.assertTrue(is_ultrametric(distances))
+        tree, cores = extract_tree(Topology(distances))
+        self.assertEqual(tree.arity, [2, [2, 3]])
+        self.assertEqual(tree.weights, [1.5, 0.5])
+        np.testing.assert_array_equal(tree.distances, distances[np.ix_(cores, cores)])
+
+    def test_weighted(self):
+        tree = TopologyTree([2, [2, 3], 2], weights=[10, 3, 1])
+        permutation = np.random.default_rng(1).permutation(tree.num_cores)
+        distances = tree.distances[np.ix_(permutation, permutation)]
+        self.assertTrue(is_ultrametric(distances))
+        extracted, cores = extract_tree(Topology(distances))
+        self.assertEqual(extracted.weights, [10, 3, 1])
+        self.assertEqual(sorted(np.bincount(extracted.get_level_parents(2))), [2, 3])
+        self.assertEqual(extracted.arity[2], 2)
+        np.testing.assert_array_equal(extracted.distances, distances[np.ix_(cores, cores)])
+
+    def test_mapping(self):
+        application = ApplicationGraph('six_tasks.csv')
+        tree = TopologyTree([2, 2, 2])
+        permutation = np.array([5, 0, 7, 2, 4, 1, 6, 3])
+        topology = Topology(tree.distances[np.ix_(permutation, permutation)])
+        mapping = map_on_extracted_tree(application, topology, eagermap)
+        self.assertEqual(compute_hopbytes(application, topology, mapping),
+                         compute_hopbytes(application, tree, eagermap(application, tree)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,13 +2,16 @@
 
 import unittest
 import sys
+import numpy as np
 # Add the parent directory to the path so we can import
 # code from our simulator
 sys.path.append('../')
 
-from simulator.application import ApplicationGraph
+from simulator.application import ApplicationGraph, SparseApplicationGraph
 from simulator.topology import TopologyTree
-from simulator.schedulers import compact, greedy_pairs
+from simulator.schedulers import compact, greedy_pairs, refine
+from simulator.support import compute_hopbytes
+from simulator.synthetic import stencil, random_sparse
 
 class CompactTest(unittest.TestCase):
     def setUp(self):
@@ -22,6 +25,20 @@ class CompactTest(unittest.TestCase):
         self.assertEqual(mapping[2], 2)
         self.assertEqual(mapping[3], 3)
 
+    def test_oversubscribed(self):
+        application = ApplicationGraph('six_tasks.csv')
+        self.assertEqual(compact(application, TopologyTree([2, 2])), [0, 1, 2, 3, 0, 1])
+
+    def test_capacities(self):
+        application = ApplicationGraph('six_tasks.csv')
+        tree = TopologyTree([3])
+        tree.capacities = [3, 2, 1]
+        self.assertEqual(compact(application, tree), [0, 0, 0, 1, 1, 2])
+        # Heavy tasks take the place of several light ones
+        application.loads = [3, 1, 1, 1, 1, 1]
+        tree.capacities = None
+        self.assertEqual(compact(application, tree), [0, 1, 1, 2, 2, 1])
+
 
 class GreedyPairsTest(unittest.TestCase):
     def setUp(self):
@@ -37,6 +54,95 @@ class GreedyPairsTest(unittest.TestCase):
         self.assertEqual(mapping[4], 1)
         self.assertEqual(mapping[5], 5)
 
+    def test_capacities(self):
+        tree = TopologyTree([3])
+        tree.capacities = [2, 2, 2]
+        # Each task shares its core with the task it communicates the most with
+        self.assertEqual(greedy_pairs(self.application, tree), [0, 1, 1, 2, 0, 2])
+
+    def test_sparse(self):
+        tree = TopologyTree([4, 2])
+        sparse = SparseApplicationGraph.from_csv('six_tasks.csv')
+        self.assertEqual(greedy_pairs(sparse, tree), greedy_pairs(self.application, tree))
+
+
+class RefineTest(unittest.TestCase):
+    def setUp(self):
+        self.application = ApplicationGraph('six_tasks.csv')
+        self.tree = TopologyTree([2, 2, 2])
+
+    def test_descent(self):
+        mapping = compact(self.application, self.tree)
+        refined = refine(self.application, self.tree, mapping, seed=0)
+        self.assertEqual(len(refined), 6)
+        self.assertEqual(len(set(refined)), 6)
+        self.assertLess(compute_hopbytes(self.application, self.tree, refined),
+                        compute_hopbytes(self.application, self.tree, mapping))
+
+    def test_annealing_never_worse(self):
+        mapping = greedy_pairs(self.application, self.tree)
+        refined = refine(self.application, self.tree, mapping, method='annealing',
+                         max_iterations=200, seed=0)
+        self.assertLessEqual(compute_hopbytes(self.application, self.tree, refined),
+                             compute_hopbytes(self.application, self.tree, mapping))
+
+    def test_moves_to_free_cores(self):
+        # Two communicating tasks on distant cores of a tree with free cores
+        application = SparseApplicationGraph.from_edges([0], [1], [5.], 2)
+        tree = TopologyTree([2, 2, 2])
+        refined = refine(application, tree, [0, 7], seed=0)
+        self.assertEqual(compute_hopbytes(application, tree, refined), 10.)
+        # Cores without capacity never receive tasks
+        tree.capacities = [1, 0, 1, 1, 1, 1, 1, 1]
+        refined = refine(application, tree, [0, 7], seed=0)
+        self.assertNotIn(1, refined)
+        self.assertEqual(compute_hopbytes(application, tree, refined), 10.)
+
+    def test_larger_stencil(self):
+        application = stencil([8, 8])
+        tree = TopologyTree([4, 4, 4])
+        mapping = [int(core) for core in np.random.default_rng(0).permutation(64)]
+        refined = refine(application, tree, mapping, seed=0)
+        self.assertEqual(sorted(refined), list(range(64)))
+        self.assertLess(compute_hopbytes(application, tree, refined),
+                        0.8 * compute_hopbytes(application, tree, mapping))
+
+    def test_improves_greedy_mappings(self):
+        # Greedy mappings of a random graph improve with single swaps and moves
+        application = random_sparse(256, seed=0)
+        tree = TopologyTree([2, 4, 32])
+        mapping = greedy_pairs(application, tree)
+        refined = refine(application, tree, mapping, budget=float('inf'), max_iterations=20000, seed=0)
+        self.assertLess(compute_hopbytes(application, tree, refined),
+                        0.9 * compute_hopbytes(application, tree, mapping))
+        # Rows of a stencil on the leaves only improve with annealing (blocks are better)
+        application = stencil([16, 16])
+        tree = TopologyTree([4, 4, 16])
+        mapping = greedy_pairs(application, tree)
+        refined = refine(application, tree, mapping, budget=float('inf'), max_iterations=20000, seed=0)
+        self.assertEqual(refined, mapping)
+        refined = refine(application, tree, mapping, method='annealing', budget=float('inf'),
+                         max_iterations=5000, seed=0)
+        self.assertLess(compute_hopbytes(application, tree, refined),
+                        0.95 * compute_hopbytes(application, tree, mapping))
+
+    def test_budget_includes_setup(self):
+        mapping = compact(self.application, self.tree)
+        for method in ['descent', 'annealing']:
+            self.assertEqual(refine(self.application, self.tree, mapping, budget=0., method=method, seed=0),
+                             mapping)
+
+    def test_annealing_without_options(self):
+        # Tasks sharing their core have no candidates: iterations still end the loop
+        application = SparseApplicationGraph.from_edges([], [], [], 2)
+        refined = refine(application, TopologyTree([2]), [0, 0], method='annealing',
+                         budget=float('inf'), max_iterations=50, seed=0)
+        self.assertEqual(refined, [0, 0])
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            refine(self.application, self.tree, [0, 1, 2, 3, 4, 5], method='magic')
+
 
 if __name__ == '__main__':
     unittest.main()
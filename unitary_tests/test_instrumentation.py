@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+import unittest
+import sys
+import os
+import json
+import tempfile
+import numpy as np
+# Add the parent directory to the path so we can import
+# code from our simulator
+sys.path.append('../')
+
+from simulator import instrumentation
+from simulator.application import ApplicationGraph, SparseApplicationGraph
+from simulator.topology import TopologyTree
+from simulator.schedulers import greedy_pairs, eagermap, refine
+from simulator.support import compute_hopbytes
+
+
+class InstrumentationTest(unittest.TestCase):
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.reset()
+
+    def test_disabled(self):
+        application = ApplicationGraph('six_tasks.csv')
+        greedy_pairs(application, TopologyTree([2, 3]))
+        with instrumentation.timer('nothing'):
+            instrumentation.count('nothing')
+        self.assertFalse(instrumentation.is_enabled())
+        self.assertEqual(instrumentation.profile(), {'timers': {}, 'counters': {}})
+
+    def test_profile(self):
+        instrumentation.enable()
+        application = ApplicationGraph('six_tasks.csv')
+        tree = TopologyTree([2, 2, 2])
+        mapping = eagermap(application, tree)
+        mapping = refine(application, tree, mapping, max_iterations=20, seed=0)
+        compute_hopbytes(application, tree, mapping)
+        greedy_pairs(application, tree)
+        profile = instrumentation.profile()
+        timers = profile['timers']
+        for name in ['loaders.read_matrix', 'eagermap', 'hierarchical.grouping',
+                     'hierarchical.placement', 'refine', 'support.compute_hopbytes', 'greedy_pairs']:
+            self.assertIn(name, timers)
+        self.assertEqual(timers['eagermap']['calls'], 1)
+        self.assertEqual(timers['hierarchical.grouping']['calls'], 3)
+        self.assertLessEqual(timers['hierarchical.grouping']['total'], timers['eagermap']['total'])
+        counters = profile['counters']
+        self.assertEqual(counters['loaders.rows'], 6)
+        self.assertGreaterEqual(counters['refine.changes_evaluated'], 20)
+        self.assertGreater(counters['evaluator.moves_evaluated'], 0)
+        self.assertGreater(counters['distance_queries'], 36)
+        self.assertEqual(counters['greedy_pairs.argmax_scans'], 3)
+
+    def test_distance_queries(self):
+        instrumentation.enable()
+        tree = TopologyTree([2, 2, 2])
+        # Dense graphs evaluate the pairs of the upper triangle
+        dense = ApplicationGraph.from_matrix(np.ones((6, 6)))
+        compute_hopbytes(dense, tree, list(range(6)))
+        self.assertEqual(instrumentation.profile()['counters']['distance_queries'], 15)
+        # Sparse graphs evaluate their interactions, the same pairs when all tasks interact
+        instrumentation.reset()
+        compute_hopbytes(SparseApplicationGraph.from_dense(np.ones((6, 6))), tree, list(range(6)))
+        self.assertEqual(instrumentation.profile()['counters']['distance_queries'], 15)
+
+    def test_chrome_trace(self):
+        instrumentation.enable()
+        with instrumentation.timer('outer'):
+            with instrumentation.timer('inner'):
+                instrumentation.count('things', 3)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'trace.json')
+            trace = instrumentation.chrome_trace(path)
+            with open(path) as stream:
+                self.assertEqual(json.load(stream), trace)
+        events = {event['name']: event for event in trace['traceEvents']}
+        self.assertEqual(events['inner']['ph'], 'X')
+        self.assertLessEqual(events['outer']['ts'], events['inner']['ts'])
+        self.assertGreaterEqual(events['outer']['dur'], events['inner']['dur'])
+        self.assertEqual(events['things']['args'], {'things': 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+import unittest
+import os
+import sys
+import tempfile
+# Add the parent directory to the path so we can import
+# code from our simulator
+sys.path.append('../')
+
+import numpy as np
+from simulator.loaders import read_matrix, read_sparse_matrix, read_edge_list
+from simulator.application import SparseApplicationGraph
+
+
+class LoaderTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, content):
+        path = os.path.join(self.directory.name, 'input.csv')
+        with open(path, 'w') as stream:
+            stream.write(content)
+        return path
+
+    def test_chunked_dense(self):
+        matrix = read_matrix('six_tasks.csv', chunk_rows=4)
+        self.assertTrue(np.array_equal(matrix, np.genfromtxt('six_tasks.csv', delimiter=',')))
+        matrix = read_matrix('six_tasks.csv', dtype=np.int32)
+        self.assertEqual(matrix.dtype, np.int32)
+
+    def test_chunked_sparse(self):
+        indptr, indices, data = read_sparse_matrix('six_tasks.csv', chunk_rows=4)
+        application = SparseApplicationGraph(indptr, indices, data)
+        self.assertTrue(np.array_equal(application.affinity,
+                                       np.genfromtxt('six_tasks.csv', delimiter=',')))
+
+    def test_integrity(self):
+        with self.assertRaises(ValueError):
+            read_matrix(self.write('0,1\n1,nan\n'))
+        with self.assertRaises(ValueError):
+            read_matrix(self.write('0,1\n-1,0\n'))
+        with self.assertRaises(ValueError):
+            read_matrix(self.write('0,1\n1,0\n1,1\n'), chunk_rows=1)
+        with self.assertRaises(ValueError):
+            read_matrix(self.write('0,1\n1,\n'))
+
+    def test_edge_list(self):
+        path = self.write('0,1,2\n# comment\n2,1,3.5\n1,0,1\n')
+        sources, dests, volumes, num_tasks = read_edge_list(path, symmetric=False)
+        self.assertEqual(num_tasks, 3)
+        self.assertEqual(list(volumes), [2, 3.5, 1])
+        application = SparseApplicationGraph.from_edge_list(path, num_tasks=4)
+        self.assertEqual(application.num_tasks, 4)
+        self.assertEqual(application.get_affinity(0, 1), 3)
+        self.assertEqual(application.get_affinity(1, 2), 3.5)
+        with self.assertRaises(ValueError):
+            read_edge_list(path, num_tasks=2)
+
+    def test_self_edge(self):
+        # Interactions of a task with itself are not mirrored onto themselves
+        path = self.write('0,1,2\n1,1,4\n')
+        sources, dests, volumes, num_tasks = read_edge_list(path)
+        self.assertEqual(sorted(zip(sources, dests, volumes)), [(0, 1, 2), (1, 0, 2), (1, 1, 4)])
+        application = SparseApplicationGraph.from_edge_list(path)
+        self.assertEqual(application.get_affinity(1, 1), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
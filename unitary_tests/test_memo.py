@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+import unittest
+import sys
+import os
+import tempfile
+from functools import partial
+# Add the parent directory to the path so we can import
+# code from our simulator
+sys.path.append('../')
+
+from simulator.application import ApplicationGraph, SparseApplicationGraph
+from simulator.topology import TopologyTree, Topology, PackedTopology
+from simulator.schedulers import greedy_pairs, eagermap, refine
+from simulator.memo import MappingCache, application_fingerprint, topology_fingerprint, scheduler_name
+from simulator import memo
+
+
+class FingerprintTest(unittest.TestCase):
+    def setUp(self):
+        self.application = ApplicationGraph('six_tasks.csv')
+
+    def test_equivalent_inputs(self):
+        sparse = SparseApplicationGraph.from_dense(self.application.affinity)
+        self.assertEqual(application_fingerprint(self.application), application_fingerprint(sparse))
+        tree = TopologyTree([2, 2, 2])
+        self.assertEqual(topology_fingerprint(tree), topology_fingerprint(TopologyTree([2, [2, 2], 2])))
+        topology = Topology(tree.distances)
+        packed = PackedTopology.from_topology(topology)
+        self.assertEqual(topology_fingerprint(topology), topology_fingerprint(packed))
+        # Trees are identified by their structure and weights, not by their distances
+        self.assertNotEqual(topology_fingerprint(tree), topology_fingerprint(topology))
+        weighted = TopologyTree([2, 2, 2], weights=[2, 1, 1])
+        self.assertNotEqual(topology_fingerprint(tree), topology_fingerprint(weighted))
+
+    def test_different_inputs(self):
+        loaded = ApplicationGraph('six_tasks.csv')
+        loaded.loads = [1, 1, 1, 1, 1, 2]
+        self.assertNotEqual(application_fingerprint(self.application), application_fingerprint(loaded))
+        self.assertNotEqual(topology_fingerprint(TopologyTree([2, 4])), topology_fingerprint(TopologyTree([4, 2])))
+
+    def test_memoized(self):
+        # Trees are hashed without building their matrix of distances
+        tree = TopologyTree([2, 2, 2])
+        fingerprint = topology_fingerprint(tree)
+        self.assertIsNone(tree._distances)
+        self.assertEqual(topology_fingerprint(tree), fingerprint)
+        # The hash of the affinities is kept with their matrix, while the loads are hashed each time
+        fingerprint = application_fingerprint(self.application)
+        self.assertIs(memo._affinity_hashes[self.application][0][0], self.application.affinity)
+        self.application.loads = [1, 1, 1, 1, 1, 2]
+        loaded = application_fingerprint(self.application)
+        self.assertNotEqual(loaded, fingerprint)
+        self.application.affinity = 2 * self.application.affinity
+        self.assertNotEqual(application_fingerprint(self.application), loaded)
+        self.assertIs(memo._affinity_hashes[self.application][0][0], self.application.affinity)
+
+    def test_scheduler_name(self):
+        self.assertEqual(scheduler_name(eagermap), 'simulator.schedulers.eagermap')
+        self.assertEqual(scheduler_name(partial(refine, mapping=None, seed=1)),
+                         'simulator.schedulers.refine(mapping=None, seed=1)')
+
+
+class MappingCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = MappingCache(self.directory.name)
+        self.application = ApplicationGraph('six_tasks.csv')
+        self.tree = TopologyTree([2, 2, 2])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_hit(self):
+        first = self.cache.map(eagermap, self.application, self.tree)
+        self.assertFalse(first['cached'])
+        self.assertEqual(first['mapping'], eagermap(self.application, self.tree))
+        # The same inputs described differently share the entry
+        sparse = SparseApplicationGraph.from_dense(self.application.affinity)
+        second = self.cache.map(eagermap, sparse, TopologyTree([2, 2, 2]))
+        self.assertTrue(second['cached'])
+        self.assertEqual(second['mapping'], first['mapping'])
+        self.assertEqual(second['hopbytes'], first['hopbytes'])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_parameters(self):
+        self.cache.map(greedy_pairs, self.application, self.tree)
+        self.assertFalse(self.cache.map(eagermap, self.application, self.tree)['cached'])
+        mapping = list(range(6))
+        self.cache.map(refine, self.application, self.tree, mapping=mapping, seed=0)
+        self.assertFalse(self.cache.map(refine, self.application, self.tree, mapping=mapping, seed=1)['cached'])
+        self.assertTrue(self.cache.map(refine, self.application, self.tree, seed=0, mapping=mapping)['cached'])
+
+    def test_wrap(self):
+        cached_greedy = self.cache.wrap(greedy_pairs)
+        self.assertEqual(cached_greedy(self.application, self.tree), greedy_pairs(self.application, self.tree))
+        cached_greedy(self.application, self.tree)
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_eviction(self):
+        self.cache.map(greedy_pairs, self.application, self.tree)
+        entry_size = self.cache.size()
+        # Room for two entries: the least recently used is evicted
+        cache = MappingCache(self.directory.name, max_bytes=2 * entry_size + entry_size // 2)
+        cache.map(greedy_pairs, self.application, TopologyTree([2, 4]))
+        first_key = cache.key(greedy_pairs, self.application, self.tree)
+        old = os.stat(os.path.join(self.directory.name, first_key + '.json')).st_mtime - 10
+        os.utime(os.path.join(self.directory.name, first_key + '.json'), (old, old))
+        cache.map(greedy_pairs, self.application, TopologyTree([4, 2]))
+        self.assertTrue(cache.size() <= cache.max_bytes)
+        self.assertIsNone(cache.get(first_key))
+        self.assertTrue(cache.map(greedy_pairs, self.application, TopologyTree([4, 2]))['cached'])
+
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            MappingCache(self.directory.name, max_bytes=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
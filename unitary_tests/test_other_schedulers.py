@@ -2,14 +2,18 @@
 
 import unittest
 import sys
+import numpy as np
 # Add the parent directory to the path so we can import
 # code from our simulator
 sys.path.append('../')
 
-from simulator.application import ApplicationGraph
-from simulator.topology import TopologyTree
-from simulator.schedulers import scatter, greedy_pairs_with_topology, eagermap
-from simulator.support import compute_hopbytes
+from simulator.application import ApplicationGraph, SparseApplicationGraph
+from simulator.topology import TopologyTree, Topology
+from simulator.schedulers import scatter, greedy_pairs_with_topology, eagermap, treematch
+from simulator.schedulers import recursive_bisection
+from simulator.support import compute_hopbytes, compute_load_imbalance, compute_core_loads
+from simulator.synthetic import stencil
+from simulator import schedulers, partitioning
 
 class ScatterTest(unittest.TestCase):
     def setUp(self):
@@ -40,6 +44,20 @@ class GreedyPairsWithTopologyTest(unittest.TestCase):
         self.assertEqual(mapping[4], 1)
         self.assertEqual(mapping[5], 5)
 
+    def test_more_tasks_than_cores(self):
+        tree = TopologyTree([2, 2])
+        mapping = greedy_pairs_with_topology(self.application, tree)
+        self.assertEqual(sorted(mapping), [0, 0, 1, 1, 2, 3])
+
+    def test_distance_matrix(self):
+        # Same distances as TopologyTree([2, 3]), without the tree structure
+        topology = Topology(TopologyTree([2, 3]).distances)
+        mapping = greedy_pairs_with_topology(self.application, topology)
+        self.assertEqual(sorted(mapping), list(range(6)))
+        # Pairs go to the first free core and the free core closest to it
+        self.assertEqual(mapping[0], 0)
+        self.assertEqual(mapping[4], 1)
+
 
 class EagerMapTest(unittest.TestCase):
     def setUp(self):
@@ -54,6 +72,137 @@ class EagerMapTest(unittest.TestCase):
         expected_dilation = (5*6+7*2+1*6) + (4*2+3*4+4*4) + (1*4+3*4) + (2*2) + (9*6)
         self.assertTrue(dilation < expected_dilation + 1)
 
+    def test_more_tasks_than_cores(self):
+        tree = TopologyTree([2, 2])
+        mapping = eagermap(self.application, tree)
+        self.assertEqual(sorted(mapping), [0, 0, 1, 1, 2, 3])
+        # tasks 4 and 5 communicate the most, so they share a core
+        self.assertEqual(mapping[4], mapping[5])
+
+    def test_requires_tree(self):
+        linear = Topology.from_csv('../inputs/simple_topo.csv')
+        with self.assertRaises(ValueError):
+            eagermap(self.application, linear)
+
+    def test_without_communication(self):
+        # Tasks filling the tree exactly, without affinities between them
+        for matrix in [np.zeros((4, 4)), np.diag([1., 2., 3., 4.])]:
+            application = ApplicationGraph.from_matrix(matrix)
+            for scheduler in [eagermap, treematch]:
+                self.assertEqual(sorted(scheduler(application, TopologyTree([2, 2]))), [0, 1, 2, 3])
+
+
+class TreeMatchTest(unittest.TestCase):
+    def setUp(self):
+        self.application = ApplicationGraph('six_tasks.csv')
+        self.tree = TopologyTree([2, 2, 2])
+
+    def test_exhaustive(self):
+        mapping = treematch(self.application, self.tree)
+        self.assertEqual(len(set(mapping)), 6)
+        # cheapest pairs: (1,3), (0,4), (2,5); then ((1,3),artificial) and ((0,4),(2,5))
+        self.assertEqual(mapping, [4, 0, 6, 1, 5, 7])
+
+    def test_heuristic(self):
+        mapping = treematch(self.application, self.tree, max_combinations=0)
+        self.assertEqual(len(set(mapping)), 6)
+        self.assertTrue(max(mapping) < 8)
+
+
+class HeterogeneousTreeTest(unittest.TestCase):
+    def setUp(self):
+        self.application = ApplicationGraph('six_tasks.csv')
+        # A socket with four cores and a socket with two cores
+        self.tree = TopologyTree([2, [4, 2]])
+
+    def test_schedulers(self):
+        for scheduler in [eagermap, treematch]:
+            mapping = scheduler(self.application, self.tree)
+            self.assertEqual(sorted(mapping), [0, 1, 2, 3, 4, 5])
+            # tasks 4 and 5 communicate the most and share the large socket
+            self.assertTrue(mapping[4] < 4 and mapping[5] < 4)
+            self.assertEqual(compute_hopbytes(self.application, self.tree, mapping), 100)
+
+    def test_weighted(self):
+        tree = TopologyTree([2, [1, 3], [2, 2, 2, 1]], weights=[5, 2, 1])
+        mapping = eagermap(self.application, tree)
+        self.assertEqual(len(set(mapping)), 6)
+        self.assertTrue(max(mapping) < tree.num_cores)
+
+
+class RecursiveBisectionTest(unittest.TestCase):
+    def test_linear(self):
+        application = ApplicationGraph('simple_comm.csv')
+        linear = Topology.from_csv('../inputs/simple_topo.csv')
+        mapping = recursive_bisection(application, linear, seed=0)
+        # the chain of tasks follows the line of cores
+        self.assertEqual(compute_hopbytes(application, linear, mapping), 2 + 4 + 6)
+
+    def test_more_tasks_than_cores(self):
+        application = ApplicationGraph('six_tasks.csv')
+        mapping = recursive_bisection(application, TopologyTree([2, 2]), seed=0)
+        self.assertEqual(sorted(mapping.count(core) for core in range(4)), [1, 1, 2, 2])
+
+
+class CapacityTest(unittest.TestCase):
+    def setUp(self):
+        self.application = stencil([8])
+        self.tree = TopologyTree([2, 2])
+        self.tree.capacities = [3, 3, 1, 0]
+        self.mappers = [eagermap, treematch, greedy_pairs_with_topology,
+                        lambda application, tree: recursive_bisection(application, tree, seed=0)]
+
+    def check_shares(self, mapping):
+        # Each core receives its share of the total load, up to one task
+        loads = self.application.loads
+        shares = self.tree.capacities / self.tree.capacities.sum() * loads.sum()
+        core_loads = compute_core_loads(self.application, self.tree, mapping)
+        self.assertTrue((abs(core_loads - shares) <= loads.max()).all())
+
+    def test_uneven_capacities(self):
+        for mapper in self.mappers:
+            mapping = mapper(self.application, self.tree)
+            self.assertNotIn(3, mapping)
+            self.assertTrue(np.isfinite(compute_load_imbalance(self.application, self.tree, mapping)))
+        for mapper in self.mappers[:2]:
+            mapping = mapper(self.application, self.tree)
+            self.assertEqual(sorted(mapping.count(core) for core in range(4)), [0, 1, 3, 4])
+            self.assertEqual(compute_hopbytes(self.application, self.tree, mapping), 6)
+
+    def test_uneven_loads(self):
+        self.application.loads = [4, 1, 1, 1, 1, 1, 1, 2]
+        for mapper in self.mappers:
+            mapping = mapper(self.application, self.tree)
+            self.assertNotIn(3, mapping)
+            self.assertTrue(np.isfinite(compute_load_imbalance(self.application, self.tree, mapping)))
+            if mapper is not greedy_pairs_with_topology:
+                self.check_shares(mapping)
+        # Without capacities, tasks are grouped by core following their loads
+        self.tree.capacities = None
+        for mapper in [eagermap, treematch]:
+            mapping = mapper(self.application, self.tree)
+            self.check_shares(mapping)
+            self.assertLessEqual(compute_load_imbalance(self.application, self.tree, mapping), 0.25)
+
+
+class SparseApplicationTest(unittest.TestCase):
+    def setUp(self):
+        self.application = stencil([12, 12])
+        self.tree = TopologyTree([2, 4, 4, 2])
+
+    def test_same_as_dense(self):
+        # Sparse graphs are kept sparse when dense matrices would be too large
+        mappers = [eagermap, treematch, lambda application, tree: recursive_bisection(application, tree, seed=0)]
+        expected = [mapper(self.application, self.tree) for mapper in mappers]
+        dense_affinities, dense_vertices = schedulers.DENSE_AFFINITIES, partitioning.DENSE_VERTICES
+        schedulers.DENSE_AFFINITIES, partitioning.DENSE_VERTICES = 0, 16
+        try:
+            self.assertIsInstance(schedulers._application_graph(self.application), SparseApplicationGraph)
+            for mapper, mapping in zip(mappers, expected):
+                self.assertEqual(mapper(self.application, self.tree), mapping)
+        finally:
+            schedulers.DENSE_AFFINITIES, partitioning.DENSE_VERTICES = dense_affinities, dense_vertices
+
 
 if __name__ == '__main__':
     unittest.main()
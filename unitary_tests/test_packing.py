@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+import unittest
+import sys
+import os
+import tempfile
+import numpy as np
+# Add the parent directory to the path so we can import
+# code from our simulator
+sys.path.append('../')
+
+from simulator.application import ApplicationGraph, SparseApplicationGraph, PackedApplicationGraph
+from simulator.topology import Topology, TopologyTree, PackedTopology
+from simulator.packing import (packed_index, packed_positions, packed_rows, narrowest_dtype,
+                               pack_matrix, unpack_matrix)
+from simulator.schedulers import greedy_pairs, greedy_pairs_with_topology, recursive_bisection, refine
+from simulator.support import compute_hopbytes, compute_hopbytes_batch, HopBytesEvaluator
+from simulator.memo import application_fingerprint, topology_fingerprint
+from simulator.synthetic import mesh
+
+
+class PackingTest(unittest.TestCase):
+    def setUp(self):
+        generator = np.random.default_rng(0)
+        matrix = generator.integers(0, 50, size=(7, 7))
+        self.matrix = matrix + matrix.T
+
+    def test_index(self):
+        packed = pack_matrix(self.matrix)
+        rows, columns = np.indices((7, 7))
+        self.assertTrue((packed[packed_index(7, rows, columns)] == self.matrix).all())
+        self.assertEqual(packed_index(7, 2, 5), packed_index(7, 5, 2))
+        self.assertEqual(len(packed), 7 * 8 // 2)
+
+    def test_rows(self):
+        packed = pack_matrix(self.matrix)
+        self.assertTrue((packed_rows(packed, 7, 3) == self.matrix[3]).all())
+        self.assertTrue((packed_rows(packed, 7, [6, 0]) == self.matrix[[6, 0]]).all())
+        self.assertTrue((unpack_matrix(packed, 7) == self.matrix).all())
+
+    def test_positions(self):
+        rows, columns = packed_positions(7, np.arange(28))
+        self.assertTrue((rows <= columns).all())
+        self.assertTrue((packed_index(7, rows, columns) == np.arange(28)).all())
+
+    def test_narrowest_dtype(self):
+        self.assertEqual(narrowest_dtype(self.matrix), np.uint8)
+        self.assertEqual(narrowest_dtype([0., 300.]), np.uint16)
+        self.assertEqual(narrowest_dtype([0.5, 1.25]), np.float32)
+        self.assertEqual(narrowest_dtype([0.1]), np.float64)
+        self.assertEqual(narrowest_dtype([-1, 2]), np.float32)
+
+
+class PackedTopologyTest(unittest.TestCase):
+    def setUp(self):
+        self.tree = TopologyTree([2, 2, 2])
+        self.packed = PackedTopology.from_topology(self.tree)
+
+    def test_distances(self):
+        self.assertEqual(self.packed.packed.dtype, np.uint8)
+        self.assertTrue((self.packed.distances == self.tree.distances).all())
+        self.assertEqual(self.packed.get_distances(1, 6), 6)
+        self.assertTrue((self.packed.get_distances([0, 7], [1, 0]) == [2, 6]).all())
+        self.assertEqual(self.packed.get_hops_between_cores(2, 3), 2)
+        with self.assertRaises(ValueError):
+            self.packed.get_hops_between_cores(0, 8)
+
+    def test_no_overflow(self):
+        # Distances are widened, so differences and sums do not wrap around
+        self.assertEqual(self.packed.get_distances(0, 1) - self.packed.get_distances(0, 7), -4)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            PackedTopology.from_matrix([[0, 1], [2, 0]])
+        with self.assertRaises(ValueError):
+            PackedTopology(np.zeros(4), 2)
+
+    def test_csv(self):
+        linear = Topology.from_csv('../inputs/simple_topo.csv')
+        packed = PackedTopology.from_csv('../inputs/simple_topo.csv')
+        self.assertTrue((packed.distances == linear.distances).all())
+        self.assertEqual(topology_fingerprint(packed), topology_fingerprint(linear))
+
+    def test_storage(self):
+        self.packed.capacities = [1, 1, 1, 1, 2, 2, 2, 2]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'topology.bin')
+            self.packed.save(path)
+            loaded = Topology.load(path)
+            self.assertIsInstance(loaded, PackedTopology)
+            self.assertEqual(loaded.num_cores, 8)
+            self.assertTrue((loaded.distances == self.tree.distances).all())
+            self.assertTrue((loaded.capacities == self.packed.capacities).all())
+
+
+class PackedApplicationTest(unittest.TestCase):
+    def setUp(self):
+        self.application = ApplicationGraph('six_tasks.csv')
+        self.packed = PackedApplicationGraph.from_application(self.application)
+        self.tree = TopologyTree([2, 2, 2])
+
+    def test_affinity(self):
+        self.assertTrue((self.packed.affinity == self.application.affinity).all())
+        self.assertEqual(self.packed.get_affinity(4, 0), self.application.get_affinity(0, 4))
+        self.assertTrue((self.packed.neighbors(2) == self.application.neighbors(2)).all())
+        self.assertEqual(self.packed.max_affinity(), self.application.max_affinity())
+        for packed_values, values in zip(self.packed.edges(), self.application.edges()):
+            self.assertTrue((packed_values == values).all())
+
+    def test_sparse(self):
+        sparse = SparseApplicationGraph.from_dense(self.application.affinity)
+        packed = PackedApplicationGraph.from_application(sparse)
+        self.assertTrue((packed.packed == self.packed.packed).all())
+        self.assertEqual(application_fingerprint(packed), application_fingerprint(self.application))
+
+    def test_hopbytes(self):
+        packed_tree = PackedTopology.from_topology(self.tree)
+        mapping = [0, 5, 2, 7, 1, 3]
+        expected = compute_hopbytes(self.application, self.tree, mapping)
+        self.assertEqual(compute_hopbytes(self.packed, packed_tree, mapping), expected)
+        self.assertEqual(compute_hopbytes(self.application, packed_tree, mapping), expected)
+        batch = compute_hopbytes_batch(self.packed, packed_tree, [mapping, list(range(6))])
+        self.assertEqual(batch[0], expected)
+
+    def test_schedulers(self):
+        packed_tree = PackedTopology.from_topology(self.tree)
+        self.assertEqual(greedy_pairs(self.packed, packed_tree), greedy_pairs(self.application, self.tree))
+        self.assertEqual(greedy_pairs_with_topology(self.packed, packed_tree),
+                         greedy_pairs_with_topology(self.application, Topology(self.tree.distances)))
+        torus = mesh([2, 4], periodic=True)
+        packed_torus = PackedTopology.from_topology(torus)
+        self.assertEqual(recursive_bisection(self.packed, packed_torus, seed=0),
+                         recursive_bisection(self.application, torus, seed=0))
+        mapping = refine(self.packed, packed_tree, list(range(6)), seed=0)
+        self.assertEqual(mapping, refine(self.application, self.tree, list(range(6)), seed=0))
+
+    def test_evaluator(self):
+        packed_tree = PackedTopology.from_topology(self.tree)
+        evaluator = HopBytesEvaluator(self.packed, packed_tree, [0, 1, 2, 3, 4, 5])
+        reference = HopBytesEvaluator(self.application, self.tree, [0, 1, 2, 3, 4, 5])
+        self.assertEqual(evaluator.delta_move(2, 7), reference.delta_move(2, 7))
+        self.assertEqual(evaluator.delta_swap(0, 5), reference.delta_swap(0, 5))
+
+    def test_csv(self):
+        packed = PackedApplicationGraph.from_csv('six_tasks.csv')
+        self.assertTrue((packed.affinity == self.application.affinity).all())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'application.bin')
+            packed.loads = [1, 2, 1, 2, 1, 2]
+            packed.save(path)
+            loaded = ApplicationGraph.load(path)
+            self.assertIsInstance(loaded, PackedApplicationGraph)
+            self.assertTrue((loaded.affinity == self.application.affinity).all())
+            self.assertTrue((loaded.loads == packed.loads).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
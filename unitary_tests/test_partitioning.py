@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+import unittest
+import sys
+# Add the parent directory to the path so we can import
+# code from our simulator
+sys.path.append('../')
+
+import numpy as np
+from simulator import partitioning
+from simulator.partitioning import bisect, subgraph
+from simulator.application import SparseApplicationGraph
+
+
+class BisectionTest(unittest.TestCase):
+    def setUp(self):
+        generator = np.random.default_rng(1)
+        # two dense clusters of 100 vertices connected by a few edges
+        self.cluster = generator.permutation(200) < 100
+        matrix = (generator.random((200, 200)) < 0.01) * 1.
+        same = self.cluster[:, None] == self.cluster[None, :]
+        matrix += same * (generator.random((200, 200)) < 0.3)
+        matrix = np.triu(matrix, 1)
+        self.matrix = matrix + matrix.T
+
+    def test_clusters(self):
+        part = bisect(self.matrix, 100, seed=0)
+        self.assertEqual(part.sum(), 100)
+        self.assertTrue((part == self.cluster).all() or (part == ~self.cluster).all())
+
+    def test_exact_sizes(self):
+        for target in (0, 1, 37, 150, 200):
+            self.assertEqual(bisect(self.matrix, target, seed=0).sum(), target)
+
+
+class SparseBisectionTest(BisectionTest):
+    def setUp(self):
+        super().setUp()
+        self.sparse = SparseApplicationGraph.from_dense(self.matrix)
+        # Sparse graphs are processed as such until they are coarsened below this size
+        self.dense_vertices = partitioning.DENSE_VERTICES
+        partitioning.DENSE_VERTICES = 16
+
+    def tearDown(self):
+        partitioning.DENSE_VERTICES = self.dense_vertices
+
+    def test_same_as_dense(self):
+        for target in (37, 100):
+            self.assertTrue((bisect(self.sparse, target, seed=0) == bisect(self.matrix, target, seed=0)).all())
+
+    def test_subgraph(self):
+        # Small subgraphs are stored densely
+        vertices = np.array([5, 150, 3, 42, 199])
+        self.assertTrue((subgraph(self.sparse, vertices) == self.matrix[np.ix_(vertices, vertices)]).all())
+        vertices = np.arange(199, 99, -1)
+        self.assertTrue((subgraph(self.sparse, vertices).affinity ==
+                         self.matrix[np.ix_(vertices, vertices)]).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
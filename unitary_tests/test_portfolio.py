@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+import unittest
+import sys
+import time
+from functools import partial
+# Add the parent directory to the path so we can import
+# code from our simulator
+sys.path.append('../')
+
+from simulator.application import ApplicationGraph
+from simulator.topology import TopologyTree, Topology
+from simulator.schedulers import compact, greedy_pairs, eagermap, recursive_bisection
+from simulator.portfolio import run_portfolio, Refined
+
+
+def sleepy(application, topology):
+    time.sleep(10)
+    return compact(application, topology)
+
+
+class PortfolioTest(unittest.TestCase):
+    def setUp(self):
+        self.application = ApplicationGraph('six_tasks.csv')
+
+    def test_best(self):
+        tree = TopologyTree([2, 2, 2])
+        portfolio = run_portfolio(self.application, tree,
+                                  [compact, greedy_pairs, eagermap, Refined(compact, budget=0.5)],
+                                  workers=2)
+        names = [result['name'] for result in portfolio['results']]
+        self.assertEqual(names, ['compact', 'greedy_pairs', 'eagermap', 'compact+refine'])
+        best = min(result['hopbytes'] for result in portfolio['results'])
+        self.assertEqual(portfolio['best']['hopbytes'], best)
+
+    def test_same_names(self):
+        tree = TopologyTree([2, 2, 2])
+        schedulers = [partial(recursive_bisection, seed=1), partial(recursive_bisection, seed=2), compact,
+                      compact]
+        portfolio = run_portfolio(self.application, tree, schedulers, workers=2)
+        names = [result['name'] for result in portfolio['results']]
+        self.assertEqual(names, ['recursive_bisection', 'recursive_bisection#2', 'compact', 'compact#2'])
+        self.assertEqual(portfolio['results'][1]['mapping'], recursive_bisection(self.application, tree, seed=2))
+
+    def test_timeout_and_errors(self):
+        linear = Topology.from_csv('../inputs/simple_topo.csv')
+        portfolio = run_portfolio(self.application, linear,
+                                  {'slow': sleepy, 'tree only': eagermap, 'compact': compact},
+                                  workers=3, timeout=1)
+        statuses = [result['status'] for result in portfolio['results']]
+        self.assertEqual(statuses, ['timeout', 'error', 'ok'])
+        self.assertEqual(portfolio['best']['name'], 'compact')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+# Add the parent directory to the path so we can import
+# code from our simulator
+sys.path.append('../')
+
+import numpy as np
+from simulator.application import ApplicationGraph, SparseApplicationGraph
+from simulator.topology import Topology, TopologyTree
+
+
+class BinaryStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'matrix.bin')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_application(self):
+        application = ApplicationGraph('six_tasks.csv')
+        application.save(self.path)
+        loaded = ApplicationGraph.load(self.path)
+        self.assertIsInstance(loaded.affinity, np.memmap)
+        self.assertEqual(loaded.num_tasks, 6)
+        self.assertTrue(np.array_equal(loaded.affinity, application.affinity))
+
+    def test_sparse_application(self):
+        application = SparseApplicationGraph.from_csv('six_tasks.csv')
+        application.save(self.path)
+        loaded = ApplicationGraph.load(self.path)
+        self.assertIsInstance(loaded, SparseApplicationGraph)
+        self.assertTrue(np.array_equal(loaded.affinity, application.affinity))
+
+    def test_topology(self):
+        tree = TopologyTree([2, 3])
+        tree.save(self.path)
+        loaded = Topology.load(self.path)
+        self.assertTrue(np.array_equal(loaded.distances, tree.distances))
+        with self.assertRaises(ValueError):
+            ApplicationGraph.load(self.path)
+
+    def test_loads_and_capacities(self):
+        application = SparseApplicationGraph.from_csv('six_tasks.csv')
+        application.loads = [1, 2, 1, 2, 1, 2]
+        application.save(self.path)
+        self.assertEqual(list(ApplicationGraph.load(self.path).loads), [1, 2, 1, 2, 1, 2])
+        topology = Topology(TopologyTree([2, 2]).distances)
+        topology.capacities = [2, 1, 1, 2]
+        topology.save(self.path)
+        self.assertEqual(list(Topology.load(self.path).capacities), [2, 1, 1, 2])
+
+    def test_stale_cache(self):
+        csv_file = os.path.join(self.directory.name, 'comm.csv')
+        shutil.copy('simple_comm.csv', csv_file)
+        first = ApplicationGraph.from_cached_csv(csv_file)
+        self.assertTrue(os.path.exists(csv_file + '.bin'))
+        self.assertEqual(first.get_affinity(0, 1), 2)
+        with open(csv_file, 'w') as stream:
+            stream.write('0,5\n5,0\n')
+        second = ApplicationGraph.from_cached_csv(csv_file)
+        self.assertEqual(second.num_tasks, 2)
+        self.assertEqual(second.get_affinity(0, 1), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,13 +2,17 @@
 
 import unittest
 import sys
+import numpy as np
 # Add the parent directory to the path so we can import
 # code from our simulator
 sys.path.append('../')
 
-from simulator.application import ApplicationGraph
+from simulator.application import ApplicationGraph, SparseApplicationGraph, PackedApplicationGraph
 from simulator.topology import TopologyTree, Topology
-from simulator.support import compute_hopbytes
+from simulator.support import compute_hopbytes, compute_hopbytes_batch, HopBytesEvaluator
+from simulator.support import CoreLoads, compute_load_imbalance, compute_objective, compute_metrics
+from simulator.synthetic import mesh
+from simulator import support
 
 
 class DilationTest(unittest.TestCase):
@@ -45,6 +49,219 @@ class DilationTest(unittest.TestCase):
         dilation = compute_hopbytes(self.application, topology, mapping)
         self.assertEqual(dilation, 2*2+1*4+6*3)
 
+    def test_invalid_mapping(self):
+        topology = TopologyTree([2, 2])
+        with self.assertRaises(ValueError):
+            compute_hopbytes(self.application, topology, [0, 1, 2])
+        with self.assertRaises(ValueError):
+            compute_hopbytes(self.application, topology, [0, 1, 2, 4])
+
+
+class LargeDilationTest(unittest.TestCase):
+    def test_against_pairwise_sum(self):
+        generator = np.random.default_rng(42)
+        application = ApplicationGraph()
+        application.affinity = generator.integers(0, 10, size=(32, 32)).astype(float)
+        application.num_tasks = 32
+        topology = TopologyTree([2, 4, 4])
+        mapping = generator.permutation(32)
+        expected = 0
+        for source in range(32):
+            for dest in range(source + 1, 32):
+                expected += (application.get_affinity(source, dest) *
+                             topology.get_hops_between_cores(mapping[source], mapping[dest]))
+        self.assertEqual(compute_hopbytes(application, topology, mapping), expected)
+
+
+class BatchDilationTest(unittest.TestCase):
+    def setUp(self):
+        generator = np.random.default_rng(3)
+        self.application = ApplicationGraph('six_tasks.csv')
+        self.tree = TopologyTree([2, 2, 2])
+        self.mappings = generator.integers(0, 8, size=(50, 6))
+
+    def test_matches_single_evaluation(self):
+        expected = [compute_hopbytes(self.application, self.tree, mapping) for mapping in self.mappings]
+        for max_memory, workers in ((1 << 20, 1), (1, 1), (100, 4)):
+            hopbytes = compute_hopbytes_batch(self.application, self.tree, self.mappings,
+                                              max_memory=max_memory, workers=workers)
+            self.assertEqual(list(hopbytes), expected)
+        sparse = SparseApplicationGraph.from_dense(self.application.affinity)
+        self.assertEqual(list(compute_hopbytes_batch(sparse, self.tree, self.mappings)), expected)
+
+    def test_invalid_mappings(self):
+        with self.assertRaises(ValueError):
+            compute_hopbytes_batch(self.application, self.tree, self.mappings[:, :5])
+        with self.assertRaises(ValueError):
+            compute_hopbytes_batch(self.application, self.tree, self.mappings + 1)
+
+
+class EvaluatorTest(unittest.TestCase):
+    def setUp(self):
+        generator = np.random.default_rng(7)
+        self.generator = generator
+        affinity = generator.integers(0, 5, size=(20, 20)).astype(float)
+        self.dense = ApplicationGraph.from_matrix(affinity)
+        self.sparse = SparseApplicationGraph.from_dense(affinity)
+        self.mapping = generator.integers(0, 16, size=20)
+
+    def check_moves(self, application, topology):
+        evaluator = HopBytesEvaluator(application, topology, self.mapping)
+        for step in range(50):
+            first, second = self.generator.integers(0, 20, size=2)
+            if step % 2:
+                delta = evaluator.apply_swap(first, second)
+            else:
+                delta = evaluator.apply_move(first, self.generator.integers(0, 16))
+            self.assertEqual(evaluator.total,
+                             compute_hopbytes(application, topology, evaluator.mapping))
+
+    def test_tree(self):
+        self.check_moves(self.dense, TopologyTree([2, 2, 4]))
+        self.check_moves(self.sparse, TopologyTree([4, 4]))
+
+    def test_asymmetric_topology(self):
+        distances = self.generator.integers(1, 9, size=(16, 16))
+        np.fill_diagonal(distances, 0)
+        self.check_moves(self.dense, Topology(distances))
+        self.check_moves(self.sparse, Topology(distances))
+
+    def test_tree_without_matrix(self):
+        # Distances in larger trees are computed from the ancestors of the cores
+        dense_distances = support.DENSE_DISTANCES
+        support.DENSE_DISTANCES = 0
+        try:
+            self.check_moves(self.dense, TopologyTree([2, 2, 4]))
+            self.check_moves(self.sparse, TopologyTree([4, 4]))
+        finally:
+            support.DENSE_DISTANCES = dense_distances
+
+    def test_task_costs(self):
+        distances = self.generator.integers(1, 9, size=(16, 16))
+        np.fill_diagonal(distances, 0)
+        for topology in [TopologyTree([4, 4]), Topology(distances)]:
+            for application in [self.dense, self.sparse]:
+                evaluator = HopBytesEvaluator(application, topology, self.mapping)
+                # Each interaction is counted for both of its tasks
+                self.assertAlmostEqual(evaluator.task_costs().sum(), 2 * evaluator.total)
+
+    def test_invalid_core(self):
+        evaluator = HopBytesEvaluator(self.dense, TopologyTree([4, 4]), self.mapping)
+        with self.assertRaises(ValueError):
+            evaluator.delta_move(0, 16)
+
+    def test_migration(self):
+        tree = TopologyTree([2, 2, 4])
+        costs = self.generator.integers(1, 4, size=20).astype(float)
+        evaluator = HopBytesEvaluator(self.sparse, tree, self.mapping, self.mapping, costs)
+        self.assertEqual(evaluator.migration, 0.)
+        for step in range(50):
+            first, second = self.generator.integers(0, 20, size=2)
+            if step % 2:
+                evaluator.apply_swap(first, second)
+            else:
+                evaluator.apply_move(first, self.generator.integers(0, 16))
+            migration = np.dot(costs, tree.distances[self.mapping, evaluator.mapping])
+            self.assertEqual(evaluator.migration, migration)
+            self.assertEqual(evaluator.total,
+                             compute_hopbytes(self.sparse, tree, evaluator.mapping) + migration)
+
+
+class LoadBalanceTest(unittest.TestCase):
+    def setUp(self):
+        self.application = ApplicationGraph('six_tasks.csv')
+        self.tree = TopologyTree([2, 2])
+
+    def test_round_robin(self):
+        core_loads = CoreLoads(np.ones(4))
+        self.assertEqual([core_loads.assign() for task in range(10)], [0, 1, 2, 3, 0, 1, 2, 3, 0, 1])
+        core_loads = CoreLoads([1, 0, 2])
+        self.assertEqual([core_loads.assign() for task in range(6)], [0, 2, 2, 0, 2, 2])
+        with self.assertRaises(ValueError):
+            CoreLoads([0, 0])
+
+    def test_heavy_tasks(self):
+        core_loads = CoreLoads(np.ones(2), total_load=12, num_tasks=4)
+        cores = [core_loads.assign(load) for load in [9, 1, 1, 1]]
+        self.assertEqual(cores, [0, 1, 1, 1])
+        self.assertEqual(list(core_loads.loads), [9, 3])
+
+    def test_imbalance(self):
+        self.assertAlmostEqual(compute_load_imbalance(self.application, self.tree, [0, 1, 2, 3, 0, 1]), 1 / 3)
+        self.assertEqual(compute_load_imbalance(self.application, self.tree, [0, 0, 0, 1, 2, 3]), 1.)
+        self.assertEqual(compute_load_imbalance(self.application, TopologyTree([2, 3]), list(range(6))), 0.)
+        self.tree.capacities = [3, 1, 1, 1]
+        self.assertEqual(compute_load_imbalance(self.application, self.tree, [0, 0, 0, 1, 2, 3]), 0.)
+        with self.assertRaises(ValueError):
+            compute_load_imbalance(self.application, self.tree, [0, 0, 0, 1, 2])
+
+    def test_objective(self):
+        mapping = [0, 0, 0, 1, 2, 3]
+        self.assertEqual(compute_objective(self.application, self.tree, mapping, 10.),
+                         compute_hopbytes(self.application, self.tree, mapping) + 10.)
+
+    def test_invalid_weights(self):
+        with self.assertRaises(ValueError):
+            self.application.loads = [1, 1]
+        with self.assertRaises(ValueError):
+            self.tree.capacities = [1, -1, 1, 1]
+
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        # Task 0 talks to task 1 (same socket) and to task 2 (other socket)
+        affinity = np.zeros((4, 4))
+        affinity[0, 1] = affinity[1, 0] = 5
+        affinity[0, 2] = affinity[2, 0] = 3
+        self.application = ApplicationGraph.from_matrix(affinity)
+        self.tree = TopologyTree([2, 2])
+
+    def test_tree(self):
+        metrics = compute_metrics(self.application, self.tree, [0, 1, 2, 3])
+        self.assertEqual(metrics['hopbytes'], 5 * 2 + 3 * 4)
+        self.assertEqual(metrics['volume'], 8)
+        self.assertEqual(metrics['dilation'].tolist(), [22, 10, 12, 0])
+        self.assertEqual(metrics['histogram'][0].tolist(), [2, 4])
+        self.assertEqual(metrics['histogram'][1].tolist(), [5, 3])
+        # Volume between sockets, inside sockets and inside cores
+        self.assertEqual(metrics['level_traffic'].tolist(), [3, 5, 0])
+        self.assertEqual(metrics['link_traffic'][1].tolist(), [3, 3])
+        self.assertEqual(metrics['link_traffic'][2].tolist(), [8, 5, 3, 0])
+        self.assertEqual(metrics['max_congestion'], 8)
+
+    def test_shared_core(self):
+        metrics = compute_metrics(self.application, self.tree, [0, 0, 3, 3])
+        self.assertEqual(metrics['level_traffic'].tolist(), [3, 0, 5])
+        self.assertEqual(metrics['link_traffic'][2].tolist(), [3, 0, 0, 3])
+
+    def test_matches_hopbytes(self):
+        application = ApplicationGraph('six_tasks.csv')
+        tree = TopologyTree([2, 2, 2])
+        mapping = [3, 0, 6, 1, 5, 7]
+        expected = compute_hopbytes(application, tree, mapping)
+        for graph in [application, SparseApplicationGraph.from_dense(application.affinity),
+                      PackedApplicationGraph.from_application(application)]:
+            metrics = compute_metrics(graph, tree, mapping)
+            self.assertEqual(metrics['hopbytes'], expected)
+            self.assertEqual(metrics['dilation'].sum(), 2 * expected)
+            self.assertEqual(metrics['level_traffic'].sum(), metrics['volume'])
+            self.assertEqual(metrics['histogram'][1].sum(), metrics['volume'])
+
+    def test_distance_matrix(self):
+        torus = mesh([2, 2], periodic=True)
+        metrics = compute_metrics(self.application, torus, [0, 1, 3, 2])
+        self.assertEqual(metrics['hopbytes'], compute_hopbytes(self.application, torus, [0, 1, 3, 2]))
+        self.assertIsNone(metrics['level_traffic'])
+        self.assertIsNone(metrics['max_congestion'])
+
+    def test_invalid_mapping(self):
+        with self.assertRaises(ValueError):
+            compute_metrics(self.application, self.tree, [0, 1, 2])
+        with self.assertRaises(ValueError):
+            compute_metrics(self.application, self.tree, [0, 1, 2, 4])
+
+
 
 if __name__ == '__main__':
     unittest.main()
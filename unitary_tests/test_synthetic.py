@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+import unittest
+import sys
+import numpy as np
+# Add the parent directory to the path so we can import
+# code from our simulator
+sys.path.append('../')
+
+from simulator.synthetic import stencil, all_to_all, random_sparse, maplib_like, mesh
+
+
+class SyntheticTest(unittest.TestCase):
+    def check_symmetric(self, application):
+        affinity = application.affinity
+        np.testing.assert_array_equal(affinity, affinity.T)
+        self.assertTrue((np.diag(affinity) == 0).all())
+
+    def test_stencil(self):
+        application = stencil([3, 4])
+        self.check_symmetric(application)
+        self.assertEqual(application.num_tasks, 12)
+        # 3 x 3 horizontal links and 2 x 4 vertical links
+        self.assertEqual(np.count_nonzero(application.affinity) // 2, 17)
+        self.assertEqual(list(application.neighbors(5)), [1, 4, 6, 9])
+        periodic = stencil([3, 4], volume=2., periodic=True)
+        self.assertEqual(list(periodic.neighbors(0)), [1, 3, 4, 8])
+        self.assertEqual(periodic.get_affinity(0, 3), 2.)
+
+    def test_all_to_all(self):
+        application = all_to_all(5, 3.)
+        self.check_symmetric(application)
+        self.assertEqual(application.affinity.sum(), 5 * 4 * 3.)
+
+    def test_random(self):
+        first = random_sparse(50, degree=3, seed=1)
+        second = maplib_like(60, seed=1)
+        self.check_symmetric(first)
+        self.check_symmetric(second)
+        np.testing.assert_array_equal(first.affinity, random_sparse(50, degree=3, seed=1).affinity)
+        self.assertEqual(second.num_tasks, 60)
+        # The root communicates with every task
+        self.assertEqual(len(second.neighbors(0)), 59)
+
+    def test_mesh(self):
+        line = mesh([4])
+        self.assertEqual(list(line.distances[0]), [0, 1, 2, 3])
+        torus = mesh([4, 3], periodic=True)
+        self.assertEqual(torus.num_cores, 12)
+        self.assertEqual(torus.distances[0, 11], 2)
+        self.assertEqual(torus.distances.max(), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import unittest
+import sys
+# Add the parent directory to the path so we can import
+# code from our simulator
+sys.path.append('../')
+
+from simulator.topology import TopologyTree
+
+
+class TreeDistancesTest(unittest.TestCase):
+    def setUp(self):
+        self.tree = TopologyTree([2, 3, 2])
+
+    def test_matches_recursive_distance(self):
+        last_level = self.tree.num_levels - 1
+        for first in range(self.tree.num_cores):
+            for second in range(self.tree.num_cores):
+                self.assertEqual(self.tree.distances[first][second],
+                                 self.tree.get_distance(first, second, last_level))
+
+    def test_lca_levels(self):
+        self.assertEqual(self.tree.get_lca_levels(0, 0), 3)
+        self.assertEqual(self.tree.get_lca_levels(0, 1), 2)
+        self.assertEqual(self.tree.get_lca_levels(0, 2), 1)
+        self.assertEqual(self.tree.get_lca_levels(0, 6), 0)
+
+    def test_get_distances(self):
+        # Distances are computed from the ancestors without building the matrix
+        first, second = [0, 5, 11, 3], [1, 0, 6, 3]
+        distances = self.tree.get_distances(first, second)
+        self.assertIsNone(self.tree._distances)
+        self.assertEqual(self.tree.get_hops_between_cores(0, 11), 6)
+        self.assertIsNone(self.tree._distances)
+        self.assertTrue((distances == self.tree.distances[first, second]).all())
+        self.assertTrue((self.tree.get_distances(first, second) == distances).all())
+
+    def test_invalid_core(self):
+        with self.assertRaises(ValueError):
+            self.tree.get_hops_between_cores(0, 12)
+
+
+class HeterogeneousTreeTest(unittest.TestCase):
+    def setUp(self):
+        # Two sockets with three and one cache groups, weighted links
+        self.tree = TopologyTree([2, [3, 1], [2, 2, 2, 4]], weights=[10, 3, 1])
+
+    def test_structure(self):
+        self.assertEqual(self.tree.num_cores, 10)
+        self.assertEqual(self.tree.get_level_size(2), 4)
+        self.assertEqual(self.tree.get_level_parents(2), [0, 0, 0, 1])
+        self.assertEqual(self.tree.get_level_arity(0), 2)
+        self.assertEqual(self.tree.get_level_arity(1), [3, 1])
+
+    def test_weighted_distances(self):
+        self.assertEqual(self.tree.get_hops_between_cores(0, 1), 2)
+        self.assertEqual(self.tree.get_hops_between_cores(0, 2), 8)
+        self.assertEqual(self.tree.get_hops_between_cores(0, 9), 28)
+        self.assertEqual(self.tree.get_hops_between_cores(6, 9), 2)
+        last_level = self.tree.num_levels - 1
+        for first in range(self.tree.num_cores):
+            for second in range(self.tree.num_cores):
+                self.assertEqual(self.tree.distances[first][second],
+                                 self.tree.get_distance(first, second, last_level))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            TopologyTree([2, [3, 1, 2]])
+        with self.assertRaises(ValueError):
+            TopologyTree([2, 2], weights=[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
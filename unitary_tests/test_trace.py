@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+import unittest
+import sys
+import os
+import tempfile
+import numpy as np
+# Add the parent directory to the path so we can import
+# code from our simulator
+sys.path.append('../')
+
+from simulator.application import ApplicationGraph, SparseApplicationGraph
+from simulator.trace import TraceAccumulator
+
+
+class TraceAccumulatorTest(unittest.TestCase):
+    def setUp(self):
+        generator = np.random.default_rng(3)
+        self.sources = generator.integers(0, 10, size=500)
+        self.dests = generator.integers(0, 10, size=500)
+        self.volumes = generator.integers(1, 100, size=500).astype(float)
+        self.timestamps = np.sort(generator.random(500) * 10)
+        # Expected affinity, symmetric and without self messages
+        self.expected = np.zeros((10, 10))
+        np.add.at(self.expected, (self.sources, self.dests), self.volumes)
+        self.expected += self.expected.T
+        np.fill_diagonal(self.expected, 0)
+
+    def test_sparse_and_dense(self):
+        sparse = TraceAccumulator(buffer_size=64)
+        dense = TraceAccumulator(10, sparse=False)
+        for start in range(0, 500, 37):
+            end = start + 37
+            for accumulator in (sparse, dense):
+                accumulator.add_batch(self.sources[start:end], self.dests[start:end],
+                                      self.volumes[start:end], self.timestamps[start:end])
+        self.assertIsInstance(sparse.snapshot(), SparseApplicationGraph)
+        self.assertIsInstance(dense.snapshot(), ApplicationGraph)
+        np.testing.assert_allclose(sparse.snapshot().affinity, self.expected)
+        np.testing.assert_allclose(dense.snapshot().affinity, self.expected)
+        self.assertEqual(sparse.records, 500)
+
+    def test_snapshot_while_reading(self):
+        accumulator = TraceAccumulator()
+        accumulator.add(0, 1, 5.)
+        first = accumulator.snapshot()
+        self.assertEqual(first.num_tasks, 2)
+        accumulator.add(3, 1, 2.)
+        second = accumulator.snapshot()
+        self.assertEqual(first.get_affinity(0, 1), 5.)
+        self.assertEqual(second.num_tasks, 4)
+        self.assertEqual(second.get_affinity(1, 3), 2.)
+
+    def test_consume_and_file(self):
+        records = zip(self.sources, self.dests, self.volumes, self.timestamps)
+        accumulator = TraceAccumulator(10)
+        accumulator.consume(records, batch_size=100)
+        np.testing.assert_allclose(accumulator.snapshot().affinity, self.expected)
+        with tempfile.TemporaryDirectory() as directory:
+            trace_file = os.path.join(directory, 'trace.csv')
+            np.savetxt(trace_file, np.column_stack([self.sources, self.dests,
+                                                    self.volumes, self.timestamps]),
+                       delimiter=',', header='src,dst,bytes,timestamp')
+            accumulator = TraceAccumulator(10, sparse=False)
+            accumulator.read_file(trace_file, chunk_rows=64)
+            np.testing.assert_allclose(accumulator.snapshot().affinity, self.expected)
+
+    def test_window(self):
+        accumulator = TraceAccumulator(window=1.)
+        accumulator.add_batch([0, 1], [1, 2], [4., 6.], [0.2, 0.5])
+        accumulator.add_batch([2, 0], [3, 1], [1., 1.], [1.5, 0.9])
+        graph = accumulator.snapshot()
+        self.assertEqual(graph.get_affinity(2, 3), 1.)
+        self.assertEqual(graph.get_affinity(0, 1), 0.)
+        self.assertEqual(accumulator.dropped, 1)
+
+    def test_decay(self):
+        accumulator = TraceAccumulator(4, sparse=False, half_life=2.)
+        accumulator.add(0, 1, 8., 0.)
+        accumulator.add(2, 3, 8., 4.)
+        accumulator.add(1, 2, 8., 2.)
+        graph = accumulator.snapshot()
+        self.assertEqual(graph.get_affinity(0, 1), 2.)
+        self.assertEqual(graph.get_affinity(1, 2), 4.)
+        self.assertEqual(graph.get_affinity(2, 3), 8.)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            TraceAccumulator(sparse=False)
+        accumulator = TraceAccumulator(4)
+        with self.assertRaises(ValueError):
+            accumulator.add(0, 4, 1.)
+        with self.assertRaises(ValueError):
+            accumulator.add(0, 1, -1.)
+        with self.assertRaises(ValueError):
+            accumulator.consume([(0, 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()